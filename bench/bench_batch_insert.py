@@ -0,0 +1,108 @@
+"""
+Counts commits and round trips needed to create one expense, for growing numbers of participants.
+
+"row at a time" replays the old behaviour (one autocommitting INSERT per participant);
+"Expense(...)" is the current constructor, which sends participants through Connector.execute_many.
+
+Usage (from the repository root, with a reachable database described by a JSON credentials file):
+    python bench/bench_batch_insert.py --config src/db.json --participants 2 10 50 200
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from uuid import uuid4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from connector import Connector
+from user import User
+from group import Group
+from expense import Expense
+from ledger import Ledger
+from ids import new_id, EXPENSE
+
+
+class Counting:
+    """
+    Proxy that counts calls to the wrapped object's execute/executemany/commit methods.
+    """
+
+    def __init__(self, wrapped, counts: dict):
+        self._wrapped = wrapped
+        self._counts = counts
+
+    def __getattr__(self, name):
+        attribute = getattr(self._wrapped, name)
+        if name in ("execute", "executemany", "commit"):
+            def counted(*args, **kwargs):
+                self._counts[name] = self._counts.get(name, 0) + 1
+                return attribute(*args, **kwargs)
+            return counted
+        return attribute
+
+
+def measure(connector: Connector, create) -> dict:
+    counts = {}
+    cursor, db = connector._cursor, connector._db
+    connector._cursor, connector._db = Counting(cursor, counts), Counting(db, counts)
+    try:
+        start = time.perf_counter()
+        create()
+        counts["ms"] = (time.perf_counter() - start) * 1000
+    finally:
+        connector._cursor, connector._db = cursor, db
+    counts["round trips"] = counts.get("execute", 0) + counts.get("executemany", 0)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", required = True, help = "path to the JSON file with the database credentials")
+    parser.add_argument("--participants", type = int, nargs = "+", default = [2, 10, 50, 200])
+    args = parser.parse_args()
+
+    connector = Connector(filepath = args.config)
+    connector.get_max_packet()  # read once up front so it is not counted
+    tag = uuid4().hex[:8]
+    users = [User(name = f"Batch {i}", email = f"batch-{tag}-{i}@example.com", password = "bench",
+                  connector = connector) for i in range(max(args.participants))]
+    group = Group(admin = users[0], name = f"Batch {tag}", members = list(users), connector = connector)
+    created = []
+
+    def row_at_a_time(participants):
+        expense_id = new_id(EXPENSE)
+        created.append(expense_id)
+        connector.execute("INSERT INTO Expenses (expense_id, group_id, timestamp, paid_by, amount) "
+                          "VALUES (%s, %s, %s, %s, %s)", (expense_id, group.group_id, datetime.now(), users[0].user_id, 100))
+        for user in participants:
+            connector.execute("INSERT INTO ExpenseParticipants (expense_id, user_id, amount, settled) "
+                              "VALUES (%s, %s, %s, %s)", (expense_id, user.user_id, 1, 'NO'))
+
+    def batched(participants):
+        expense = Expense(amount = 100, payer = users[0], group = group,
+                          participants = {user: 1 for user in participants}, connector = connector)
+        created.append(expense.expense_id)
+
+    print(f"{'participants':>12} | {'path':<14}{'commits':>9}{'round trips':>13}{'ms':>9}")
+    for count in args.participants:
+        participants = users[:count]
+        for name, create in (("row at a time", row_at_a_time), ("Expense(...)", batched)):
+            result = measure(connector, lambda: create(participants))
+            print(f"{count:>12} | {name:<14}{result.get('commit', 0):>9}{result['round trips']:>13}{result['ms']:>9.1f}")
+
+    Ledger.delete_expenses(connector, created)
+    user_ids = [user.user_id for user in users]
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    # the ledger rows of the group are at zero now, but still reference the group and its users
+    with connector.transaction():
+        for table in ("GroupDebts", "GroupBalances", "GroupMembers", "GroupDetails"):
+            connector.execute(f"DELETE FROM {table} WHERE group_id = %s", (group.group_id,))
+        connector.execute(f"DELETE FROM UserDueTotals WHERE user_id IN ({placeholders})", tuple(user_ids))
+        connector.execute(f"DELETE FROM Users WHERE user_id IN ({placeholders})", tuple(user_ids))
+    connector.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Compares how many User objects per second can be built when every object opens its own Connector
+(two connections and a CREATE DATABASE per object) against objects that draw from a shared ConnectionPool.
+
+Usage (from the repository root, with a reachable database described by a JSON credentials file):
+    python bench/bench_connector_pool.py --config src/db.json --objects 200 --pool-size 5
+"""
+import argparse
+import os
+import sys
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from connector import Connector, ConnectionPool
+from user import User
+
+
+def build_users(count: int, name: str, email: str, config: str, pool_size: int) -> float:
+    """
+    Builds count User objects for an existing user without passing a connector and returns objects per second.
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        User(name = name, email = email, filepath = config, pool_size = pool_size)
+    elapsed = time.perf_counter() - start
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", required = True, help = "path to the JSON file with the database credentials")
+    parser.add_argument("--objects", type = int, default = 200, help = "number of objects to build per run")
+    parser.add_argument("--pool-size", type = int, default = 5, help = "size of the shared connection pool")
+    args = parser.parse_args()
+
+    # One user that every constructor call below re-reads from the database
+    setup = Connector(filepath = args.config)
+    name, email = "Pool Bench", f"pool-bench-{uuid4()}@example.com"
+    User(name = name, email = email, password = "bench", connector = setup)
+
+    unpooled = build_users(args.objects, name, email, args.config, pool_size = 0)
+    pooled = build_users(args.objects, name, email, args.config, pool_size = args.pool_size)
+
+    print(f"objects built per run : {args.objects}")
+    print(f"without pool          : {unpooled:10.1f} objects/s")
+    print(f"with pool (size {args.pool_size:>2})   : {pooled:10.1f} objects/s")
+    print(f"speed-up              : {pooled / unpooled:10.2f}x")
+
+    setup.execute("DELETE FROM Users WHERE email = %s", (email,))
+    setup.close()
+    ConnectionPool.close_shared()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Compares computing a group's balances by looping over Expense.participants dictionaries of User objects
+with the vectorized BalanceArrays path in analytics.py, on a synthetic group held in memory.
+
+Both paths get the same rows; the script checks that they agree to the cent before reporting timings.
+Needs numpy but no database.
+
+Usage (from the repository root):
+    python bench/bench_group_balances.py --members 200 --expenses 10000 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from user import User
+from expense import Expense
+from analytics import BalanceArrays
+
+
+def generate(members: int, expenses: int, seed: int = 1):
+    """
+    :return: user_ids and (expense_id, paid_by, user_id, amount, settled) rows shaped like Expenses JOIN ExpenseParticipants
+    """
+    rng = random.Random(seed)
+    user_ids = [f"U{i}" for i in range(members)]
+    rows = []
+    for number in range(expenses):
+        payer = rng.choice(user_ids)
+        for user_id in rng.sample(user_ids, rng.randint(2, min(members, 12))):
+            rows.append((f"E{number}", payer, user_id, Decimal(rng.randint(0, 20000)).scaleb(-2),
+                         rng.choice(['NO', 'NO', 'PARTIAL', 'SETTLED'])))
+    return user_ids, rows
+
+
+def per_object(user_ids, rows):
+    """
+    Builds one Expense per expense id with its participants and sums the open shares per member in Python.
+    """
+    connector = SimpleNamespace(identity_map = None)
+    users = {user_id: User.from_row({'user_id': user_id, 'name': user_id, 'email': f"{user_id}@example.com",
+                                     'created': datetime.now()}, connector) for user_id in user_ids}
+    participants, payers, settled = {}, {}, {}
+    for expense_id, payer, user_id, amount, status in rows:
+        participants.setdefault(expense_id, {})[users[user_id]] = amount
+        payers[expense_id] = payer
+        settled[(expense_id, user_id)] = status
+
+    start = time.perf_counter()
+    expenses = [Expense.from_row({'expense_id': expense_id, 'description': None, 'amount': sum(shares.values()),
+                                  'timestamp': None, 'tag': None}, connector, payer = users[payers[expense_id]],
+                                 participants = shares)
+                for expense_id, shares in participants.items()]
+    net = {user_id: Decimal(0) for user_id in user_ids}
+    for expense in expenses:
+        for user, amount in expense.participants.items():
+            if user is not expense.payer and settled[(expense.expense_id, user.user_id)] != 'SETTLED':
+                net[user.user_id] -= amount
+                net[expense.payer.user_id] += amount
+    return time.perf_counter() - start, {user_id: total for user_id, total in net.items() if total}
+
+
+def vectorized(user_ids, rows):
+    start = time.perf_counter()
+    shares = [(user_id, payer, amount) for _, payer, user_id, amount, status in rows
+              if status != 'SETTLED' and user_id != payer]
+    arrays = BalanceArrays(user_ids, shares)
+    balances = arrays.balances()
+    return time.perf_counter() - start, balances
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type = int, default = 200, help = "members in the synthetic group")
+    parser.add_argument("--expenses", type = int, nargs = "+", default = [10_000, 50_000], help = "expense counts to measure")
+    args = parser.parse_args()
+
+    print(f"{'expenses':>10}{'shares':>10}{'per-object s':>15}{'vectorized s':>15}{'speed-up':>10}")
+    for count in args.expenses:
+        user_ids, rows = generate(args.members, count)
+        loop_time, loop_balances = per_object(user_ids, rows)
+        array_time, array_balances = vectorized(user_ids, rows)
+        if loop_balances != array_balances:
+            raise SystemExit("balances differ between the two paths")
+        print(f"{count:>10}{len(rows):>10}{loop_time:>15.3f}{array_time:>15.3f}{loop_time / array_time:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
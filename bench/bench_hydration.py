@@ -0,0 +1,107 @@
+"""
+Counts the queries each loader issues per object it materializes, comparing the constructor path
+(User(...) re-validating against the database) with the trusted from_row() paths used by the loaders.
+Queries are counted with Connector.profile() while the result is loaded and walked, so lazily loaded
+attributes are counted too. --report prints the per-call-site profile of every loader.
+
+Usage (from the repository root, with a reachable database described by a JSON credentials file):
+    python bench/bench_hydration.py --config src/db.json --members 10 --repeat 50
+"""
+import argparse
+import os
+import sys
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from connector import Connector
+from user import User
+from group import Group
+from expense import Expense
+from ledger import Ledger
+from transaction import Transaction
+
+
+def materialized(result) -> int:
+    """
+    Number of domain objects (users, groups, expenses, transactions) reachable from a loader result.
+    """
+    seen = set()
+    pending = list(result) if isinstance(result, list) else [result]
+    while pending:
+        obj = pending.pop()
+        if obj is None or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, Group):
+            pending.append(obj.admin)
+            pending.extend(obj.members)
+        elif isinstance(obj, Expense):
+            pending.extend([obj.payer, obj.group])
+            pending.extend(obj.participants)
+        elif isinstance(obj, Transaction):
+            pending.extend([obj.expense, obj.payer, obj.payee])
+    return len(seen)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", required = True, help = "path to the JSON file with the database credentials")
+    parser.add_argument("--members", type = int, default = 10, help = "members in the benchmark group")
+    parser.add_argument("--repeat", type = int, default = 50, help = "calls per loader")
+    parser.add_argument("--report", action = "store_true", help = "print the query profile of every loader")
+    args = parser.parse_args()
+
+    connector = Connector(filepath = args.config)
+    tag = uuid4().hex[:8]
+    users = [User(name = f"Hydration {tag} {i}", email = f"hydration-{tag}-{i}@example.com", password = "bench",
+                  connector = connector) for i in range(args.members)]
+    group = Group(admin = users[0], name = f"Hydration {tag}", members = list(users), connector = connector)
+    expense = Expense(amount = 10.0 * args.members, payer = users[0], group = group,
+                      participants = {user: 10.0 for user in users}, description = "hydration bench",
+                      connector = connector)
+    transaction = Transaction(expense = expense, payer = users[1], payee = users[0], amount = 10.0,
+                              connector = connector)
+    user_ids = [user.user_id for user in users]
+
+    cases = [
+        ("User(...) constructor", lambda: User(name = users[1].name, email = users[1].email, user_id = user_ids[1],
+                                               connector = connector)),
+        ("User.get_user", lambda: User.get_user(user_ids[1], connector)),
+        ("User.get_users", lambda: User.get_users(user_ids, connector)),
+        ("User.login", lambda: User.login(users[1].email, "bench", connector)),
+        ("User.get_user_by_email", lambda: User.get_user_by_email(users[1].email, connector)),
+        ("Group.get_group", lambda: Group.get_group(group.group_id, connector)),
+        ("Expense.get_expense", lambda: Expense.get_expense(expense.expense_id, connector)),
+        ("Transaction.get_transaction", lambda: Transaction.get_transaction(transaction.trans_id, connector)),
+    ]
+
+    print(f"{'loader':<30}{'queries':>9}{'objects':>9}{'queries/object':>16}{'ms/call':>10}")
+    profiles = []
+    for name, load in cases:
+        start = time.perf_counter()
+        with connector.profile() as profile:
+            for _ in range(args.repeat):
+                objects = materialized(load())
+        elapsed = time.perf_counter() - start
+        queries = profile.query_count / args.repeat
+        profiles.append((name, profile))
+        print(f"{name:<30}{queries:>9.1f}{objects:>9}{queries / objects:>16.2f}{elapsed / args.repeat * 1000:>10.2f}")
+    if args.report:
+        for name, profile in profiles:
+            print(f"\n{name}\n{profile.report()}")
+
+    Ledger.delete_expenses(connector, [expense.expense_id])
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    # the ledger rows of the group are at zero now, but still reference the group and its users
+    with connector.transaction():
+        for table in ("GroupDebts", "GroupBalances", "GroupMembers", "GroupDetails"):
+            connector.execute(f"DELETE FROM {table} WHERE group_id = %s", (group.group_id,))
+        connector.execute(f"DELETE FROM UserDueTotals WHERE user_id IN ({placeholders})", tuple(user_ids))
+        connector.execute(f"DELETE FROM Users WHERE user_id IN ({placeholders})", tuple(user_ids))
+    connector.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Compares the old and the new id format on a table shaped like ExpenseParticipants:
+
+    varchar-v4   - "E<uuid4>" strings in VARCHAR(128) columns (the schema before migrate_ids.py)
+    binary-v7    - the 16 bytes of a time-ordered UUIDv7 in BINARY(16) columns (the current schema)
+
+Each variant gets its own scratch table with the primary key (expense_id, user_id) and the (user_id, settled)
+index of ExpenseParticipants. Rows are inserted in batches of one expense with --participants shares, the way
+Expense(...) writes them, and the script reports the insert throughput and the size of the table and its indexes.
+The scratch tables are dropped at the end.
+
+Usage (from the repository root, with a JSON credentials file; {"backend": "sqlite", "database": "bench.db"} works too):
+    python bench/bench_ids.py --config src/db.json --rows 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from connector import Connector
+from ids import new_id, to_binary, EXPENSE, USER
+
+VARIANTS = {
+    "varchar-v4": ("VARCHAR(128)", lambda prefix: f"{prefix}{uuid4()}"),
+    "binary-v7": ("BINARY(16)", lambda prefix: to_binary(new_id(prefix))),
+}
+
+
+def create_table(connector: Connector, table: str, id_type: str):
+    if connector.backend.name == "sqlite":
+        id_type = "BLOB" if id_type.startswith("BINARY") else "TEXT"
+    connector.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    connector.cursor.execute(f"""
+        CREATE TABLE {table} (
+          expense_id {id_type} NOT NULL,
+          user_id {id_type} NOT NULL,
+          amount DECIMAL(10, 2) NOT NULL,
+          settled VARCHAR(8) NOT NULL,
+          PRIMARY KEY (expense_id, user_id)
+        )""")
+    connector.cursor.execute(f"CREATE INDEX {table}_user_settled ON {table} (user_id, settled)")
+
+
+def fill(connector: Connector, table: str, make_id, rows: int, participants: int, users: int) -> float:
+    """
+    Inserts rows shares and returns the number of rows inserted per second.
+    """
+    user_ids = [make_id(USER) for _ in range(users)]
+    query = connector.backend.translate(f"INSERT INTO {table} (expense_id, user_id, amount, settled) VALUES (%s, %s, %s, %s)")
+    began = time.perf_counter()
+    for _ in range(rows // participants):
+        expense_id = make_id(EXPENSE)
+        with connector.transaction():
+            connector.cursor.executemany(query, [(expense_id, user_id, 10, 'NO')
+                                                 for user_id in random.sample(user_ids, participants)])
+    return (rows // participants * participants) / (time.perf_counter() - began)
+
+
+def table_size(connector: Connector, table: str):
+    """
+    :return: (data bytes, index bytes) of the table
+    """
+    if connector.backend.name == "sqlite":
+        rows = connector.execute("SELECT s.name, SUM(s.pgsize) AS size FROM dbstat s JOIN sqlite_master m ON m.name = s.name "
+                                 "WHERE m.tbl_name = %s GROUP BY s.name", (table,))
+        sizes = {row['name']: row['size'] for row in rows}
+        data = sizes.pop(table, 0)
+        return data, sum(sizes.values())
+    connector.cursor.execute(f"ANALYZE TABLE {table}")
+    connector.cursor.fetchall()
+    row = connector.execute("SELECT DATA_LENGTH AS data, INDEX_LENGTH AS indexes FROM information_schema.TABLES "
+                            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,), fetchall = False)
+    return int(row['data']), int(row['indexes'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", required = True, help = "path to the JSON file with the database credentials")
+    parser.add_argument("--rows", type = int, default = 1_000_000, help = "rows inserted into each scratch table")
+    parser.add_argument("--participants", type = int, default = 5, help = "rows inserted per expense")
+    parser.add_argument("--users", type = int, default = 5000, help = "distinct user ids")
+    args = parser.parse_args()
+
+    connector = Connector(filepath = args.config)
+    print(f"{args.rows} rows, {args.participants} per expense, backend {connector.backend.name}")
+    print(f"{'ids':>12}{'rows/s':>12}{'data MB':>10}{'index MB':>10}")
+    for name, (id_type, make_id) in VARIANTS.items():
+        table = f"BenchIds_{name.replace('-', '_')}"
+        create_table(connector, table, id_type)
+        rate = fill(connector, table, make_id, args.rows, args.participants, args.users)
+        data, indexes = table_size(connector, table)
+        print(f"{name:>12}{rate:>12.0f}{data / 2 ** 20:>10.1f}{indexes / 2 ** 20:>10.1f}")
+        connector.cursor.execute(f"DROP TABLE {table}")
+    connector.close()
+
+
+if __name__ == "__main__":
+    main()
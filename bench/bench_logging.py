@@ -0,0 +1,69 @@
+"""
+Measures how much logging costs the code that logs. Every operation opens a Connector, loads a user and
+closes the connector, which writes a few DEBUG records per operation when DEBUG is enabled:
+
+    off          - the default WARNING level: DEBUG calls return after one level check
+    debug        - DEBUG records written to --output by the calling thread
+    background   - DEBUG records handed to a queue and written to --output by a background thread
+
+Usage (from the repository root; {"backend": "sqlite", "database": "bench.db"} works as credentials file):
+    python bench/bench_logging.py --config src/db.json --operations 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from connector import Connector
+from user import User
+from log import configure_logging
+
+MODES = {
+    "off": {"level": "WARNING"},
+    "debug": {"level": "DEBUG"},
+    "background": {"level": "DEBUG", "background": True},
+}
+
+
+def run(config: str, user_id: str, operations: int) -> float:
+    """
+    :return: operations per second
+    """
+    began = time.perf_counter()
+    for _ in range(operations):
+        connector = Connector(filepath = config)
+        User.get_user(user_id, connector)
+        connector.close()
+    return operations / (time.perf_counter() - began)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", required = True, help = "path to the JSON file with the database credentials")
+    parser.add_argument("--operations", type = int, default = 2000, help = "operations per mode")
+    parser.add_argument("--output", help = "file the log records are written to; defaults to a temporary file")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(tempfile.mkdtemp(), "bench_logging.log")
+    connector = Connector(filepath = args.config)
+    user = User(name = "Logging Bench", email = f"logging-bench-{os.getpid()}@example.com", password = "bench",
+                connector = connector)
+
+    print(f"{'logging':>12}{'ops/s':>10}{'log MB':>9}")
+    with open(output, "w") as stream:
+        for mode, settings in MODES.items():
+            configure_logging(stream = stream, **settings)
+            before = stream.tell()
+            rate = run(args.config, user.user_id, args.operations)
+            configure_logging(level = "WARNING", stream = stream)  # drains the background queue
+            print(f"{mode:>12}{rate:>10.0f}{(stream.tell() - before) / 2 ** 20:>9.2f}")
+
+    connector.execute("DELETE FROM Users WHERE user_id = %s", (user.user_id,))
+    connector.close()
+
+
+if __name__ == "__main__":
+    main()
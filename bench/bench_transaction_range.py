@@ -0,0 +1,117 @@
+"""
+Shows that Transaction.get_transactions_for_user date-range queries stay flat while the Transactions table grows.
+
+The table is grown in steps (by default to 10k, 100k and 1M rows) with transactions spread over five years
+between a pool of users. After each step the same 30-day, 50-row window is queried for one user and the
+median latency is reported. EXPLAIN output for both UNION ALL branches is printed once at the end so the
+(payer_id, timestamp) / (payee_id, timestamp) index usage can be checked.
+
+Usage (from the repository root, with a reachable database described by a JSON credentials file):
+    python bench/bench_transaction_range.py --config src/db.json --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from connector import Connector
+from user import User
+from group import Group
+from expense import Expense
+from ledger import Ledger
+from transaction import Transaction
+from ids import new_id, encode_params, TRANSACTION
+
+HISTORY_START = datetime(2020, 1, 1)
+HISTORY_DAYS = 5 * 365
+
+
+def grow_transactions(connector: Connector, count: int, expense_id: str, user_ids: list, batch: int = 5000):
+    """
+    Inserts count random transactions between user_ids, batch rows per executemany call.
+    """
+    insert_query = connector.backend.translate("INSERT INTO Transactions (trans_id, expense_id, payer_id, payee_id, amount, timestamp) "
+                                               "VALUES (%s, %s, %s, %s, %s, %s)")
+    remaining = count
+    while remaining > 0:
+        rows = []
+        for _ in range(min(batch, remaining)):
+            payer, payee = random.sample(user_ids, 2)
+            timestamp = HISTORY_START + timedelta(seconds = random.randrange(HISTORY_DAYS * 86400))
+            rows.append((new_id(TRANSACTION), expense_id, payer, payee, round(random.uniform(1, 500), 2), timestamp))
+        connector.cursor.executemany(insert_query, [encode_params(row, connector.binary_ids) for row in rows])
+        connector.commit()
+        remaining -= len(rows)
+
+
+def time_window(user: User, repeat: int) -> float:
+    """
+    Median milliseconds for a 30-day, 50-row window in the middle of the history.
+    """
+    start = HISTORY_START + timedelta(days = HISTORY_DAYS // 2)
+    end = start + timedelta(days = 30)
+    samples = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        Transaction.get_transactions_for_user(user, start, end, limit = 50)
+        samples.append((time.perf_counter() - began) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", required = True, help = "path to the JSON file with the database credentials")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [10_000, 100_000, 1_000_000],
+                        help = "Transactions table sizes to measure at")
+    parser.add_argument("--users", type = int, default = 1000, help = "users the transactions are spread over")
+    parser.add_argument("--repeat", type = int, default = 30, help = "queries per measurement")
+    args = parser.parse_args()
+
+    connector = Connector(filepath = args.config)
+    tag = uuid4().hex[:8]
+    users = [User(name = f"Range {i}", email = f"range-{tag}-{i}@example.com", password = "bench",
+                  connector = connector) for i in range(args.users)]
+    group = Group(admin = users[0], name = f"Range {tag}", members = users[:2], connector = connector)
+    expense = Expense(amount = 1.0, payer = users[0], group = group, participants = {users[0]: 1.0},
+                      connector = connector)
+    user_ids = [user.user_id for user in users]
+
+    print(f"{'table rows':>12}{'median ms':>12}")
+    inserted = 0
+    for size in sorted(args.sizes):
+        grow_transactions(connector, size - inserted, expense.expense_id, user_ids)
+        inserted = size
+        print(f"{size:>12}{time_window(users[1], args.repeat):>12.2f}")
+
+    print("\nEXPLAIN of the payer and payee branches:")
+    window_start = HISTORY_START + timedelta(days = HISTORY_DAYS // 2)
+    for branch, params in (("payer_id = %s", (user_ids[1],)), ("payee_id = %s AND payer_id != %s", (user_ids[1],) * 2)):
+        explain = "EXPLAIN QUERY PLAN" if connector.backend.name == "sqlite" else "EXPLAIN"
+        plan = connector.execute(f"{explain} SELECT * FROM Transactions WHERE {branch} AND timestamp >= %s "
+                                 f"AND timestamp <= %s ORDER BY timestamp, trans_id LIMIT 50",
+                                 params + (window_start, window_start + timedelta(days = 30)))
+        for row in plan:
+            if connector.backend.name == "sqlite":
+                print(f"  {branch:<36} {row['detail']}")
+            else:
+                print(f"  {branch:<36} key={row.get('key')} rows={row.get('rows')} extra={row.get('Extra')}")
+
+    Ledger.delete_expenses(connector, [expense.expense_id])
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    # the ledger rows of the group are at zero now, but still reference the group and its users
+    with connector.transaction():
+        for table in ("GroupDebts", "GroupBalances", "GroupMembers", "GroupDetails"):
+            connector.execute(f"DELETE FROM {table} WHERE group_id = %s", (group.group_id,))
+        connector.execute(f"DELETE FROM UserDueTotals WHERE user_id IN ({placeholders})", tuple(user_ids))
+        connector.execute(f"DELETE FROM Users WHERE user_id IN ({placeholders})", tuple(user_ids))
+    connector.close()
+
+
+if __name__ == "__main__":
+    main()
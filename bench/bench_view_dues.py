@@ -0,0 +1,126 @@
+"""
+Compares the ways view_dues can find a user's outstanding items once ExpenseParticipants holds 1M rows:
+
+    scan       - the old three-table join filtered on settled, with the (user_id, settled) index ignored
+    indexed    - the same join served by the (user_id, settled) index (Ledger.get_open_dues(materialized = False))
+    summary    - the OpenDues range scan plus the UserDueTotals row (Ledger.get_open_dues + Ledger.get_due_total)
+
+Expenses are written straight into the tables in batches, without going through Ledger.track, and the
+summary is filled afterwards with Ledger.rebuild_dues. Every expense is split between --participants users
+and most shares are already settled, so each user has a long history but only a few open items.
+Everything the script creates is deleted at the end.
+
+Usage (from the repository root, with a reachable database described by a JSON credentials file):
+    python bench/bench_view_dues.py --config src/db.json --rows 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from connector import Connector
+from user import User
+from group import Group
+from ledger import Ledger
+from ids import new_id, encode_params, EXPENSE
+
+SCAN_QUERY = """
+SELECT e.expense_id, e.description, e.amount, ep.amount AS owed_amount, g.name AS group_name
+FROM ExpenseParticipants ep IGNORE INDEX (user_settled)
+JOIN Expenses e ON e.expense_id = ep.expense_id
+JOIN GroupDetails g ON g.group_id = e.group_id
+WHERE ep.user_id = %s AND ep.settled != 'SETTLED' AND ep.user_id != e.paid_by AND ep.amount != 0
+"""
+
+
+def grow_expenses(connector: Connector, rows: int, group_id: str, user_ids: list, participants: int,
+                  open_share: float, batch: int = 2000):
+    """
+    Inserts expenses of group_id until ExpenseParticipants has rows more rows, batch expenses per executemany call.
+    """
+    # the raw cursor skips Connector.execute, so the queries are put into the backend's dialect here
+    expense_query = connector.backend.translate("INSERT INTO Expenses (expense_id, group_id, description, timestamp, paid_by, amount) "
+                                                "VALUES (%s, %s, %s, %s, %s, %s)")
+    participant_query = connector.backend.translate("INSERT INTO ExpenseParticipants (expense_id, user_id, amount, settled) "
+                                                    "VALUES (%s, %s, %s, %s)")
+    remaining = rows // participants
+    while remaining > 0:
+        expenses, shares = [], []
+        for _ in range(min(batch, remaining)):
+            expense_id = new_id(EXPENSE)
+            members = random.sample(user_ids, participants)
+            expenses.append((expense_id, group_id, "bench", datetime(2020, 1, 1) + timedelta(minutes = random.randrange(5 * 365 * 1440)),
+                             members[0], participants * 10))
+            shares.append((expense_id, members[0], 0, 'SETTLED'))
+            shares.extend((expense_id, user_id, 10, 'NO' if random.random() < open_share else 'SETTLED')
+                          for user_id in members[1:])
+        expenses = [encode_params(row, connector.binary_ids) for row in expenses]
+        shares = [encode_params(row, connector.binary_ids) for row in shares]
+        connector.cursor.executemany(expense_query, expenses)
+        connector.cursor.executemany(participant_query, shares)
+        connector.commit()
+        remaining -= len(expenses)
+
+
+def median_ms(function, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - began) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", required = True, help = "path to the JSON file with the database credentials")
+    parser.add_argument("--rows", type = int, default = 1_000_000, help = "ExpenseParticipants rows to create")
+    parser.add_argument("--users", type = int, default = 2000, help = "users the expenses are spread over")
+    parser.add_argument("--participants", type = int, default = 10, help = "participants per expense")
+    parser.add_argument("--open-share", type = float, default = 0.02, help = "fraction of shares left unsettled")
+    parser.add_argument("--repeat", type = int, default = 30, help = "queries per measurement")
+    args = parser.parse_args()
+
+    connector = Connector(filepath = args.config)
+    tag = uuid4().hex[:8]
+    users = [User(name = f"Dues {i}", email = f"dues-{tag}-{i}@example.com", password = "bench",
+                  connector = connector) for i in range(args.users)]
+    group = Group(admin = users[0], name = f"Dues {tag}", members = users[:2], connector = connector)
+    user_ids = [user.user_id for user in users]
+
+    grow_expenses(connector, args.rows, group.group_id, user_ids, args.participants, args.open_share)
+    Ledger.rebuild_dues(connector, group.group_id)
+    user_id = user_ids[1]
+
+    results = [
+        ("scan", lambda: connector.execute(SCAN_QUERY, (user_id,))),
+        ("indexed", lambda: Ledger.get_open_dues(user_id, connector, materialized = False)),
+        ("summary", lambda: (Ledger.get_open_dues(user_id, connector), Ledger.get_due_total(user_id, connector))),
+    ]
+    items = len(Ledger.get_open_dues(user_id, connector))
+    print(f"{args.rows} ExpenseParticipants rows, {items} open items for the measured user")
+    print(f"{'path':>10}{'median ms':>12}")
+    for name, function in results:
+        print(f"{name:>10}{median_ms(function, args.repeat):>12.2f}")
+
+    expense_ids = [row['expense_id'] for row in
+                   connector.execute("SELECT expense_id FROM Expenses WHERE group_id = %s", (group.group_id,))]
+    Ledger.delete_expenses(connector, expense_ids)
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    # the ledger rows of the group are at zero now, but still reference the group and its users
+    with connector.transaction():
+        for table in ("GroupDebts", "GroupBalances", "GroupMembers", "GroupDetails"):
+            connector.execute(f"DELETE FROM {table} WHERE group_id = %s", (group.group_id,))
+        connector.execute(f"DELETE FROM UserDueTotals WHERE user_id IN ({placeholders})", tuple(user_ids))
+        connector.execute(f"DELETE FROM Users WHERE user_id IN ({placeholders})", tuple(user_ids))
+    connector.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compares two result files written by bench/suite.py --json, e.g. from the commit before and after a change.
+
+An operation regresses when its p50, p95 or p99 latency grows by more than --threshold percent (and by more
+than --min-ms, so sub-millisecond noise is not reported), or when it issues more queries per call than before.
+The script exits with status 1 if any operation regressed, so it can gate a CI job.
+
+Usage (from the repository root):
+    python bench/compare.py before.json after.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def compare(before: dict, after: dict, threshold: float = 10, min_ms: float = 0.1) -> list:
+    """
+    :param before: results of the baseline run, as written by suite.py
+    :param after: results of the run to check
+    :param threshold: largest growth in percent that is not a regression
+    :param min_ms: largest growth in milliseconds that is not a regression, whatever the percentage
+    :return: one dictionary per operation of both runs with the values of both, the change in percent and the regressions found
+    """
+    rows = []
+    for name, new in after["operations"].items():
+        old = before["operations"].get(name)
+        if old is None:
+            continue
+        regressions = []
+        changes = {}
+        for metric in METRICS:
+            changes[metric] = (new[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+            if changes[metric] > threshold and new[metric] - old[metric] > min_ms:
+                regressions.append(metric)
+        if new["queries"] > old["queries"]:
+            regressions.append("queries")
+        rows.append({"operation": name, "before": old, "after": new, "change": changes, "regressions": regressions})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before", help = "results of the baseline run")
+    parser.add_argument("after", help = "results of the run to check")
+    parser.add_argument("--threshold", type = float, default = 10, help = "percent a latency may grow before it is a regression")
+    parser.add_argument("--min-ms", type = float, default = 0.1, help = "milliseconds a latency may grow before it is a regression")
+    args = parser.parse_args()
+
+    with open(args.before) as file:
+        before = json.load(file)
+    with open(args.after) as file:
+        after = json.load(file)
+    for side, results in (("before", before), ("after", after)):
+        environment = results["environment"]
+        print(f"{side:>7}: {(environment['commit'] or '?')[:12]}{' (dirty)' if environment['dirty'] else ''} "
+              f"{environment['backend']} {environment['dataset']}")
+    if before["environment"]["dataset"] != after["environment"]["dataset"]:
+        print("Warning: the runs used different datasets")
+
+    rows = compare(before, after, args.threshold, args.min_ms)
+    print(f"{'operation':>24}" + "".join(f"{metric[:3] + ' before':>12}{'after':>9}{'%':>7}" for metric in METRICS)
+          + f"{'queries':>12}")
+    for row in rows:
+        line = f"{row['operation']:>24}"
+        for metric in METRICS:
+            line += f"{row['before'][metric]:>12.2f}{row['after'][metric]:>9.2f}{row['change'][metric]:>+7.1f}"
+        line += f"{row['before']['queries']:>7.1f} -> {row['after']['queries']:<5.1f}"
+        if row["regressions"]:
+            line += "  REGRESSED: " + ", ".join(row["regressions"])
+        print(line)
+
+    regressed = [row["operation"] for row in rows if row["regressions"]]
+    print(f"{len(regressed)} of {len(rows)} operations regressed" + (f": {', '.join(regressed)}" if regressed else ""))
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
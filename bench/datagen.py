@@ -0,0 +1,195 @@
+"""
+Generates a realistic synthetic dataset for the benchmarks and writes it through the bulk paths:
+
+    users         - --users accounts, all with the password "bench"
+    groups        - --groups groups whose sizes follow a power law: most groups have a handful of members, a few have hundreds
+    expenses      - --expenses expenses spread over the groups in proportion to their size, each paid by a member and split
+                    between a random subset of the members with the equal, unequal, percentages or shares method
+    settlements   - a fraction of the open shares paid back in full or in part, with a Transactions row each
+
+Rows are inserted with Connector.execute_many inside one unit of work, without going through Ledger.track,
+and the ledger and dues summaries are filled afterwards with Ledger.rebuild and Ledger.rebuild_dues.
+
+Usage (from the repository root; {"backend": "sqlite", "database": "bench.db"} works as credentials file):
+    python bench/datagen.py --config src/db.json --users 10000 --groups 2000 --expenses 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from connector import Connector
+from user import User
+from ledger import Ledger
+from money import Money
+from splits import compute_split
+from ids import new_id, USER, GROUP, EXPENSE, TRANSACTION
+
+PASSWORD = "bench"
+SPLIT_METHODS = ("equal", "unequal", "percentages", "shares")
+TAGS = (None, "food", "travel", "rent", "utilities", "fun")
+START = datetime(2022, 1, 1)
+
+
+def group_sizes(groups: int, users: int, rng: random.Random, alpha: float = 1.6, max_size: int = 500) -> list:
+    """
+    :return: the number of members of each group, drawn from a Pareto distribution with shape alpha and at least 2
+    """
+    limit = max(2, min(max_size, users))
+    return [min(limit, int(2 * rng.paretovariate(alpha))) for _ in range(groups)]
+
+
+def split_options(method: str, amount: Money, participants: list, rng: random.Random) -> dict:
+    """
+    :return: the options compute_split needs for the method, with random weights
+    """
+    if method == "unequal":
+        weights = [rng.randint(1, 10) for _ in participants]
+        return {"amounts": [share.to_decimal() for share in amount.allocate(weights)]}
+    if method == "percentages":
+        parts = [rng.randint(1, 10) for _ in participants]
+        return {"percentages": [share.to_decimal() for share in Money(100).allocate(parts)]}
+    if method == "shares":
+        return {"shares": [rng.choice((1, 1, 2, 3)) for _ in participants]}
+    return {}
+
+
+def generate(connector: Connector, users: int = 1000, groups: int = 200, expenses: int = 20000,
+             participants: int = 6, settled: float = 0.6, partial: float = 0.1, seed: int = 1,
+             batch: int = 5000) -> SimpleNamespace:
+    """
+    Writes a synthetic dataset into the connected database.
+    :param users: number of users
+    :param groups: number of groups, with power-law sizes
+    :param expenses: number of expenses
+    :param participants: largest number of participants of an expense, the payer included
+    :param settled: fraction of the open shares that are paid back completely
+    :param partial: fraction of the open shares that are paid back in part
+    :param seed: seed of the random generator, so runs with the same arguments produce the same shape of data
+    :param batch: rows per execute_many call
+    :return: namespace with the lists user_ids, emails, group_ids and expense_ids, the members of each group
+             (members[group_id], admin first), the password of every user and the number of rows written per table
+    """
+    rng = random.Random(seed)
+    hashed = User.hash_password(PASSWORD)
+    run = f"{seed}-{os.getpid()}-{int(time.time())}"
+    user_ids = [new_id(USER) for _ in range(users)]
+    emails = [f"bench-{run}-{index}@example.com" for index in range(users)]
+
+    members, group_rows, member_rows = {}, [], []
+    for index, size in enumerate(group_sizes(groups, users, rng)):
+        group_id = new_id(GROUP)
+        members[group_id] = rng.sample(user_ids, size)
+        group_rows.append((group_id, f"Bench group {index}", None, members[group_id][0], START))
+        member_rows.extend((group_id, user_id) for user_id in members[group_id])
+    group_ids = list(members)
+
+    weights = [len(members[group_id]) for group_id in group_ids]
+    expense_rows, share_rows, transaction_rows, expense_ids = [], [], [], []
+    for index, group_id in enumerate(rng.choices(group_ids, weights = weights, k = expenses)):
+        expense_id = new_id(EXPENSE)
+        expense_ids.append(expense_id)
+        payer_id = rng.choice(members[group_id])
+        others = [user_id for user_id in members[group_id] if user_id != payer_id]
+        sharing = [payer_id] + rng.sample(others, min(len(others), rng.randint(1, participants - 1)))
+        amount = Money.from_cents(rng.randint(100, 50000))
+        method = rng.choice(SPLIT_METHODS)
+        split = compute_split(method, amount, sharing, **split_options(method, amount, sharing, rng))
+        timestamp = START + timedelta(minutes = index)
+        expense_rows.append((expense_id, group_id, f"Bench expense {index}", rng.choice(TAGS), timestamp, payer_id,
+                             amount.to_decimal()))
+        for user_id, share in split.items():
+            state, remaining = ("SETTLED" if user_id == payer_id else "NO"), share
+            if user_id != payer_id and share.cents:
+                draw = rng.random()
+                if draw < settled:
+                    state, paid = "SETTLED", share
+                elif draw < settled + partial and share.cents > 1:
+                    paid = Money.from_cents(rng.randint(1, share.cents - 1))
+                    state, remaining = "PARTIAL", share - paid
+                else:
+                    paid = None
+                if paid is not None:
+                    transaction_rows.append((new_id(TRANSACTION), expense_id, user_id, payer_id, paid.to_decimal(),
+                                             timestamp + timedelta(days = rng.randint(1, 30))))
+            share_rows.append((expense_id, user_id, remaining.to_decimal(), state))
+
+    tables = [
+        ("Users", "INSERT INTO Users (user_id, name, email, password, created) VALUES (%s, %s, %s, %s, %s)",
+         [(user_id, f"Bench User {index}", email, hashed, START) for index, (user_id, email) in enumerate(zip(user_ids, emails))]),
+        ("GroupDetails", "INSERT INTO GroupDetails (group_id, name, description, admin_id, created) VALUES (%s, %s, %s, %s, %s)",
+         group_rows),
+        ("GroupMembers", "INSERT INTO GroupMembers (group_id, user_id) VALUES (%s, %s)", member_rows),
+        ("Expenses", "INSERT INTO Expenses (expense_id, group_id, description, tag, timestamp, paid_by, amount) "
+                     "VALUES (%s, %s, %s, %s, %s, %s, %s)", expense_rows),
+        ("ExpenseParticipants", "INSERT INTO ExpenseParticipants (expense_id, user_id, amount, settled) VALUES (%s, %s, %s, %s)",
+         share_rows),
+        ("Transactions", "INSERT INTO Transactions (trans_id, expense_id, payer_id, payee_id, amount, timestamp) "
+                         "VALUES (%s, %s, %s, %s, %s, %s)", transaction_rows),
+    ]
+    with connector.transaction():
+        for table, query, rows in tables:
+            for start in range(0, len(rows), batch):
+                connector.execute_many(query, rows[start:start + batch])
+    Ledger.rebuild(connector)
+    Ledger.rebuild_dues(connector)
+
+    return SimpleNamespace(user_ids = user_ids, emails = emails, group_ids = group_ids, expense_ids = expense_ids,
+                           members = members, password = PASSWORD,
+                           rows = {table: len(rows) for table, _, rows in tables})
+
+
+def remove(connector: Connector, dataset: SimpleNamespace, chunk: int = 1000):
+    """
+    Deletes every row of a dataset returned by generate(), including its ledger and dues summary rows, in one unit of work.
+    Generated users only take part in generated groups, so their UserDueTotals rows are deleted as a whole.
+    """
+    deletes = [
+        ("Transactions", "expense_id", dataset.expense_ids),
+        ("ExpenseParticipants", "expense_id", dataset.expense_ids),
+        ("Expenses", "expense_id", dataset.expense_ids),
+        ("OpenDues", "group_id", dataset.group_ids),
+        ("GroupDebts", "group_id", dataset.group_ids),
+        ("GroupBalances", "group_id", dataset.group_ids),
+        ("GroupMembers", "group_id", dataset.group_ids),
+        ("GroupDetails", "group_id", dataset.group_ids),
+        ("UserDueTotals", "user_id", dataset.user_ids),
+        ("Users", "user_id", dataset.user_ids),
+    ]
+    with connector.transaction():
+        for table, column, ids in deletes:
+            for start in range(0, len(ids), chunk):
+                part = ids[start:start + chunk]
+                connector.execute(f"DELETE FROM {table} WHERE {column} IN ({', '.join(['%s'] * len(part))})", tuple(part))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", required = True, help = "path to the JSON file with the database credentials")
+    parser.add_argument("--users", type = int, default = 1000, help = "number of users")
+    parser.add_argument("--groups", type = int, default = 200, help = "number of groups")
+    parser.add_argument("--expenses", type = int, default = 20000, help = "number of expenses")
+    parser.add_argument("--participants", type = int, default = 6, help = "largest number of participants of an expense")
+    parser.add_argument("--settled", type = float, default = 0.6, help = "fraction of the open shares paid back completely")
+    parser.add_argument("--partial", type = float, default = 0.1, help = "fraction of the open shares paid back in part")
+    parser.add_argument("--seed", type = int, default = 1, help = "seed of the random generator")
+    args = parser.parse_args()
+
+    connector = Connector(filepath = args.config)
+    began = time.perf_counter()
+    dataset = generate(connector, args.users, args.groups, args.expenses, args.participants, args.settled,
+                       args.partial, args.seed)
+    elapsed = time.perf_counter() - began
+    for table, rows in dataset.rows.items():
+        print(f"{table:>20}{rows:>10}")
+    print(f"{sum(dataset.rows.values())} rows in {elapsed:.1f} s")
+    connector.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Times the operations the application runs most, on a synthetic dataset written by datagen.py:
+
+    login                       - User.login
+    get_group                   - Group.get_group
+    get_group_expenses          - Expense.get_group_expenses, touching every expense's payer and participants
+    stream_group_expenses       - the same through Expense.stream_group_expenses
+    group_expense_summaries     - Expense.get_group_expense_summaries, the view_expenses screen
+    view_dues                   - Ledger.get_open_dues, Ledger.get_due_total and Ledger.get_user_balances
+    view_group_dues             - Group.get_group and Ledger.get_dues_owed_to
+    transactions_for_user       - Transaction.get_transactions_for_user over the user's whole history
+    stream_transactions         - the same through Transaction.stream_transactions_for_user
+    create_expense              - Expense(...) split equally between part of a group
+    edit_expense                - edit_expense of one of those expenses with a new amount and description, split equally again
+    delete_expense              - delete_expense of one of those expenses
+
+Groups and users are picked at random, groups in proportion to their size. Whatever an operation needs loaded
+first (a User, a Group or an Expense) is loaded outside of the timed part. Every timed call runs inside
+Connector.profile(), so next to the p50/p95/p99 latencies the suite reports the queries and round trips per call.
+Expenses created by the suite are deleted by it again, and the dataset is removed at the end.
+
+Without --config the suite runs against a temporary SQLite database, the local stand-in for MySQL.
+With --json the results and the environment they were measured in are written out for bench/compare.py.
+
+Usage (from the repository root):
+    python bench/suite.py --json before.json
+    python bench/suite.py --config src/db.json --users 10000 --groups 2000 --expenses 200000 --repeat 500 --json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from connector import Connector
+from user import User
+from group import Group
+from expense import Expense
+from transaction import Transaction
+from ledger import Ledger
+from money import Money
+from splits import compute_split
+from datagen import generate, remove
+
+
+def pick_group(context) -> str:
+    return context.rng.choices(context.dataset.group_ids, weights = context.group_weights)[0]
+
+
+def pick_user(context) -> int:
+    return context.rng.randrange(len(context.dataset.user_ids))
+
+
+def prepare_new_expense(context):
+    group = Group.get_group(pick_group(context), context.connector)
+    members = [group.admin] + context.rng.sample(group.members, min(len(group.members), 4))
+    amount = Money.from_cents(context.rng.randint(100, 50000))
+    return group, members[0], amount, compute_split("equal", amount, members)
+
+
+def create_expense(context, group, payer, amount, participants):
+    expense = Expense(amount = amount, payer = payer, group = group, participants = participants,
+                      description = "Suite expense", connector = context.connector)
+    context.created.append(expense.expense_id)
+
+
+def get_group_expenses(context, group_id):
+    for expense in Expense.get_group_expenses(group_id, context.connector):
+        expense.payer, expense.participants
+
+
+def stream_group_expenses(context, group_id):
+    for expense in Expense.stream_group_expenses(group_id, context.connector):
+        expense.payer, expense.participants
+
+
+def view_dues(context, user_id):
+    Ledger.get_open_dues(user_id, context.connector)
+    Ledger.get_due_total(user_id, context.connector)
+    Ledger.get_user_balances(user_id, context.connector)
+
+
+def view_group_dues(context, group_id, user_id):
+    Group.get_group(group_id, context.connector)
+    Ledger.get_dues_owed_to(group_id, user_id, context.connector)
+
+
+def prepare_group_member(context):
+    group_id = pick_group(context)
+    return group_id, context.rng.choice(context.dataset.members[group_id])
+
+
+# name -> (prepare, run): prepare(context) returns the arguments of run(context, *arguments) and is not timed
+OPERATIONS = {
+    "login": (lambda context: (context.dataset.emails[pick_user(context)],),
+              lambda context, email: User.login(email, context.dataset.password, context.connector)),
+    "get_group": (lambda context: (pick_group(context),),
+                  lambda context, group_id: Group.get_group(group_id, context.connector)),
+    "get_group_expenses": (lambda context: (pick_group(context),), get_group_expenses),
+    "stream_group_expenses": (lambda context: (pick_group(context),), stream_group_expenses),
+    "group_expense_summaries": (lambda context: (pick_group(context),),
+                                lambda context, group_id: Expense.get_group_expense_summaries(group_id, context.connector)),
+    "view_dues": (lambda context: (context.dataset.user_ids[pick_user(context)],), view_dues),
+    "view_group_dues": (prepare_group_member, view_group_dues),
+    "transactions_for_user": (lambda context: (User.get_user(context.dataset.user_ids[pick_user(context)], context.connector),),
+                              lambda context, user: Transaction.get_transactions_for_user(user)),
+    "stream_transactions": (lambda context: (User.get_user(context.dataset.user_ids[pick_user(context)], context.connector),),
+                            lambda context, user: sum(1 for _ in Transaction.stream_transactions_for_user(user))),
+    "create_expense": (prepare_new_expense, create_expense),
+    "edit_expense": (lambda context: (Expense.get_expense(context.rng.choice(context.created), context.connector),),
+                     lambda context, expense: expense.edit_expense(amount = expense.amount + Money(1), description = "Edited",
+                                                                   split_method = "equal")),
+    "delete_expense": (lambda context: (Expense.get_expense(context.created.pop(), context.connector),),
+                       lambda context, expense: expense.delete_expense()),
+}
+
+
+def measure(context, name: str, repeat: int, warmup: int) -> dict:
+    """
+    Runs an operation warmup + repeat times and summarizes the timed runs.
+    :return: dictionary with the number of runs, the latency percentiles in milliseconds and the queries and round trips per run
+    """
+    prepare, run = OPERATIONS[name]
+    latencies, queries, round_trips = [], [], []
+    for iteration in range(warmup + repeat):
+        arguments = prepare(context)
+        with context.connector.profile() as profile:
+            began = time.perf_counter()
+            run(context, *arguments)
+            elapsed = time.perf_counter() - began
+        if iteration >= warmup:
+            latencies.append(elapsed * 1000)
+            queries.append(profile.query_count)
+            round_trips.append(profile.round_trips)
+    cuts = statistics.quantiles(latencies, n = 100, method = "inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "runs": repeat,
+        "p50_ms": cuts[49],
+        "p95_ms": cuts[94],
+        "p99_ms": cuts[98],
+        "mean_ms": statistics.fmean(latencies),
+        "max_ms": max(latencies),
+        "queries": statistics.fmean(queries),
+        "round_trips": statistics.fmean(round_trips),
+    }
+
+
+def environment(connector: Connector, args) -> dict:
+    """
+    :return: what the results were measured on: commit, interpreter, machine, backend and dataset
+    """
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+    def git(*command):
+        try:
+            return subprocess.run(["git", *command], cwd = root, capture_output = True, text = True, check = True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "time": datetime.now().isoformat(timespec = "seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": connector.backend.name,
+        "dataset": {"users": args.users, "groups": args.groups, "expenses": args.expenses, "seed": args.seed},
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", help = "path to the JSON file with the database credentials; defaults to a temporary SQLite database")
+    parser.add_argument("--users", type = int, default = 1000, help = "number of generated users")
+    parser.add_argument("--groups", type = int, default = 200, help = "number of generated groups")
+    parser.add_argument("--expenses", type = int, default = 20000, help = "number of generated expenses")
+    parser.add_argument("--seed", type = int, default = 1, help = "seed of the data generator and of the operation picks")
+    parser.add_argument("--repeat", type = int, default = 200, help = "timed runs per operation")
+    parser.add_argument("--warmup", type = int, default = 10, help = "untimed runs per operation before the timed ones")
+    parser.add_argument("--only", nargs = "+", choices = list(OPERATIONS), help = "operations to run; defaults to all")
+    parser.add_argument("--json", help = "file the results are written to, for bench/compare.py")
+    args = parser.parse_args()
+
+    scratch = None
+    if args.config:
+        connector = Connector(filepath = args.config)
+    else:
+        scratch = tempfile.mkdtemp()
+        connector = Connector(backend = "sqlite", database = os.path.join(scratch, "suite.db"))
+
+    began = time.perf_counter()
+    dataset = generate(connector, args.users, args.groups, args.expenses, seed = args.seed)
+    print(f"{sum(dataset.rows.values())} rows generated in {time.perf_counter() - began:.1f} s, backend {connector.backend.name}")
+
+    context = SimpleNamespace(connector = connector, dataset = dataset, rng = random.Random(args.seed), created = [],
+                              group_weights = [len(dataset.members[group_id]) for group_id in dataset.group_ids])
+    names = [name for name in OPERATIONS if not args.only or name in args.only]
+    if any(name in names for name in ("edit_expense", "delete_expense")) and "create_expense" not in names:
+        # edit_expense and delete_expense work on the expenses create_expense adds, one per run
+        names.insert(0, "create_expense")
+
+    results, measured_on = {}, environment(connector, args)
+    print(f"{'operation':>24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'trips':>7}")
+    try:
+        for name in names:
+            results[name] = measure(context, name, args.repeat, args.warmup)
+            result = results[name]
+            print(f"{name:>24}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                  f"{result['queries']:>9.1f}{result['round_trips']:>7.1f}")
+    finally:
+        for expense_id in context.created:
+            Expense.get_expense(expense_id, connector).delete_expense()
+        if scratch:
+            connector.close()
+            shutil.rmtree(scratch, ignore_errors = True)
+        else:
+            remove(connector, dataset)
+            connector.close()
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"environment": measured_on, "operations": results}, file, indent = 2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
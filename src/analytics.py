@@ -0,0 +1,173 @@
+from connector import Connector
+from decimal import Decimal
+from typing import List, Dict, Iterable
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; only the analytics path needs it
+    np = None
+
+
+class BalanceArrays:
+    """
+    A group's balances computed with vectorized NumPy operations instead of Python loops over Expense.participants.
+
+    Members are numbered 0..n-1 (see members/index). Amounts are int64 cents, so every total is exact.
+    An open share is an ExpenseParticipants row that is not SETTLED and is not the payer's own row, as in view_group_dues.
+
+    Per member (arrays of length n):
+        owed         - open shares the member still owes
+        owed_to      - open shares still owed to the member
+        net          - owed_to - owed, positive when the member is owed money
+        paid         - total amount of the expenses the member paid for
+        sent         - payments (Transactions) the member made
+        received     - payments the member received
+
+    Pairwise debts are kept sparse as pair_debtor/pair_creditor (int32 member indices) and pair_cents (int64),
+    one entry per (debtor, creditor) with open shares; debt_matrix() expands them into a dense n x n matrix.
+    """
+
+    def __init__(self, members: List[str], share_rows: Iterable[tuple], expense_rows: Iterable[tuple] = (),
+                 transaction_rows: Iterable[tuple] = ()):
+        """
+        :param members: user_ids of the group's members. Ids that only appear in the rows (e.g. former members) are numbered after them
+        :param share_rows: (debtor_id, creditor_id, amount) per open share
+        :param expense_rows: (paid_by, amount) per expense of the group
+        :param transaction_rows: (payer_id, payee_id, amount) per payment made against the group's expenses
+        """
+        if np is None:
+            raise ImportError("ERROR[BalanceArrays.__init__]: numpy is required for the analytics path (pip install numpy)")
+        self.members = list(dict.fromkeys(members))
+        self.index = {user_id: position for position, user_id in enumerate(self.members)}
+
+        debtor, creditor, share_cents = self._columns(share_rows, 2)
+        payer, paid_cents = self._columns(expense_rows, 1)
+        sender, receiver, sent_cents = self._columns(transaction_rows, 2)
+        count = len(self.members)
+
+        self.owed = self._totals(debtor, share_cents, count)
+        self.owed_to = self._totals(creditor, share_cents, count)
+        self.net = self.owed_to - self.owed
+        self.paid = self._totals(payer, paid_cents, count)
+        self.sent = self._totals(sender, sent_cents, count)
+        self.received = self._totals(receiver, sent_cents, count)
+
+        # Aggregate shares per (debtor, creditor) through a flat pair key, which stays O(shares) however large the group is
+        width = max(count, 1)
+        pair_keys, positions = np.unique(debtor.astype(np.int64) * width + creditor, return_inverse = True)
+        self.pair_cents = np.zeros(len(pair_keys), dtype = np.int64)
+        np.add.at(self.pair_cents, positions, share_cents)
+        self.pair_debtor = (pair_keys // width).astype(np.int32)
+        self.pair_creditor = (pair_keys % width).astype(np.int32)
+
+    def _numbers(self, column):
+        """
+        Numbers the ids of an object array, one per row, without running Python code per row: the hashes of the ids are looked up
+        with np.searchsorted among the sorted hashes of the members, and every row is then compared with the member it was matched to.
+        Rows that do not match (ids that are not members yet, or a hash collision) are grouped with np.unique and numbered after
+        the members in the order they first appear.
+        :return: int32 array of member indices, one per element of column
+        """
+        numbers = np.zeros(len(column), dtype = np.int32)
+        if not len(column):
+            return numbers
+        if self.members:
+            member_keys = np.fromiter(map(hash, self.members), dtype = np.int64, count = len(self.members))
+            order = np.argsort(member_keys, kind = "stable").astype(np.int32)
+            slots = np.searchsorted(member_keys[order], np.fromiter(map(hash, column), dtype = np.int64, count = len(column)))
+            numbers = order[np.minimum(slots, len(order) - 1)]
+            misses = np.flatnonzero(np.array(self.members, dtype = object)[numbers] != column)
+        else:
+            misses = np.arange(len(column))
+        if len(misses):
+            distinct, first, inverse = np.unique(column[misses], return_index = True, return_inverse = True)
+            positions = np.empty(len(distinct), dtype = np.int32)
+            for rank in np.argsort(first, kind = "stable"):
+                user_id = column[misses[first[rank]]]  # the object from the row, not a copy made by np.unique
+                position = self.index.get(user_id)
+                if position is None:
+                    position = self.index[user_id] = len(self.members)
+                    self.members.append(user_id)
+                positions[rank] = position
+            numbers[misses] = positions[inverse.reshape(-1)]
+        return numbers
+
+    def _columns(self, rows: Iterable[tuple], id_columns: int) -> list:
+        """
+        Splits rows into one int32 index array per id column and an int64 cents array for the last column.
+        The columns are read with itemgetter, so no Python code runs per row.
+        """
+        rows = rows if isinstance(rows, list) else list(rows)
+        ids = [self._numbers(np.fromiter(map(itemgetter(column), rows), dtype = object, count = len(rows)))
+               for column in range(id_columns)]
+        # DECIMAL(10, 2) amounts are exact after scaling by 100 and rounding, so the conversion can go through float64 in bulk
+        amounts = np.fromiter(map(itemgetter(id_columns), rows), dtype = np.float64, count = len(rows))
+        cents = np.rint(amounts * 100).astype(np.int64)
+        return ids + [cents]
+
+    @staticmethod
+    def _totals(positions, cents, count: int):
+        # add.at on int64 keeps the sums exact; bincount would go through float64 weights
+        totals = np.zeros(count, dtype = np.int64)
+        np.add.at(totals, positions, cents)
+        return totals
+
+    def debt_matrix(self):
+        """
+        :return: dense n x n int64 matrix where [i, j] is what member i still owes member j, in cents. Needs n^2 * 8 bytes
+        """
+        count = len(self.members)
+        matrix = np.zeros((count, count), dtype = np.int64)
+        matrix[self.pair_debtor, self.pair_creditor] = self.pair_cents
+        return matrix
+
+    def dues_owed_to(self, user_id: str) -> Dict[str, Decimal]:
+        """
+        What every member still owes user_id, the figures view_group_dues prints.
+        :return: dictionary mapping debtor user_id to the amount owed
+        """
+        position = self.index.get(user_id)
+        if position is None:
+            return {}
+        selected = self.pair_creditor == position
+        return {self.members[debtor]: Decimal(int(cents)).scaleb(-2)
+                for debtor, cents in zip(self.pair_debtor[selected], self.pair_cents[selected]) if cents}
+
+    def balances(self) -> Dict[str, Decimal]:
+        """
+        :return: dictionary mapping every member with a non-zero net balance to it
+        """
+        nonzero = np.flatnonzero(self.net)
+        return {self.members[position]: Decimal(int(self.net[position])).scaleb(-2) for position in nonzero}
+
+    @staticmethod
+    def load(group_id: str, connector: Connector) -> 'BalanceArrays':
+        """
+        Loads a group's members, open shares, expenses and payments in four queries and computes the arrays.
+        :param group_id: group to load
+        :param connector: connector to read through
+        :return: BalanceArrays object
+        """
+        member_rows = connector.execute("""
+        SELECT admin_id AS user_id FROM GroupDetails WHERE group_id = %s
+        UNION
+        SELECT user_id FROM GroupMembers WHERE group_id = %s
+        """, (group_id, group_id)) or []
+        share_rows = connector.execute("""
+        SELECT ep.user_id, e.paid_by, ep.amount
+        FROM Expenses e
+        JOIN ExpenseParticipants ep ON ep.expense_id = e.expense_id
+        WHERE e.group_id = %s AND ep.settled != 'SETTLED' AND ep.user_id != e.paid_by
+        """, (group_id,)) or []
+        expense_rows = connector.execute("SELECT paid_by, amount FROM Expenses WHERE group_id = %s", (group_id,)) or []
+        transaction_rows = connector.execute("""
+        SELECT t.payer_id, t.payee_id, t.amount
+        FROM Transactions t
+        JOIN Expenses e ON e.expense_id = t.expense_id
+        WHERE e.group_id = %s
+        """, (group_id,)) or []
+        return BalanceArrays([row['user_id'] for row in member_rows],
+                             [(row['user_id'], row['paid_by'], row['amount']) for row in share_rows],
+                             [(row['paid_by'], row['amount']) for row in expense_rows],
+                             [(row['payer_id'], row['payee_id'], row['amount']) for row in transaction_rows])
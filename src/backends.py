@@ -0,0 +1,192 @@
+import os
+import re
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+import mysql.connector
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db.sql")
+
+
+class MySQLBackend:
+    """
+    The MySQL server the application was written against. Queries are sent unchanged.
+    """
+    name = "mysql"
+    Error = mysql.connector.Error
+    # Single-row INSERTs given to Connector.execute_many are sent as multi-row statements sized to max_allowed_packet
+    multi_row_insert = True
+    # An unbuffered cursor keeps its connection busy until its last row is read, so Connector.stream reads on a connection of its own
+    stream_connection = True
+
+    def connect(self, config: dict):
+        """
+        :param config: keyword arguments for mysql.connector.connect()
+        """
+        return mysql.connector.connect(**config)
+
+    def cursor(self, db):
+        return db.cursor(dictionary = True)
+
+    def stream_cursor(self, db, as_dict: bool = True, buffered: bool = False):
+        """
+        :param buffered: read the whole result into the client on execute, so the connection stays usable while the rows are fetched
+        :return: a cursor for Connector.stream. Unbuffered, rows stay on the server until they are fetched
+        """
+        return db.cursor(dictionary = as_dict, buffered = buffered)
+
+    def translate(self, query: str) -> str:
+        return query
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+# Every DECIMAL column in db.sql has two decimal places. Values are quantized on the way out, so the float
+# arithmetic SQLite uses for NUMERIC columns (e.g. amount = amount + excluded.amount) never shows up in results.
+_CENTS = Decimal("0.01")
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DECIMAL", lambda value: Decimal(value.decode()).quantize(_CENTS))
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+
+
+class SQLiteBackend:
+    """
+    A single SQLite database file, for running without a MySQL server and for benchmarking the real queries locally.
+
+    Connections use WAL journaling, so readers are never blocked by the writer, and keep up to cached_statements prepared statements.
+    Queries are translated from the MySQL dialect the models are written in once per distinct query text:
+    %s placeholders become ?, START TRANSACTION becomes BEGIN, ON DUPLICATE KEY UPDATE becomes an ON CONFLICT upsert
+    and row locks (FOR UPDATE) are dropped because SQLite locks the whole database for the writer anyway.
+    The schema is translated from db.sql and created when a connection is prepared.
+    """
+    name = "sqlite"
+    Error = sqlite3.Error
+    # executemany() reuses one prepared statement, which is what SQLite is fastest at
+    multi_row_insert = False
+    # SQLite steps through a result as it is fetched and other cursors of the connection can run in between
+    stream_connection = False
+
+    def __init__(self, cached_statements: int = 256, busy_timeout: float = 30):
+        """
+        :param cached_statements: prepared statements kept per connection
+        :param busy_timeout: seconds a connection waits for another connection's write lock before failing
+        """
+        self._cached_statements = cached_statements
+        self._busy_timeout = busy_timeout
+
+    def connect(self, config: dict):
+        """
+        :param config: connection arguments; "database" is the path of the database file, the others are ignored
+        """
+        db = sqlite3.connect(config.get("database") or ":memory:", timeout = self._busy_timeout,
+                             detect_types = sqlite3.PARSE_DECLTYPES, cached_statements = self._cached_statements,
+                             isolation_level = None, check_same_thread = False)
+        db.row_factory = _dict_row
+        db.execute("PRAGMA journal_mode = WAL")
+        db.execute("PRAGMA synchronous = NORMAL")
+        db.execute("PRAGMA foreign_keys = ON")
+        return db
+
+    def cursor(self, db):
+        return db.cursor()
+
+    def stream_cursor(self, db, as_dict: bool = True, buffered: bool = False):
+        """
+        :return: a cursor for Connector.stream. SQLite results are always read a row at a time, so buffered is ignored
+        """
+        cursor = db.cursor()
+        if not as_dict:
+            cursor.row_factory = None
+        return cursor
+
+    def translate(self, query: str) -> str:
+        return _translate_query(query)
+
+    def prepare(self, db):
+        """
+        Creates the tables and indexes of db.sql that do not exist yet.
+        """
+        db.executescript(translate_schema())
+
+
+_PLACEHOLDER = re.compile(r"%s")
+_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE\b", re.IGNORECASE)
+_INDEX_HINT = re.compile(r"\s+(?:USE|IGNORE|FORCE)\s+INDEX\s*\([^)]*\)", re.IGNORECASE)
+_START_TRANSACTION = re.compile(r"^\s*START\s+TRANSACTION\s*;?\s*$", re.IGNORECASE)
+_ON_DUPLICATE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_VALUES_REFERENCE = re.compile(r"\bVALUES\s*\(\s*(\w+)\s*\)", re.IGNORECASE)
+
+
+@lru_cache(maxsize = 1024)
+def _translate_query(query: str) -> str:
+    if _START_TRANSACTION.match(query):
+        return "BEGIN"
+    query = _FOR_UPDATE.sub("", query)
+    query = _INDEX_HINT.sub("", query)
+    duplicate = _ON_DUPLICATE.search(query)
+    if duplicate:
+        assignments = _VALUES_REFERENCE.sub(r"excluded.\1", query[duplicate.end():])
+        query = f"{query[:duplicate.start()]}ON CONFLICT DO UPDATE SET{assignments}"
+    return _PLACEHOLDER.sub("?", query)
+
+
+_KEY_LINE = re.compile(r"^(UNIQUE\s+)?KEY\s+(\w+)\s*(\([^)]*\))$", re.IGNORECASE)
+_ENUM_COLUMN = re.compile(r"^(\w+)\s+ENUM\s*(\([^)]*\))(.*)$", re.IGNORECASE)
+_TABLE_NAME = re.compile(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+
+
+def translate_schema(path: str = SCHEMA_PATH) -> str:
+    """
+    Translates the MySQL schema in db.sql into a SQLite script: ENUM columns become TEXT with a CHECK constraint, BINARY ids become BLOB,
+    inline KEY and UNIQUE KEY definitions become CREATE INDEX statements and the CREATE DATABASE/USE statements are dropped.
+    Column types are kept, so DECIMAL and DATETIME values are converted back by the converters registered in this module.
+    :param path: path of the MySQL schema
+    :return: SQLite script that can be run repeatedly
+    """
+    with open(path, "r") as file:
+        text = "\n".join(line.split("--")[0].rstrip() for line in file)
+
+    statements = []
+    for statement in (part.strip() for part in text.split(";")):
+        table = _TABLE_NAME.match(statement)
+        if not table:
+            continue
+        head, body = statement.split("(", 1)
+        body = body.rsplit(")", 1)[0]
+        columns, indexes = [], []
+        for line in (line.strip().rstrip(",") for line in body.splitlines()):
+            if not line:
+                continue
+            key = _KEY_LINE.match(line)
+            enum = _ENUM_COLUMN.match(line)
+            if key:
+                unique, index_name, index_columns = key.groups()
+                indexes.append(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {table.group(1)}_{index_name} "
+                               f"ON {table.group(1)} {index_columns};")
+            elif enum:
+                column, values, rest = enum.groups()
+                columns.append(f"{column} TEXT{rest} CHECK ({column} IN {values})")
+            else:
+                line = re.sub(r"\bTINYTEXT\b", "TEXT", line, flags = re.IGNORECASE)
+                columns.append(re.sub(r"\bBINARY\s*\(\d+\)", "BLOB", line, flags = re.IGNORECASE))
+        statements.append(f"{head.strip()} (\n  " + ",\n  ".join(columns) + "\n);")
+        statements.extend(indexes)
+    return "\n".join(statements)
+
+
+BACKENDS = {"mysql": MySQLBackend, "sqlite": SQLiteBackend}
+
+
+def get_backend(name: str):
+    """
+    :param name: "mysql" or "sqlite"
+    :return: a new backend object
+    """
+    try:
+        return BACKENDS[name.lower()]()
+    except KeyError:
+        raise ValueError(f"ERROR[get_backend]: Unknown backend {name!r}. Use one of: {', '.join(BACKENDS)}.")
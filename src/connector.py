@@ -1,11 +1,334 @@
 import json
+import re
+import threading
+import time
+from collections import deque, OrderedDict
+from contextlib import contextmanager, nullcontext
 import mysql.connector
+from backends import get_backend
+from ids import encode_params, decode_row, decode_values, ID_COLUMNS
+from profiling import QueryProfile, call_site
+from log import get_logger
+
+log = get_logger("connector")
+
+
+class ConnectionPool:
+    """
+    A bounded pool of database connections that can be shared by many Connector objects.
+    Connections are health checked when they are checked out and closed once they have been idle for longer than idle_timeout seconds.
+    """
+    _shared_pools = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, config: dict, pool_size: int = 5, idle_timeout: float = 300,
+                 checkout_timeout: float = 30) -> None:
+        """
+        :param config: keyword arguments passed to mysql.connector.connect() for every new connection
+        :param pool_size: maximum number of connections (idle + checked out) the pool will hold
+        :param idle_timeout: seconds a connection may stay idle in the pool before it is closed
+        :param checkout_timeout: seconds get_connection() waits for a free connection before raising
+        """
+        if pool_size < 1:
+            raise ValueError("ERROR[ConnectionPool.__init__]: Pool size must be at least 1.")
+        self._config = config
+        self._pool_size = pool_size
+        self._idle_timeout = idle_timeout
+        self._checkout_timeout = checkout_timeout
+        self._idle = deque()  # (connection, time it was returned), oldest on the left
+        self._checked_out = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        # get_shared() runs its on_create callable once per pool, under this lock instead of the lock of all shared pools
+        self._setup_lock = threading.Lock()
+        self._set_up = False
+
+    def __repr__(self):
+        return (f"ConnectionPool(size={self.pool_size}, idle={len(self._idle)}, checked_out={self._checked_out}, "
+                f"idle_timeout={self._idle_timeout})")
+
+    @property
+    def pool_size(self):
+        return self._pool_size
+
+    @property
+    def idle_count(self):
+        return len(self._idle)
+
+    @property
+    def checked_out(self):
+        return self._checked_out
+
+    @classmethod
+    def get_shared(cls, config: dict, pool_size: int = 5, idle_timeout: float = 300,
+                   on_create = None) -> 'ConnectionPool':
+        """
+        Returns the pool shared by every Connector using the same credentials, creating it on first use.
+        Every user of a shared pool must ask for the same size and idle timeout; the pool is the bound on connections to the server,
+        so a second pool for other settings is not created.
+        :param config: connection arguments, also used as the key the pool is shared under
+        :param pool_size: size of the pool
+        :param idle_timeout: idle timeout of the pool
+        :param on_create: optional callable run once per pool before the pool is handed out, e.g. to create the schema.
+                          Callers of other pools do not wait for it, and it is run again by the next caller if it raises
+        :return: the shared ConnectionPool
+        """
+        key = tuple(sorted(config.items()))
+        with cls._shared_lock:
+            pool = cls._shared_pools.get(key)
+            if pool is None or pool._closed:
+                pool = cls._shared_pools[key] = cls(config, pool_size = pool_size, idle_timeout = idle_timeout)
+            elif (pool.pool_size, pool._idle_timeout) != (pool_size, idle_timeout):
+                raise ValueError(f"ERROR[ConnectionPool.get_shared]: The shared pool for these credentials has pool_size="
+                                 f"{pool.pool_size} and idle_timeout={pool._idle_timeout}, not pool_size={pool_size} and "
+                                 f"idle_timeout={idle_timeout}.")
+        if on_create:
+            with pool._setup_lock:
+                if not pool._set_up:
+                    on_create()
+                    pool._set_up = True
+        return pool
+
+    @classmethod
+    def close_shared(cls):
+        """
+        Closes every shared pool and forgets about them.
+        """
+        with cls._shared_lock:
+            pools = list(cls._shared_pools.values())
+            cls._shared_pools.clear()
+        for pool in pools:
+            pool.close()
+
+    def get_connection(self):
+        """
+        Checks a connection out of the pool. Idle connections that fail the health check are discarded and a new connection is opened while the pool has room.
+        :return: an open connection that must be handed back with release()
+        """
+        deadline = time.monotonic() + self._checkout_timeout
+        while True:
+            candidate = None
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise Exception("ERROR [ConnectionPool.get_connection]: Pool is closed")
+                    expired = self._evict_expired()
+                    if self._idle:
+                        candidate, _ = self._idle.pop()
+                        self._checked_out += 1
+                        break
+                    if self._checked_out < self._pool_size:
+                        self._checked_out += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Exception(f"ERROR [ConnectionPool.get_connection]: No connection available after "
+                                        f"{self._checkout_timeout}s (pool size {self._pool_size})")
+                    self._condition.wait(remaining)
+            for db in expired:
+                self._close_quietly(db)
+            if expired:
+                log.debug("Closed %d connections idle for more than %ss", len(expired), self._idle_timeout)
+
+            if candidate is None:
+                try:
+                    return mysql.connector.connect(**self._config)
+                except Exception:
+                    self._give_back_slot()
+                    raise
+            if self._is_healthy(candidate):
+                return candidate
+            log.debug("Discarding a pooled connection that failed the health check")
+            self._close_quietly(candidate)
+            self._give_back_slot()
+
+    def release(self, db):
+        """
+        Returns a connection to the pool. Any transaction left open on it is rolled back first.
+        :param db: a connection obtained from get_connection()
+        """
+        try:
+            if db.in_transaction:
+                db.rollback()
+        except Exception:
+            self._close_quietly(db)
+            self._give_back_slot()
+            return
+        with self._condition:
+            self._checked_out -= 1
+            if not self._closed:
+                self._idle.append((db, time.monotonic()))
+                self._condition.notify()
+                return
+        self._close_quietly(db)
+
+    def discard(self, db):
+        """
+        Closes a checked out connection instead of returning it, e.g. one left with unread rows, and frees its slot.
+        :param db: a connection obtained from get_connection()
+        """
+        self._close_quietly(db)
+        self._give_back_slot()
+
+    def close(self):
+        """
+        Closes all idle connections. Connections still checked out are closed when they are released.
+        """
+        with self._condition:
+            self._closed = True
+            idle = [db for db, _ in self._idle]
+            self._idle.clear()
+            self._condition.notify_all()
+        for db in idle:
+            self._close_quietly(db)
+
+    def _evict_expired(self):
+        # must be called while holding self._condition
+        expired = []
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self._idle_timeout:
+            expired.append(self._idle.popleft()[0])
+        return expired
+
+    def _give_back_slot(self):
+        with self._condition:
+            self._checked_out -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _is_healthy(db):
+        try:
+            return db.is_connected()
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(db):
+        try:
+            db.close()
+        except Exception:
+            pass
+
+
+# An INSERT for a single row: INSERT INTO table (columns) VALUES (placeholders)
+_SINGLE_ROW_INSERT = re.compile(r"^\s*(INSERT\s+INTO\s+\S+\s*\([^)]*\)\s*VALUES)\s*(\([^)]*\))\s*;?\s*$",
+                                re.IGNORECASE | re.DOTALL)
+
+
+class IdentityMap:
+    """
+    Keeps at most one live object per (kind, id) for a connector, so loaders hand out the same User or Group instead of building a copy for every row that mentions it.
+    The least recently used entry is evicted once capacity is reached. Writes through a model refresh the cached object in place,
+    so every holder keeps seeing the one object for its id. get() counts hits and misses; peek() is for lookups that are not a load,
+    e.g. a factory checking for an object its caller has already looked up.
+    """
+
+    def __init__(self, capacity: int = 10000) -> None:
+        """
+        :param capacity: maximum number of objects kept
+        """
+        if capacity < 1:
+            raise ValueError("ERROR[IdentityMap.__init__]: capacity must be at least 1")
+        self._capacity = capacity
+        self._entries = OrderedDict()  # (kind, id) -> object, least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, item):
+        return item in self._entries
+
+    def get(self, kind: str, key: str):
+        """
+        :param kind: type of the object, e.g. "User"
+        :param key: id of the object
+        :return: the cached object, or None on a miss
+        """
+        with self._lock:
+            obj = self._entries.get((kind, key))
+            if obj is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((kind, key))
+            self.hits += 1
+            return obj
+
+    def peek(self, kind: str, key: str):
+        """
+        get() without counting a hit or a miss and without marking the entry as recently used.
+        :return: the cached object, or None
+        """
+        with self._lock:
+            return self._entries.get((kind, key))
+
+    def get_many(self, kind: str, keys) -> dict:
+        """
+        :return: dictionary of the ids that are cached, mapped to their objects
+        """
+        found = {}
+        for key in keys:
+            obj = self.get(kind, key)
+            if obj is not None:
+                found[key] = obj
+        return found
+
+    def add(self, kind: str, key: str, obj):
+        """
+        Caches obj under (kind, key), evicting the least recently used entry if the map is full.
+        :return: obj
+        """
+        with self._lock:
+            self._entries[(kind, key)] = obj
+            self._entries.move_to_end((kind, key))
+            if len(self._entries) > self._capacity:
+                self._entries.popitem(last = False)
+                self.evictions += 1
+        return obj
+
+    def invalidate(self, kind: str, key: str) -> None:
+        """
+        Drops (kind, key) so the next load reads it from the database again.
+        """
+        with self._lock:
+            self._entries.pop((kind, key), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        :return: hit/miss/eviction counters, current size and capacity
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "capacity": self._capacity
+        }
 
 
 class Connector:
+    # Used when the server's max_allowed_packet cannot be read
+    DEFAULT_MAX_PACKET = 4 * 1024 * 1024
+    # Upper bound on placeholders in one multi-row statement
+    MAX_BATCH_PARAMS = 65535
 
     def __init__(self, password: str = "", filepath: str = "", user: str = "root", host: str = "localhost",
-                 port: str = "3306", database: str = "bill_sharing_app") -> None:
+                 port: str = "3306", database: str = "bill_sharing_app", pool_size: int = 0,
+                 idle_timeout: float = 300, identity_map_size: int = 0, backend: str = "mysql",
+                 binary_ids: bool = True) -> None:
         """
         Creates a connector object and establishes a connection to the database and creates a cursor object
 
@@ -15,13 +338,20 @@ class Connector:
         :param host:
         :param port:
         :param database: database name
+        :param pool_size: if greater than 0, the connector does not hold a connection of its own. Instead every query checks a connection out of a pool of this size that is shared by all connectors using the same credentials, which must all use the same pool_size and idle_timeout (ValueError otherwise). The JSON file may also set "pool_size".
+        :param idle_timeout: seconds a pooled connection may stay idle before it is closed (only used with pool_size)
+        :param identity_map_size: if greater than 0, users and groups loaded through this connector are kept in an IdentityMap of this size (see identity_map). The JSON file may also set "identity_map_size".
+        :param backend: "mysql" (default) or "sqlite". With "sqlite", database is the path of the database file, the other credentials are not needed and pool_size is ignored because every connector holds its own connection. The JSON file may also set "backend".
+        :param binary_ids: ids are stored as BINARY(16) (see ids.py): id parameters are sent as bytes and id columns are read back as prefixed strings. Set to False for a database that still has the VARCHAR(128) id columns and has not been converted with migrate_ids.py. The JSON file may also set "binary_ids".
         """
         if filepath:
             with open(filepath, "r") as file:
-                print("LOG: file opened")
                 creds = json.load(file)
-                print("LOG: json loaded")
+                log.debug("Loaded credentials file %s", filepath)
+                backend = creds.get("backend", backend)
                 try:
+                    if backend == "sqlite":
+                        creds = {"user": user, "password": password, "host": host, "port": port, **creds}
                     self._user = creds["user"]
                     self._password = creds["password"]
                     self._host = creds["host"]
@@ -29,29 +359,58 @@ class Connector:
                     self._database = creds["database"]
                 except KeyError as e:
                     raise Exception(f"KEY ERROR: {e}")
-                print("LOG: credentials loaded")
+                pool_size = creds.get("pool_size", pool_size)
+                idle_timeout = creds.get("idle_timeout", idle_timeout)
+                identity_map_size = creds.get("identity_map_size", identity_map_size)
+                binary_ids = creds.get("binary_ids", binary_ids)
         else:
-            print("LOG: no file given")
             self._user = user
             self._password = password
             self._host = host
             self._port = port
             self._database = database
 
+        self._backend = get_backend(backend)
+        self._binary_ids = binary_ids
+        # QueryProfiles of the open profile() blocks; while it is empty queries are not timed at all
+        self._profiles = []
+        self._max_packet = None
+        self._transaction_depth = 0
+        # per thread: the unit_of_work dictionary of the thread's open transaction() block
+        self._local = threading.local()
+        # User and Group loaders reuse objects from here when it is set; None disables the cache
+        self.identity_map = IdentityMap(identity_map_size) if identity_map_size else None
+        self._pool = None
+        if pool_size and self._backend.name != "sqlite":
+            # Connections are checked out per query, so the connector itself starts without one
+            self._db = None
+            self._cursor = None
+            self._pool = ConnectionPool.get_shared(self.get_config(), pool_size = pool_size,
+                                                   idle_timeout = idle_timeout,
+                                                   on_create = self.prepare_database)
+            return
+
         try:
+            if self._backend.name == "sqlite":
+                # The database is a file: open it directly and create whatever tables it is missing
+                self._db = self.get_connection()
+                self._cursor = self._backend.cursor(self._db)
+                self._backend.prepare(self._db)
+                return
+
             # Connect without specifying the database first
-            print("LOG: connecting to database")
+            log.debug("Connecting to %s:%s", self._host, self._port)
             self._db = self.get_initial_connection()
-            self._cursor = self._db.cursor(dictionary = True)
+            self._cursor = self._backend.cursor(self._db)
 
             # Create the database if it does not exist
             self.create_database_if_not_exists()
 
             # Reconnect with the specified database
-            print("LOG: reconnecting to database")
+            log.debug("Reconnecting to database %s", self._database)
             self._db = self.get_connection()
-            self._cursor = self._db.cursor(dictionary = True)
-        except mysql.connector.Error as err:
+            self._cursor = self._backend.cursor(self._db)
+        except self._backend.Error as err:
             raise Exception(f"ERROR [init]: {err}")
 
     def __repr__(self):
@@ -77,17 +436,53 @@ class Connector:
     def database(self):
         return self._database
 
+    @property
+    def backend(self):
+        """
+        :return: the storage backend queries are sent through (see backends.py)
+        """
+        return self._backend
+
+    @property
+    def binary_ids(self):
+        """
+        :return: True if ids are stored as BINARY(16) and converted by execute() and execute_many()
+        """
+        return self._binary_ids
+
+    @property
+    def pool(self):
+        """
+        :return: the shared ConnectionPool if the connector is pooled, otherwise None
+        """
+        return self._pool
+
+    @property
+    def in_transaction(self):
+        """
+        :return: True while inside a transaction() block
+        """
+        return self._transaction_depth > 0
+
+    @property
+    def unit_of_work(self):
+        """
+        :return: a dictionary shared by the nested transaction() blocks of the current thread and dropped when the outermost one exits,
+                 for state that belongs to one unit of work (e.g. the expenses Ledger.track is following). None outside a block
+        """
+        return getattr(self._local, "unit_of_work", None)
+
     @property
     def db(self):
         """
-        :return: Returns the connection object (mysql.connector.connect())
+        :return: Returns the connection object (mysql.connector.connect() or sqlite3.connect())
         """
         return self._db
 
     @db.setter
     def db(self, value):
         self._db = value
-        self.cursor = self._db.cursor(dictionary = True)
+        self.cursor = self._backend.cursor(self._db)
 
     @property
     def cursor(self):
@@ -110,27 +505,64 @@ class Connector:
 
     def get_initial_connection(self):
         try:
-            db = mysql.connector.connect(**self.get_config(include_database=False))
-            print("LOG: Initial database connection established")
+            db = self._backend.connect(self.get_config(include_database=False))
+            log.debug("Initial connection established")
             return db
-        except mysql.connector.Error as err:
-            print(f"ERROR [get_initial_connection]: {err}")
+        except self._backend.Error as err:
+            log.error("get_initial_connection failed: %s", err)
             raise
 
     def get_connection(self):
         try:
-            db = mysql.connector.connect(**self.get_config())
-            print(f"LOG: Database connection established with {self.database}")
+            db = self._backend.connect(self.get_config())
+            log.debug("Connection established with %s", self.database)
             return db
-        except mysql.connector.Error as err:
-            print(f"ERROR [get_connection]: {err}")
+        except self._backend.Error as err:
+            log.error("get_connection failed: %s", err)
             raise
 
+    def prepare_database(self):
+        """
+        Creates the database through a short-lived initial connection. Pooled connectors run this once when their pool is created.
+        """
+        try:
+            self._db = self.get_initial_connection()
+            self._cursor = self._backend.cursor(self._db)
+            self.create_database_if_not_exists()
+        except self._backend.Error as err:
+            raise Exception(f"ERROR [prepare_database]: {err}")
+        finally:
+            self.close()
+            self._db = None
+            self._cursor = None
+
+    @contextmanager
+    def _acquire(self):
+        """
+        Makes sure self.db and self.cursor are usable for the duration of the block. For a pooled connector a connection is checked out for the block and returned afterwards, unless one is already held.
+        """
+        if self._pool is None or self._db is not None:
+            yield
+            return
+        self._db = self._pool.get_connection()
+        try:
+            self._cursor = self._backend.cursor(self._db)
+            yield
+        finally:
+            try:
+                self._cursor.close() if self._cursor is not None else None
+            except Exception:
+                pass
+            db = self._db
+            self._db = None
+            self._cursor = None
+            self._pool.release(db)
+
     def create_database_if_not_exists(self):
         try:
             self.execute(f"CREATE DATABASE IF NOT EXISTS {self.database};")
-        except mysql.connector.Error as err:
-            print(f"ERROR [create_database_if_not_exists]: {err}")
+        except self._backend.Error as err:
+            log.error("create_database_if_not_exists failed: %s", err)
             raise
 
     def execute(self, query, params = None, fetchall = True, auto_commit = True):
@@ -143,23 +575,260 @@ class Connector:
         :return: returns result if query is not DML
         """
         query_type = "DML" if query.strip().split()[0].upper() in ("INSERT", "UPDATE", "DELETE") else "OTHER"
+        if params:
+            params = encode_params(params, self._binary_ids)
+        began = time.perf_counter() if self._profiles else None
+        with self._acquire():
+            try:
+                statement = self._backend.translate(query)
+                self.cursor.execute(statement, params) if params else self.cursor.execute(statement)
+                if query_type == "DML":
+                    self.commit() if auto_commit and not self.in_transaction else None
+                    result, rows = None, self.cursor.rowcount
+                elif fetchall:
+                    result = self.cursor.fetchall()
+                    result = [decode_row(row) for row in result] if self._binary_ids else result
+                    rows = len(result)
+                else:
+                    result = self.cursor.fetchone()
+                    result = decode_row(result) if self._binary_ids and result else result
+                    rows = 1 if result else 0
+            except self._backend.Error as err:
+                # inside transaction() the whole unit of work is rolled back when the block exits
+                if query_type == "DML" and not self.in_transaction:
+                    self.rollback()
+                raise Exception(f"ERROR [execute]: {err}")
+        if began is not None:
+            self._record(query, rows, began)
+        return result
+
+    def execute_many(self, query, params_seq, auto_commit = True):
+        """
+        Executes a DML query once for every parameter tuple in params_seq and commits once at the end instead of once per row.
+        On MySQL a single-row INSERT ... VALUES (...) query is sent as multi-row INSERT statements, each sized to stay within the server's max_allowed_packet. UPDATE and DELETE queries, and every query on SQLite, go through cursor.executemany().
+        :param query: the INSERT, UPDATE or DELETE query with placeholders for one row
+        :param params_seq: an iterable of parameter tuples, one per row
+        :param auto_commit: decides whether to commit at the end. Default is True.
+        :return: the number of statements sent to the database
+        """
+        params_seq = [encode_params(params, self._binary_ids) for params in params_seq]
+        if not params_seq:
+            return 0
+        insert = _SINGLE_ROW_INSERT.match(query) if self._backend.multi_row_insert else None
+        began = time.perf_counter() if self._profiles else None
+        with self._acquire():
+            try:
+                if insert:
+                    statements = 0
+                    for statement, params in self._multi_row_inserts(insert.group(1), insert.group(2), params_seq):
+                        self.cursor.execute(statement, params)
+                        statements += 1
+                else:
+                    self.cursor.executemany(self._backend.translate(query), params_seq)
+                    statements = len(params_seq)
+                self.commit() if auto_commit and not self.in_transaction else None
+            except self._backend.Error as err:
+                if not self.in_transaction:
+                    self.rollback()
+                raise Exception(f"ERROR [execute_many]: {err}")
+        if began is not None:
+            self._record(query, len(params_seq), began, round_trips = statements)
+        return statements
+
+    def stream(self, query, params = None, batch_size = 1000, as_dict = True):
+        """
+        Executes a query and yields its rows as they are read, batch_size at a time, instead of fetching the whole result like execute().
+        Memory stays bounded by batch_size however many rows the query returns.
+        On MySQL the rows are read through an unbuffered cursor on a connection of its own, so the connector can run other queries
+        while the stream is read, but the stream does not see writes this connector has not committed. Pooled connectors check that
+        connection out of the pool; without a pool every stream opens a new connection to the server and closes it again, which
+        costs a connect per call, so code that streams often should use pool_size.
+        Inside a transaction() block the transaction's connection is used with a buffered cursor instead, so the rows are held by the driver.
+        On SQLite a cursor of its own on the connector's connection steps through the result.
+        The cursor is closed and the connection released or closed when the last row has been read, when reading fails and when
+        the generator is closed, e.g. by leaving a for loop early.
+
+        Usage:
+            for row in connector.stream("SELECT * FROM Expenses WHERE group_id = %s", (group_id,)):
+                ...
+
+        :param query: the query to be executed, possibly with placeholders
+        :param params: A way to prevent SQL injection
+        :param batch_size: rows fetched from the database at a time. Default is 1000
+        :param as_dict: yield dictionaries like execute() if True, tuples in column order if False
+        :return: generator of rows
+        """
+        if batch_size < 1:
+            raise ValueError("ERROR[Connector.stream]: batch_size must be at least 1")
+        if params:
+            params = encode_params(params, self._binary_ids)
+        profiles = list(self._profiles)
+        site = call_site() if profiles else None
+        own_connection = self._backend.stream_connection and not self.in_transaction
+        db, cursor = None, None
+        finished, rows, seconds = False, 0, 0.0
         try:
-            self.cursor.execute(query, params) if params else self.cursor.execute(query)
-            #print("LOG: Query executed successfully.")
-            if query_type == "DML":
-                self.commit() if auto_commit else None
-            else:
-                return self.cursor.fetchall() if fetchall else self.cursor.fetchone()
-        except mysql.connector.Error as err:
-            if query_type == "DML":
-                self.rollback()
-            raise Exception(f"ERROR [execute]: {err}")
+            if own_connection:
+                db = self._pool.get_connection() if self._pool is not None else self.get_connection()
+            with self._acquire() if db is None else nullcontext():
+                cursor = self._backend.stream_cursor(db or self.db, as_dict = as_dict, buffered = db is None)
+                began = time.perf_counter()
+                statement = self._backend.translate(query)
+                cursor.execute(statement, params) if params else cursor.execute(statement)
+                seconds += time.perf_counter() - began
+                prefixes = None
+                if self._binary_ids and not as_dict:
+                    prefixes = [ID_COLUMNS.get(column[0]) for column in cursor.description]
+                while True:
+                    began = time.perf_counter()
+                    batch = cursor.fetchmany(batch_size)
+                    seconds += time.perf_counter() - began
+                    if not batch:
+                        break
+                    rows += len(batch)
+                    for row in batch:
+                        if not self._binary_ids:
+                            yield row
+                        else:
+                            yield decode_row(row) if as_dict else decode_values(row, prefixes)
+                finished = True
+        except self._backend.Error as err:
+            raise Exception(f"ERROR [stream]: {err}")
+        finally:
+            # runs when the rows run out, on an error and when the generator is closed or garbage collected
+            self._close_stream(cursor, db, finished)
+            for profile in profiles:
+                profile.record(query, rows, seconds, site = site)
+
+    def _close_stream(self, cursor, db, finished):
+        """
+        Closes the cursor of a stream and hands back the connection it opened, if any.
+        :param cursor: the stream's cursor, None if it was never created
+        :param db: the connection opened for the stream, None if it ran on the connector's connection
+        :param finished: True if every row was read
+        """
+        if db is not None and not finished:
+            # closing an unbuffered cursor with unread rows would read all of them first, so the connection is dropped before the cursor
+            self._pool.discard(db) if self._pool is not None else ConnectionPool._close_quietly(db)
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        if db is not None and finished:
+            self._pool.release(db) if self._pool is not None else ConnectionPool._close_quietly(db)
+
+    @contextmanager
+    def profile(self):
+        """
+        Records every query sent through execute() and execute_many() while the block runs: how often each statement
+        (normalized into a fingerprint) was issued by each "module.function", the rows it returned or changed and its latency.
+        Blocks can be nested; each gets every query of its own block. Outside of a block queries are not timed.
+
+        Usage:
+            with connector.profile() as profile:
+                Group.get_group(group_id, connector)
+            print(profile.report())
+
+        :return: the QueryProfile being filled
+        """
+        profile = QueryProfile()
+        self._profiles.append(profile)
+        try:
+            yield profile
+        finally:
+            self._profiles.remove(profile)
+
+    def _record(self, query, rows, began, round_trips = 1):
+        elapsed = time.perf_counter() - began
+        for profile in list(self._profiles):
+            profile.record(query, rows, elapsed, round_trips = round_trips)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the statements of the block as one unit of work: autocommit is suspended, everything is committed once when the block exits and rolled back if it raises.
+        A pooled connector keeps the same connection for the whole block.
+        Nested blocks become savepoints, so an error inside a nested block only undoes that block's statements (once the error is handled).
+
+        Usage:
+            with connector.transaction():
+                connector.execute(...)
+                connector.execute_many(...)
+        """
+        with self._acquire():
+            depth = self._transaction_depth
+            savepoint = f"sp_{depth}"
+            try:
+                self.cursor.execute(f"SAVEPOINT {savepoint}" if depth else self._backend.translate("START TRANSACTION"))
+            except self._backend.Error as err:
+                raise Exception(f"ERROR [transaction]: {err}")
+            self._transaction_depth += 1
+            outermost = self.unit_of_work is None
+            if outermost:
+                self._local.unit_of_work = {}
+            try:
+                try:
+                    yield self
+                except BaseException:
+                    self._transaction_depth = depth
+                    if depth:
+                        self.cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                    else:
+                        self.rollback()
+                    raise
+                self._transaction_depth = depth
+                try:
+                    if depth:
+                        self.cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+                    else:
+                        self.commit()
+                except Exception:
+                    if not depth:
+                        self.rollback()
+                    raise
+            finally:
+                if outermost:
+                    self._local.unit_of_work = None
+
+    def get_max_packet(self):
+        """
+        :return: the server's max_allowed_packet in bytes, read once and cached. Falls back to DEFAULT_MAX_PACKET.
+        """
+        if self._max_packet is None:
+            try:
+                row = self.execute("SELECT @@max_allowed_packet AS max_allowed_packet", fetchall = False)
+                self._max_packet = int(row['max_allowed_packet'])
+            except Exception:
+                self._max_packet = self.DEFAULT_MAX_PACKET
+        return self._max_packet
+
+    def _multi_row_inserts(self, head, row_placeholders, params_seq):
+        """
+        Groups rows into multi-row INSERT statements. A statement is closed when the estimated size of its
+        values would pass 90% of max_allowed_packet or it would exceed MAX_BATCH_PARAMS placeholders.
+        :return: generator of (statement, params) pairs
+        """
+        budget = int(self.get_max_packet() * 0.9) - len(head)
+        max_rows = max(1, self.MAX_BATCH_PARAMS // max(1, len(params_seq[0])))
+        rows, size, params = 0, 0, []
+        for row in params_seq:
+            # quotes, separators and escaping make a value a few bytes longer than its text
+            row_size = len(row_placeholders) + 2 + sum(len(str(value)) + 4 for value in row)
+            if rows and (size + row_size > budget or rows == max_rows):
+                yield f"{head} {', '.join([row_placeholders] * rows)}", tuple(params)
+                rows, size, params = 0, 0, []
+            rows += 1
+            size += row_size
+            params.extend(row)
+        if rows:
+            yield f"{head} {', '.join([row_placeholders] * rows)}", tuple(params)
 
     def rollback(self):
         try:
             self.db.rollback()
-            print("LOG: Transaction rolled back successfully.")
-        except mysql.connector.Error as err:
+            log.debug("Transaction rolled back")
+        except self._backend.Error as err:
             raise Exception(f"ROLLBACK ERROR: {err}")
 
     def commit(self):
@@ -167,17 +836,16 @@ class Connector:
             raise Exception("ERROR: Database connection is closed")
         try:
             self.db.commit()
-            #print("LOG: Transaction committed successfully.")
-        except mysql.connector.Error as err:
+        except self._backend.Error as err:
             raise Exception(f"COMMIT ERROR: {err}")
 
     def close(self):
         try:
             self._cursor.close() if self._cursor is not None else None
         except Exception as e:
-            print(f"ERROR closing cursor: {e}")
+            log.warning("Closing the cursor failed: %s", e)
         finally:
             try:
                 self._db.close() if self._db is not None else None
             except Exception as e:
-                print(f"ERROR closing db: {e}")
+                log.warning("Closing the connection failed: %s", e)
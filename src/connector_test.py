@@ -1,6 +1,8 @@
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
-from connector import Connector
+import mysql.connector
+from connector import Connector, ConnectionPool, IdentityMap
 
 
 class ConnectorTests(unittest.TestCase):
@@ -145,6 +147,338 @@ class ConnectorTests(unittest.TestCase):
             self.fail("Close method should not raise exception if cursor close fails")
         connector._db.close.assert_called_once()
 
+    @patch('mysql.connector.connect')
+    def test_stream_closes_its_connection_when_closed_early(self, mock_connect):
+        connections = []
+        mock_connect.side_effect = lambda **kwargs: connections.append(MagicMock()) or connections[-1]
+        connector = Connector()
+        opened = len(connections)
+        rows = connector.stream('SELECT name FROM Users', batch_size = 2)
+        # nothing is opened until the first row is asked for
+        self.assertEqual(len(connections), opened)
+        order = MagicMock()
+        mock_connect.side_effect = None
+        mock_connect.return_value = order.db
+        order.db.cursor.return_value = order.cursor
+        order.cursor.fetchmany.side_effect = [[{'name': 'Alice'}, {'name': 'Bob'}], []]
+        self.assertEqual(next(rows), {'name': 'Alice'})
+        order.db.cursor.assert_called_once_with(dictionary = True, buffered = False)
+        rows.close()
+        # the unread rows are dropped with the connection before the cursor is closed
+        self.assertEqual([name for name, _, _ in order.mock_calls if name in ('db.close', 'cursor.close')],
+                         ['db.close', 'cursor.close'])
+        connector._db.close.assert_not_called()
+
+    @patch('mysql.connector.connect')
+    def test_stream_closes_cursor_and_connection_after_last_row(self, mock_connect):
+        mock_connect.return_value = MagicMock()
+        connector = Connector()
+        stream_db = MagicMock()
+        mock_connect.return_value = stream_db
+        stream_db.cursor.return_value.fetchmany.side_effect = [[{'name': 'Alice'}], []]
+        self.assertEqual(list(connector.stream('SELECT name FROM Users')), [{'name': 'Alice'}])
+        stream_db.cursor.return_value.close.assert_called_once()
+        stream_db.close.assert_called_once()
+
+    @patch('mysql.connector.connect')
+    def test_execute_many_sends_multi_row_insert_and_commits_once(self, mock_connect):
+        mock_connect.return_value = MagicMock()
+        connector = Connector()
+        connector._cursor = MagicMock()
+        connector._db = MagicMock()
+        connector._max_packet = 1024 * 1024
+        rows = [('E1', f'U{i}', 10.0, 'NO') for i in range(3)]
+        statements = connector.execute_many(
+            "INSERT INTO ExpenseParticipants (expense_id, user_id, amount, settled) VALUES (%s, %s, %s, %s)", rows)
+        self.assertEqual(statements, 1)
+        connector._cursor.execute.assert_called_once_with(
+            "INSERT INTO ExpenseParticipants (expense_id, user_id, amount, settled) VALUES "
+            "(%s, %s, %s, %s), (%s, %s, %s, %s), (%s, %s, %s, %s)",
+            ('E1', 'U0', 10.0, 'NO', 'E1', 'U1', 10.0, 'NO', 'E1', 'U2', 10.0, 'NO'))
+        connector._db.commit.assert_called_once()
+
+    @patch('mysql.connector.connect')
+    def test_execute_many_splits_inserts_at_packet_limit(self, mock_connect):
+        mock_connect.return_value = MagicMock()
+        connector = Connector()
+        connector._cursor = MagicMock()
+        connector._db = MagicMock()
+        connector._max_packet = 200
+        rows = [('x' * 20,) for _ in range(10)]
+        statements = connector.execute_many("INSERT INTO t (c) VALUES (%s)", rows)
+        self.assertGreater(statements, 1)
+        self.assertEqual(connector._cursor.execute.call_count, statements)
+        sent = [param for call in connector._cursor.execute.call_args_list for param in call[0][1]]
+        self.assertEqual(sent, [row[0] for row in rows])
+        connector._db.commit.assert_called_once()
+
+    @patch('mysql.connector.connect')
+    def test_execute_many_uses_executemany_for_updates(self, mock_connect):
+        mock_connect.return_value = MagicMock()
+        connector = Connector()
+        connector._cursor = MagicMock()
+        connector._db = MagicMock()
+        params = [(1, 'a'), (2, 'b')]
+        connector.execute_many("UPDATE t SET v = %s WHERE k = %s", params)
+        connector._cursor.executemany.assert_called_once_with("UPDATE t SET v = %s WHERE k = %s", params)
+        connector._db.commit.assert_called_once()
+
+    @patch('mysql.connector.connect')
+    def test_execute_many_with_no_rows_does_nothing(self, mock_connect):
+        mock_connect.return_value = MagicMock()
+        connector = Connector()
+        connector._cursor = MagicMock()
+        self.assertEqual(connector.execute_many("INSERT INTO t (c) VALUES (%s)", []), 0)
+        connector._cursor.execute.assert_not_called()
+
+    @patch('mysql.connector.connect')
+    def test_transaction_commits_once_for_all_statements(self, mock_connect):
+        mock_connect.return_value = MagicMock()
+        connector = Connector()
+        connector._cursor = MagicMock()
+        connector._db = MagicMock()
+        with connector.transaction():
+            self.assertTrue(connector.in_transaction)
+            connector.execute("INSERT INTO t (c) VALUES (%s)", (1,))
+            connector.execute_many("UPDATE t SET c = %s WHERE k = %s", [(1, 'a'), (2, 'b')])
+        self.assertFalse(connector.in_transaction)
+        connector._cursor.execute.assert_any_call("START TRANSACTION")
+        connector._db.commit.assert_called_once()
+        connector._db.rollback.assert_not_called()
+
+    @patch('mysql.connector.connect')
+    def test_transaction_rolls_back_on_error(self, mock_connect):
+        mock_connect.return_value = MagicMock()
+        connector = Connector()
+        connector._cursor = MagicMock()
+        connector._db = MagicMock()
+        with self.assertRaises(ValueError):
+            with connector.transaction():
+                connector.execute("INSERT INTO t (c) VALUES (%s)", (1,))
+                raise ValueError("boom")
+        connector._db.commit.assert_not_called()
+        connector._db.rollback.assert_called_once()
+        self.assertFalse(connector.in_transaction)
+
+    @patch('mysql.connector.connect')
+    def test_nested_transaction_uses_savepoints(self, mock_connect):
+        mock_connect.return_value = MagicMock()
+        connector = Connector()
+        connector._cursor = MagicMock()
+        connector._db = MagicMock()
+        with connector.transaction():
+            with connector.transaction():
+                connector.execute("INSERT INTO t (c) VALUES (%s)", (1,))
+            try:
+                with connector.transaction():
+                    raise ValueError("inner")
+            except ValueError:
+                pass
+        statements = [call[0][0] for call in connector._cursor.execute.call_args_list]
+        self.assertEqual(statements, ["START TRANSACTION", "SAVEPOINT sp_1", "INSERT INTO t (c) VALUES (%s)",
+                                      "RELEASE SAVEPOINT sp_1", "SAVEPOINT sp_1", "ROLLBACK TO SAVEPOINT sp_1"])
+        connector._db.commit.assert_called_once()
+        connector._db.rollback.assert_not_called()
+
+    @patch('mysql.connector.connect')
+    def test_unit_of_work_belongs_to_the_thread_and_outermost_block(self, mock_connect):
+        mock_connect.return_value = MagicMock()
+        connector = Connector()
+        self.assertIsNone(connector.unit_of_work)
+        seen = []
+        with connector.transaction():
+            connector.unit_of_work['key'] = 'value'
+            with connector.transaction():
+                self.assertEqual(connector.unit_of_work, {'key': 'value'})
+            other = threading.Thread(target = lambda: seen.append(connector.unit_of_work))
+            other.start()
+            other.join()
+        self.assertEqual(seen, [None])
+        self.assertIsNone(connector.unit_of_work)
+
+    @patch('mysql.connector.connect')
+    def test_failed_statement_inside_transaction_defers_rollback(self, mock_connect):
+        mock_connect.return_value = MagicMock()
+        connector = Connector()
+        connector._cursor = MagicMock()
+        connector._db = MagicMock()
+        with self.assertRaises(Exception):
+            with connector.transaction():
+                connector._cursor.execute.side_effect = mysql.connector.Error("duplicate")
+                connector.execute("INSERT INTO t (c) VALUES (%s)", (1,))
+        connector._db.rollback.assert_called_once()
+
+
+class ConnectionPoolTests(unittest.TestCase):
+
+    def tearDown(self):
+        ConnectionPool.close_shared()
+
+    @patch('mysql.connector.connect')
+    def test_pooled_connectors_share_one_pool(self, mock_connect):
+        mock_connect.side_effect = lambda **kwargs: MagicMock()
+        first = Connector(pool_size = 2)
+        second = Connector(pool_size = 2)
+        self.assertIs(first.pool, second.pool)
+        self.assertIsNone(first.db)
+        # only the initial connection used to create the database has been opened
+        self.assertEqual(mock_connect.call_count, 1)
+
+    def test_shared_pool_rejects_other_settings(self):
+        pool = ConnectionPool.get_shared({'user': 'root'}, pool_size = 2)
+        self.assertIs(ConnectionPool.get_shared({'user': 'root'}, pool_size = 2), pool)
+        with self.assertRaises(ValueError):
+            ConnectionPool.get_shared({'user': 'root'}, pool_size = 5)
+        with self.assertRaises(ValueError):
+            ConnectionPool.get_shared({'user': 'root'}, pool_size = 2, idle_timeout = 10)
+
+    def test_on_create_runs_once_outside_the_shared_lock(self):
+        created = []
+
+        def on_create():
+            # another pool can be created while this one is being set up
+            ConnectionPool.get_shared({'user': 'other'}, pool_size = 1)
+            created.append(True)
+
+        first = ConnectionPool.get_shared({'user': 'root'}, pool_size = 1, on_create = on_create)
+        second = ConnectionPool.get_shared({'user': 'root'}, pool_size = 1, on_create = on_create)
+        self.assertIs(first, second)
+        self.assertEqual(created, [True])
+
+        failing = MagicMock(side_effect = [RuntimeError("no server"), None])
+        with self.assertRaises(RuntimeError):
+            ConnectionPool.get_shared({'user': 'third'}, pool_size = 1, on_create = failing)
+        ConnectionPool.get_shared({'user': 'third'}, pool_size = 1, on_create = failing)
+        self.assertEqual(failing.call_count, 2)
+
+    @patch('mysql.connector.connect')
+    def test_pooled_execute_reuses_returned_connection(self, mock_connect):
+        mock_connect.side_effect = lambda **kwargs: MagicMock(in_transaction = False)
+        connector = Connector(pool_size = 2)
+        connector.execute('SELECT 1')
+        connector.execute('SELECT 1')
+        self.assertEqual(mock_connect.call_count, 2)
+        self.assertEqual(connector.pool.idle_count, 1)
+        self.assertEqual(connector.pool.checked_out, 0)
+
+    @patch('mysql.connector.connect')
+    def test_unhealthy_connection_is_replaced_on_checkout(self, mock_connect):
+        stale = MagicMock(in_transaction = False)
+        stale.is_connected.return_value = False
+        fresh = MagicMock()
+        mock_connect.side_effect = [stale, fresh]
+        pool = ConnectionPool({'user': 'root'}, pool_size = 1)
+        pool.release(pool.get_connection())
+        self.assertIs(pool.get_connection(), fresh)
+        stale.close.assert_called_once()
+
+    @patch('mysql.connector.connect')
+    def test_idle_connections_are_evicted_after_timeout(self, mock_connect):
+        old = MagicMock(in_transaction = False)
+        mock_connect.side_effect = [old, MagicMock()]
+        pool = ConnectionPool({'user': 'root'}, pool_size = 1, idle_timeout = 10)
+        with patch('connector.time.monotonic', return_value = 100.0):
+            pool.release(pool.get_connection())
+        with patch('connector.time.monotonic', return_value = 111.0):
+            self.assertIsNot(pool.get_connection(), old)
+        old.close.assert_called_once()
+
+    @patch('mysql.connector.connect')
+    def test_checkout_times_out_when_pool_is_exhausted(self, mock_connect):
+        mock_connect.return_value = MagicMock()
+        pool = ConnectionPool({'user': 'root'}, pool_size = 1, checkout_timeout = 0.01)
+        pool.get_connection()
+        with self.assertRaises(Exception):
+            pool.get_connection()
+
+    @patch('mysql.connector.connect')
+    def test_release_rolls_back_open_transaction(self, mock_connect):
+        db = MagicMock(in_transaction = True)
+        mock_connect.return_value = db
+        pool = ConnectionPool({'user': 'root'}, pool_size = 1)
+        pool.release(pool.get_connection())
+        db.rollback.assert_called_once()
+        self.assertEqual(pool.idle_count, 1)
+
+    @patch('mysql.connector.connect')
+    def test_transaction_keeps_one_pooled_connection(self, mock_connect):
+        mock_connect.side_effect = lambda **kwargs: MagicMock(in_transaction = False)
+        connector = Connector(pool_size = 2)
+        with connector.transaction():
+            connector.execute("INSERT INTO t (c) VALUES (%s)", (1,))
+            connector.execute("INSERT INTO t (c) VALUES (%s)", (2,))
+            self.assertEqual(connector.pool.checked_out, 1)
+        self.assertEqual(connector.pool.checked_out, 0)
+
+
+    @patch('mysql.connector.connect')
+    def test_stream_uses_a_pooled_connection(self, mock_connect):
+        def connect(**kwargs):
+            db = MagicMock(in_transaction = False)
+            db.cursor.return_value.fetchmany.return_value = []
+            return db
+        mock_connect.side_effect = connect
+        connector = Connector(pool_size = 2)
+        rows = connector.stream('SELECT name FROM Users')
+        connector.pool.release(connector.pool.get_connection())
+        stream_db = connector.pool._idle[-1][0]
+        stream_db.cursor.return_value.fetchmany.side_effect = [[{'name': 'Alice'}, {'name': 'Bob'}], []]
+        self.assertEqual(next(rows), {'name': 'Alice'})
+        self.assertEqual(connector.pool.checked_out, 1)
+        rows.close()
+        # a connection with unread rows is not handed to the next caller
+        stream_db.close.assert_called_once()
+        self.assertEqual((connector.pool.checked_out, connector.pool.idle_count), (0, 0))
+
+        self.assertEqual(len(list(connector.stream('SELECT name FROM Users'))), 0)
+        self.assertEqual((connector.pool.checked_out, connector.pool.idle_count), (0, 1))
+
+
+class IdentityMapTests(unittest.TestCase):
+
+    def test_get_counts_hits_and_misses(self):
+        identity_map = IdentityMap(capacity = 2)
+        user = object()
+        self.assertIsNone(identity_map.get('User', 'U1'))
+        identity_map.add('User', 'U1', user)
+        self.assertIs(identity_map.get('User', 'U1'), user)
+        self.assertIsNone(identity_map.get('Group', 'U1'))
+        self.assertEqual((identity_map.hits, identity_map.misses), (1, 2))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        identity_map = IdentityMap(capacity = 2)
+        identity_map.add('User', 'U1', 'first')
+        identity_map.add('User', 'U2', 'second')
+        identity_map.get('User', 'U1')
+        identity_map.add('User', 'U3', 'third')
+        self.assertEqual(identity_map.get_many('User', ['U1', 'U2', 'U3']), {'U1': 'first', 'U3': 'third'})
+        self.assertEqual(identity_map.stats()['evictions'], 1)
+        self.assertEqual(len(identity_map), 2)
+
+    def test_invalidate_drops_entry(self):
+        identity_map = IdentityMap()
+        identity_map.add('Group', 'G1', 'group')
+        identity_map.invalidate('Group', 'G1')
+        identity_map.invalidate('Group', 'missing')
+        self.assertNotIn(('Group', 'G1'), identity_map)
+
+    def test_peek_does_not_count(self):
+        identity_map = IdentityMap()
+        self.assertIsNone(identity_map.peek('User', 'U1'))
+        identity_map.add('User', 'U1', 'user')
+        self.assertEqual(identity_map.peek('User', 'U1'), 'user')
+        self.assertEqual((identity_map.hits, identity_map.misses), (0, 0))
+
+    def test_capacity_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            IdentityMap(capacity = 0)
+
+    @patch('mysql.connector.connect')
+    def test_connector_identity_map_is_opt_in(self, mock_connect):
+        mock_connect.return_value = MagicMock()
+        self.assertIsNone(Connector().identity_map)
+        self.assertEqual(Connector(identity_map_size = 5).identity_map.capacity, 5)
+
 
 if __name__ == '__main__':
     unittest.main()
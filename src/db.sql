@@ -1,7 +1,9 @@
 CREATE database IF NOT EXISTS bill_sharing_app;
 USE bill_sharing_app;
+-- Ids are the 16 bytes of a time-ordered UUID (see ids.py); the U/G/E/T prefix is added back when rows are read.
+-- Databases created with the older VARCHAR(128) id columns are converted with: python migrate_ids.py --config db.json
 CREATE TABLE IF NOT EXISTS Users (
-  user_id VARCHAR(128) NOT NULL,
+  user_id BINARY(16) NOT NULL,
   name VARCHAR(255) NOT NULL,
   email VARCHAR(255) NOT NULL,
   password VARCHAR(255) NOT NULL,
@@ -11,10 +13,10 @@ CREATE TABLE IF NOT EXISTS Users (
 );
 
 CREATE TABLE IF NOT EXISTS GroupDetails (
-  group_id VARCHAR(128) NOT NULL,
+  group_id BINARY(16) NOT NULL,
   name VARCHAR(255) NOT NULL,
   description VARCHAR(255),
-  admin_id VARCHAR(128) NOT NULL,
+  admin_id BINARY(16) NOT NULL,
   created DATETIME NOT NULL,
   PRIMARY KEY (group_id),
   FOREIGN KEY (admin_id) REFERENCES Users(user_id),
@@ -23,12 +25,12 @@ CREATE TABLE IF NOT EXISTS GroupDetails (
 );
 
 CREATE TABLE IF NOT EXISTS Expenses (
-  expense_id VARCHAR(128) NOT NULL,
-  group_id VARCHAR(128) NOT NULL,
+  expense_id BINARY(16) NOT NULL,
+  group_id BINARY(16) NOT NULL,
   description TINYTEXT,
   tag VARCHAR(255),
   timestamp DATETIME NOT NULL,
-  paid_by VARCHAR(128) NOT NULL,
+  paid_by BINARY(16) NOT NULL,
   amount DECIMAL(10, 2) NOT NULL,
   PRIMARY KEY (expense_id),
   FOREIGN KEY (paid_by) REFERENCES Users(user_id),
@@ -38,10 +40,10 @@ CREATE TABLE IF NOT EXISTS Expenses (
 );
 
 CREATE TABLE IF NOT EXISTS Transactions (
-  trans_id VARCHAR(128) NOT NULL,
-  expense_id VARCHAR(128) NOT NULL,
-  payer_id VARCHAR(128) NOT NULL,
-  payee_id VARCHAR(128) NOT NULL,
+  trans_id BINARY(16) NOT NULL,
+  expense_id BINARY(16) NOT NULL,
+  payer_id BINARY(16) NOT NULL,
+  payee_id BINARY(16) NOT NULL,
   amount DECIMAL(10, 2) NOT NULL,
   timestamp DATETIME NOT NULL,
   PRIMARY KEY (trans_id),
@@ -49,26 +51,82 @@ CREATE TABLE IF NOT EXISTS Transactions (
   FOREIGN KEY (payer_id) REFERENCES Users(user_id),
   FOREIGN KEY (expense_id) REFERENCES Expenses(expense_id),
   KEY expense_id (expense_id),
-  KEY payer_id (payer_id),
-  KEY payee_id (payee_id)
+  KEY payer_timestamp (payer_id, timestamp),
+  KEY payee_timestamp (payee_id, timestamp)
 );
 
 CREATE TABLE IF NOT EXISTS GroupMembers (
-  user_id VARCHAR(128) NOT NULL,
-  group_id VARCHAR(128) NOT NULL,
+  user_id BINARY(16) NOT NULL,
+  group_id BINARY(16) NOT NULL,
   PRIMARY KEY (user_id, group_id),
   FOREIGN KEY (user_id) REFERENCES Users(user_id),
   FOREIGN KEY (group_id) REFERENCES GroupDetails(group_id)
 );
 
 CREATE TABLE IF NOT EXISTS ExpenseParticipants (
-  expense_id VARCHAR(128) NOT NULL,
-  user_id VARCHAR(128) NOT NULL,
+  expense_id BINARY(16) NOT NULL,
+  user_id BINARY(16) NOT NULL,
   amount DECIMAL(10, 2) NOT NULL,
   settled ENUM('SETTLED', 'PARTIAL', 'NO') NOT NULL,
   PRIMARY KEY (expense_id, user_id),
   FOREIGN KEY (user_id) REFERENCES Users(user_id),
   FOREIGN KEY (expense_id) REFERENCES Expenses(expense_id),
   KEY amount (amount),
-  KEY settled (settled)
+  KEY settled (settled),
+  KEY user_settled (user_id, settled)
 );
+
+-- Ledger kept up to date by ledger.Ledger.track(); rebuild with: python ledger.py --config db.json --rebuild
+CREATE TABLE IF NOT EXISTS GroupDebts (
+  group_id BINARY(16) NOT NULL,
+  creditor_id BINARY(16) NOT NULL,
+  debtor_id BINARY(16) NOT NULL,
+  amount DECIMAL(12, 2) NOT NULL,
+  PRIMARY KEY (group_id, creditor_id, debtor_id),
+  FOREIGN KEY (group_id) REFERENCES GroupDetails(group_id),
+  FOREIGN KEY (creditor_id) REFERENCES Users(user_id),
+  FOREIGN KEY (debtor_id) REFERENCES Users(user_id),
+  KEY group_debtor (group_id, debtor_id)
+);
+
+CREATE TABLE IF NOT EXISTS GroupBalances (
+  group_id BINARY(16) NOT NULL,
+  user_id BINARY(16) NOT NULL,
+  net_balance DECIMAL(12, 2) NOT NULL,
+  PRIMARY KEY (group_id, user_id),
+  FOREIGN KEY (group_id) REFERENCES GroupDetails(group_id),
+  FOREIGN KEY (user_id) REFERENCES Users(user_id),
+  KEY user_id (user_id)
+);
+
+-- Per-user summary of open debts kept up to date by ledger.Ledger.track(), read by view_dues; rebuilt together with the ledger
+CREATE TABLE IF NOT EXISTS OpenDues (
+  user_id BINARY(16) NOT NULL,
+  expense_id BINARY(16) NOT NULL,
+  group_id BINARY(16) NOT NULL,
+  amount DECIMAL(10, 2) NOT NULL,
+  PRIMARY KEY (user_id, expense_id),
+  FOREIGN KEY (user_id) REFERENCES Users(user_id),
+  FOREIGN KEY (group_id) REFERENCES GroupDetails(group_id),
+  -- no foreign key to Expenses: delete_expense removes the expense before track() removes its OpenDues rows
+  KEY expense_id (expense_id),
+  KEY group_id (group_id)
+);
+
+CREATE TABLE IF NOT EXISTS UserDueTotals (
+  user_id BINARY(16) NOT NULL,
+  total_owed DECIMAL(12, 2) NOT NULL,
+  open_items INT NOT NULL,
+  PRIMARY KEY (user_id),
+  FOREIGN KEY (user_id) REFERENCES Users(user_id)
+);
+
+-- Databases created before the (user_id, settled) index, which serves the unmaterialized dues query, can be upgraded with:
+-- ALTER TABLE ExpenseParticipants ADD KEY user_settled (user_id, settled);
+
+-- Databases created before the composite Transactions indexes can be upgraded with:
+-- ALTER TABLE Transactions
+--   ADD KEY payer_timestamp (payer_id, timestamp),
+--   ADD KEY payee_timestamp (payee_id, timestamp),
+--   DROP KEY payer_id,
+--   DROP KEY payee_id;
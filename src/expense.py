@@ -1,21 +1,86 @@
 from connector import Connector
 from user import User
 from group import Group
+from ledger import Ledger
+from money import Money
+from splits import compute_split
 from datetime import datetime
-from uuid import uuid4
-from typing import List, Dict
-import math
+from ids import new_id, EXPENSE
+from typing import List, Dict, Iterable, Iterator
+from itertools import islice
+from log import get_logger
+
+log = get_logger("expense")
+
+
+class _ExpenseBatch:
+    """
+    Expenses loaded by the same call. Their payer, group and participants are kept as ids until first accessed,
+    and the first access loads that attribute for every expense of the batch at once, so a list of expenses costs
+    one query per attribute actually used instead of one per expense.
+    """
+    def __init__(self, connector: Connector, users: Dict[str, User] = None, groups: Dict[str, Group] = None,
+                 chunk_size: int = 1000):
+        """
+        :param connector: The database connector used for the lookups.
+        :param users: Dictionary mapping user_id to User for users that are already built. Updated in place.
+        :param groups: Dictionary mapping group_id to Group for groups that are already built. Updated in place.
+        :param chunk_size: How many expenses are looked up per participants query.
+        """
+        self.connector = connector
+        self.users = users if users is not None else {}
+        self.groups = groups if groups is not None else {}
+        self.chunk_size = chunk_size
+        self.expenses = []
+
+    def load_payers(self):
+        pending = [expense for expense in self.expenses if expense._payer is None and expense._payer_id is not None]
+        missing = list(dict.fromkeys(expense._payer_id for expense in pending if expense._payer_id not in self.users))
+        if missing:
+            self.users.update((user.user_id, user) for user in User.get_users(missing, self.connector))
+        for expense in pending:
+            expense._payer = self.users.get(expense._payer_id)
+
+    def load_groups(self):
+        pending = [expense for expense in self.expenses if expense._group is None and expense._group_id is not None]
+        missing = list(dict.fromkeys(expense._group_id for expense in pending if expense._group_id not in self.groups))
+        if missing:
+            self.groups.update((group.group_id, group) for group in Group.get_groups(missing, self.connector))
+        for expense in pending:
+            expense._group = self.groups.get(expense._group_id)
+
+    def load_participants(self):
+        pending = [expense for expense in self.expenses if expense._participants is None]
+        expense_ids = list(dict.fromkeys(expense.expense_id for expense in pending))
+        participants = {}
+        for start in range(0, len(expense_ids), self.chunk_size):
+            chunk = tuple(expense_ids[start:start + self.chunk_size])
+            placeholders = ', '.join(['%s'] * len(chunk))
+            participants_query = f"""
+            SELECT ep.expense_id, ep.amount, u.user_id, u.name, u.email, u.created
+            FROM ExpenseParticipants ep
+            JOIN Users u ON u.user_id = ep.user_id
+            WHERE ep.expense_id IN ({placeholders})
+            """
+            for data in self.connector.execute(participants_query, chunk) or []:
+                if data['user_id'] not in self.users:
+                    self.users[data['user_id']] = User.from_row(data, self.connector)
+                participants.setdefault(data['expense_id'], {})[self.users[data['user_id']]] = Money(data['amount'])
+        for expense in pending:
+            expense._participants = participants.get(expense.expense_id, {})
+
 
 class Expense:
     def __init__(self, amount: float = None, payer: User = None, group: Group = None,
                  participants: Dict[User, float] = None, expense_id: str = None,
                  tag: str = None,
                  connector: Connector = None, description: str = None, password: str = "", filepath: str = "",
-                 user: str = "root", host: str = "localhost", port: str = "3306", database: str = "bill_sharing_app"):
+                 user: str = "root", host: str = "localhost", port: str = "3306", database: str = "bill_sharing_app",
+                 pool_size: int = 0):
         """
         Initializes an Expense object.
 
-        :param amount (required): The amount of the expense.
+        :param amount (required): The amount of the expense. Stored as Money, like every amount of an Expense.
         :param payer (required): The user who paid for the expense.
         :param group (required): The group to which the expense belongs.
         :param participants (required): The dictionary mapping User to the amount the user owes. This MUST CONTAIN THE EXPENSE PAYER as well, with the appropriate amount in negative or positive
@@ -30,56 +95,38 @@ class Expense:
         :param host: The host for the database. Defaults to "localhost".
         :param port: The port for the database. Defaults to "3306".
         :param database: The name of the database. Defaults to "bill_sharing_app".
+        :param pool_size: If greater than 0, the created connector draws its connections from a shared pool of this size. Defaults to 0.
         """
         self._connector = connector if connector else Connector(password = password, filepath = filepath, user = user,
-                                                                host = host, port = port, database = database)
+                                                                host = host, port = port, database = database,
+                                                                pool_size = pool_size)
+        self._batch = None
         if expense_id:
-            check_expense_id_query = "SELECT expense_id FROM Expenses where expense_id = %s"
-            expense_exists = self._connector.execute(check_expense_id_query, params=(expense_id,))
-            if expense_exists:
-                expense_details_query = "SELECT * FROM Expenses where expense_id = %s"
-                expense_details = self._connector.execute(expense_details_query, params=(expense_id,))
-                if expense_details:  # Check if expense_details is not empty
-                    expense_data = expense_details[0]  # Get the first (and only) row
-                    self._expense_id = expense_id
-                    self._amount = expense_data.get('amount')
-                    self._payer = User.get_user(expense_data.get('paid_by'), self._connector) if expense_data.get('paid_by') else None
-                    self._group = Group.get_group(expense_data.get('group_id'), self._connector) if expense_data.get('group_id') else None
-                    self._tag = expense_data.get('tag')
-                    self._description = expense_data.get('description')
-                    self._timestamp = expense_data.get('timestamp')
-                    get_participant_ids_query = "SELECT user_id, amount FROM ExpenseParticipants WHERE expense_id = %s"
-                    participant_data = self._connector.execute(get_participant_ids_query, params=(expense_id,))
-                    self._participants = {}
-                    for data in participant_data:
-                        user_id = data.get('user_id')
-                        if user_id:
-                            user = User.get_user(user_id, self._connector)
-                            self._participants[user] = data.get('amount')
-                else:
-                    raise ValueError(f"No expense found with id {expense_id}")
-
-                if amount and self._amount != amount:
-                    raise ValueError(
-                        f"ERROR[Expense.__init__]: Amount provided does not match the amount in the database for expense_id {expense_id}")
-                '''if payer:
-                    if self._payer != payer:
-                        raise ValueError(f"ERROR[Expense.__init__]: Payer provided does not match the payer in the database for expense_id {expense_id}")
-                if group and self._group != group:
-                    raise ValueError(
-                        f"ERROR[Expense.__init__]: Group provided does not match the group in the database for expense_id {expense_id}")
-                if tag and self._tag != tag:
-                    raise ValueError(
-                        f"ERROR[Expense.__init__]: Tag provided does not match the tag in the database for expense_id {expense_id}")'''
-                if description and self._description != description:
-                    raise ValueError(
-                        f"ERROR[Expense.__init__]: Description provided does not match the description in the database for expense_id {expense_id}")
-                '''if participants and self._participants != participants:
-                    raise ValueError(
-                        f"ERROR[Expense.__init__]: Participants provided do not match the participants in the database for expense_id {expense_id}")'''
-            else:
+            expense_query = "SELECT * FROM Expenses WHERE expense_id = %s"
+            expense_data = self._connector.execute(expense_query, params=(expense_id,), fetchall=False)
+            if not expense_data:
                 raise ValueError(f"No expense found with id {expense_id}")
-        
+            # the same lazy state as Expense.from_row: payer, group and participants are loaded on first access
+            self._load_row(expense_data, self._connector)
+
+            if amount and self._amount != Money(amount):
+                raise ValueError(
+                    f"ERROR[Expense.__init__]: Amount provided does not match the amount in the database for expense_id {expense_id}")
+            '''if payer:
+                if self._payer != payer:
+                    raise ValueError(f"ERROR[Expense.__init__]: Payer provided does not match the payer in the database for expense_id {expense_id}")
+            if group and self._group != group:
+                raise ValueError(
+                    f"ERROR[Expense.__init__]: Group provided does not match the group in the database for expense_id {expense_id}")
+            if tag and self._tag != tag:
+                raise ValueError(
+                    f"ERROR[Expense.__init__]: Tag provided does not match the tag in the database for expense_id {expense_id}")'''
+            if description and self._description != description:
+                raise ValueError(
+                    f"ERROR[Expense.__init__]: Description provided does not match the description in the database for expense_id {expense_id}")
+            '''if participants and self._participants != participants:
+                raise ValueError(
+                    f"ERROR[Expense.__init__]: Participants provided do not match the participants in the database for expense_id {expense_id}")'''
 
         else:
             if not amount:
@@ -93,43 +140,112 @@ class Expense:
             if payer not in participants:
                 raise ValueError(
                     "ERROR[Expense.__init__]: Payer not in participants. Please include the payer in the split.")
-            self._expense_id = f"E{str(uuid4())}"
+            self._expense_id = new_id(EXPENSE)
             self._description = description
             if amount <= 0:
                 raise ValueError("ERROR[Expense.__init__]: Amount cannot be less than or equal to 0.")
-            self._amount = amount
+            self._amount = Money(amount)
             self._payer = payer
             self._group = group
-            self._connector = connector
+            self._payer_id = payer.user_id
+            self._group_id = group.group_id
             self._timestamp = datetime.now()
             self._tag = tag
             if len(participants) == 0:
                 raise ValueError("ERROR[Expense.__init__]: Participants cannot be empty.")
-            self._participants = participants
+            self._participants = Expense._to_money(participants)
 
             if description and tag:
                 insert_expense_query = "INSERT INTO Expenses (expense_id, group_id, description, timestamp, paid_by, amount, tag) VALUES (%s, %s, %s, %s, %s, %s, %s)"
                 insert_expense_params = (
                     self._expense_id, self._group.group_id, self._description, self._timestamp, self._payer.user_id,
-                    self._amount, tag)
+                    self._amount.to_decimal(), tag)
             elif description:
                 insert_expense_query = "INSERT INTO Expenses (expense_id, group_id, description, timestamp, paid_by, amount) VALUES (%s, %s, %s, %s, %s, %s)"
                 insert_expense_params = (
                     self._expense_id, self._group.group_id, self._description, self._timestamp, self._payer.user_id,
-                    self._amount)
+                    self._amount.to_decimal())
             elif tag:
                 insert_expense_query = "INSERT INTO Expenses (expense_id, group_id, timestamp, paid_by, amount, tag) VALUES (%s, %s, %s, %s, %s, %s)"
                 insert_expense_params = (
-                    self._expense_id, self._group.group_id, self._timestamp, self._payer.user_id, self._amount, tag)
+                    self._expense_id, self._group.group_id, self._timestamp, self._payer.user_id, self._amount.to_decimal(), tag)
             else:
                 insert_expense_query = "INSERT INTO Expenses (expense_id, group_id, timestamp, paid_by, amount) VALUES (%s, %s, %s, %s, %s)"
                 insert_expense_params = (
-                    self._expense_id, self._group.group_id, self._timestamp, self._payer.user_id, self._amount)
+                    self._expense_id, self._group.group_id, self._timestamp, self._payer.user_id, self._amount.to_decimal())
 
-            self._connector.execute(insert_expense_query, insert_expense_params)
             insert_participants_query = "INSERT INTO ExpenseParticipants (expense_id, user_id, amount, settled) VALUES (%s, %s, %s, %s)"
-            for user, amount in participants.items():
-                self._connector.execute(insert_participants_query, (self._expense_id, user.user_id, amount, 'NO'))
+            with Ledger.track(self._connector, [self._expense_id]):
+                self._connector.execute(insert_expense_query, insert_expense_params)
+                self._connector.execute_many(insert_participants_query,
+                                             [(self._expense_id, user.user_id, amount.to_decimal(), 'NO')
+                                              for user, amount in self._participants.items()])
+
+    @staticmethod
+    def _to_money(participants: Dict[User, float]) -> Dict[User, Money]:
+        """
+        :return: a copy of participants with every amount as Money
+        """
+        return {user: Money(amount) for user, amount in participants.items()}
+
+    @staticmethod
+    def from_row(row: dict, connector: Connector, payer: User = None, group: Group = None,
+                 participants: Dict[User, float] = None, batch: _ExpenseBatch = None) -> 'Expense':
+        """
+        Builds an Expense straight from a row of the Expenses table. No queries are run, so the row must come from the database.
+        A payer, group or participants that is not given is loaded on first access, from paid_by and group_id in the row.
+
+        :param row: Dictionary with at least expense_id and amount, and optionally paid_by, group_id, description, tag and timestamp.
+        :param connector: The database connector the expense will use for later updates.
+        :param payer: The User matching paid_by in the row.
+        :param group: The Group matching group_id in the row.
+        :param participants: The dictionary mapping User to the amount the user owes.
+        :param batch: The expenses loaded together with this one. The first lazy load resolves the attribute for all of them.
+        :return: Expense object
+        """
+        expense = Expense.__new__(Expense)
+        expense._load_row(row, connector, payer, group, participants, batch)
+        return expense
+
+    def _load_row(self, row: dict, connector: Connector, payer: User = None, group: Group = None,
+                  participants: Dict[User, float] = None, batch: _ExpenseBatch = None):
+        """
+        Sets the state of the expense from a row of the Expenses table, for from_row() and for __init__ with an expense_id.
+        The parameters are those of from_row().
+        """
+        self._connector = connector
+        self._expense_id = row['expense_id']
+        self._amount = Money(row['amount'])
+        self._payer_id = payer.user_id if payer is not None else row.get('paid_by')
+        self._group_id = group.group_id if group is not None else row.get('group_id')
+        self._payer = payer
+        self._group = group
+        self._tag = row.get('tag')
+        self._description = row.get('description')
+        self._timestamp = row.get('timestamp')
+        self._participants = participants
+        self._batch = batch if batch is not None else _ExpenseBatch(connector)
+        self._batch.expenses.append(self)
+
+    @staticmethod
+    def from_rows(rows: List[dict], participant_rows: List[dict], connector: Connector,
+                  users: Dict[str, User], groups: Dict[str, Group]) -> List['Expense']:
+        """
+        Builds Expenses from rows of the Expenses and ExpenseParticipants tables without running any queries.
+
+        :param rows: Rows of the Expenses table.
+        :param participant_rows: Rows with expense_id, user_id and amount for the participants of those expenses.
+        :param connector: The database connector the expenses will use for later updates.
+        :param users: Dictionary mapping user_id to User for every payer and participant in the rows.
+        :param groups: Dictionary mapping group_id to Group for every group in the rows.
+        :return: List of Expense objects in the order of rows
+        """
+        participants = {}
+        for data in participant_rows:
+            participants.setdefault(data['expense_id'], {})[users[data['user_id']]] = Money(data['amount'])
+        return [Expense.from_row(row, connector, payer = users.get(row['paid_by']), group = groups.get(row['group_id']),
+                                 participants = participants.get(row['expense_id'], {}))
+                for row in rows]
 
     def __repr__(self):
         return f"Expense(expense_id = {self.expense_id}, amount = {self.amount}, payer = {self.payer}, group = {self.group}, timestamp = {self.timestamp}, description = {self.description}, tag = {self.tag})"
@@ -170,8 +286,14 @@ class Expense:
         """
         raise AttributeError("Amount cannot be changed directly. Use edit_expense() instead.")
 
+    @property
+    def connector(self):
+        return self._connector
+
     @property
     def payer(self):
+        if self._payer is None and self._payer_id is not None:
+            self._batch.load_payers()
         return self._payer
 
     @payer.setter
@@ -184,6 +306,8 @@ class Expense:
 
     @property
     def group(self):
+        if self._group is None and self._group_id is not None:
+            self._batch.load_groups()
         return self._group
 
     @group.setter
@@ -220,6 +344,8 @@ class Expense:
 
     @property
     def participants(self):
+        if self._participants is None:
+            self._batch.load_participants()
         return self._participants
 
     @participants.setter
@@ -232,26 +358,18 @@ class Expense:
 
     def delete_expense(self):
         try:
-            # Start a transaction
-            self._connector.execute("START TRANSACTION")
-
-            # First, delete related records in ExpenseParticipants
-            expense_participants_query = "DELETE FROM ExpenseParticipants WHERE expense_id = %s"
-            self._connector.execute(expense_participants_query, (self.expense_id,))
-        
-            # Then, delete the expense record
-            expense_query = "DELETE FROM Expenses WHERE expense_id = %s"
-            self._connector.execute(expense_query, (self.expense_id,))
+            with Ledger.track(self._connector, [self._expense_id]):
+                # First, delete related records in ExpenseParticipants
+                expense_participants_query = "DELETE FROM ExpenseParticipants WHERE expense_id = %s"
+                self._connector.execute(expense_participants_query, (self.expense_id,))
 
-            # Commit the transaction
-            self._connector.execute("COMMIT")
+                # Then, delete the expense record
+                expense_query = "DELETE FROM Expenses WHERE expense_id = %s"
+                self._connector.execute(expense_query, (self.expense_id,))
 
-            #4
-            # print(f"Expense {self.expense_id} and its related records have been successfully deleted.")
+            log.debug("Deleted expense %s", self._expense_id)
         except Exception as e:
-            # If an error occurs, rollback the transaction
-            self._connector.execute("ROLLBACK")
-            print(f"An error occurred while deleting the expense: {e}")
+            log.error("Deleting expense %s failed: %s", self._expense_id, e)
             raise
 
     def edit_expense(self, amount: float = None, payer: User = None,
@@ -271,16 +389,21 @@ class Expense:
  
         update_fields = []
         update_params = []
+        if amount is not None:
+            amount = Money(amount)
+        if participants:
+            participants = Expense._to_money(participants)
  
         if amount is not None and amount != self.amount:
             update_fields.append("amount = %s")
-            update_params.append(amount)
+            update_params.append(amount.to_decimal())
             self._amount = amount
  
         if payer is not None and payer != self.payer:
             update_fields.append("paid_by = %s")
             update_params.append(payer.user_id)
             self._payer = payer
+            self._payer_id = payer.user_id
  
         if tag is not None and tag != self.tag:
             update_fields.append("tag = %s")
@@ -300,165 +423,232 @@ class Expense:
             raise ValueError(
                 "ERROR[Expense.edit_expense]: Payer not in participants. Please include the payer in the split.")
  
-        if participants and sum(participants.values()) != self.amount:
+        if participants and sum(share.cents for share in participants.values()) != self.amount.cents:
             raise ValueError("ERROR[Expense.edit_expense]: Sum of split amounts does not match the expense amount.")
  
         if payer and participants and participants[payer] == self.participants[payer]:
             raise ValueError("ERROR[Expense.edit_expense]: Payer amount not changed. Please provide the new split.")
         
-        if update_fields:
-            update_query = f"UPDATE Expenses SET {', '.join(update_fields)} WHERE expense_id = %s"
-            update_params.append(self.expense_id)
-            self._connector.execute(update_query, update_params)
- 
-        if split_method or participants:
-            if split_method:
-                if not participants:
-                    participants = {user: 0 for user in self.participants}
-                self.calculate_and_split_expense(split_method, list(participants.keys()), split_amounts, split_percentages)
-            elif participants:
-                self.split_expense(self.amount, participants)
-           
-            # Update ExpenseParticipants table
-            current_participants = self.participants
-            new_participant_ids = set(participants.keys())
-            existing_participant_ids = set(current_participants.keys())
-            # Delete removed participants
-            participant_ids_to_delete = existing_participant_ids - new_participant_ids
-            if participant_ids_to_delete:
-                delete_query = "DELETE FROM ExpenseParticipants WHERE expense_id = %s AND user_id = %s"
-                delete_params = [(self.expense_id, user.user_id) for user in participant_ids_to_delete]
-                self._connector.execute(delete_query, delete_params)
-            # Insert new participants
-            participants_to_insert = {user: amount for user, amount in participants.items() if
-                                      user not in existing_participant_ids}
-            if participants_to_insert:
-                insert_query = "INSERT INTO ExpenseParticipants (expense_id, user_id, amount, settled) VALUES (%s, %s, %s, %s)"
-                insert_params = [(self.expense_id, user.user_id, amount, 'NO') for user, amount in participants_to_insert.items()]
-                self._connector.execute(insert_query, insert_params)
-            # Update existing participants
-            participants_to_update = {user: amount for user, amount in participants.items() if
-                                      user in existing_participant_ids and amount != current_participants[user]}
-            if participants_to_update:
-                update_query = "UPDATE ExpenseParticipants SET amount = %s WHERE expense_id = %s AND user_id = %s"
-                update_params = [(amount, self.expense_id, user.user_id) for user, amount in
-                                 participants_to_update.items()]
+        with Ledger.track(self._connector, [self._expense_id]):
+            if update_fields:
+                update_query = f"UPDATE Expenses SET {', '.join(update_fields)} WHERE expense_id = %s"
+                update_params.append(self.expense_id)
                 self._connector.execute(update_query, update_params)
-               
+ 
+            if split_method or participants:
+                if split_method:
+                    if not participants:
+                        participants = {user: 0 for user in self.participants}
+                    self.calculate_and_split_expense(split_method, list(participants.keys()), split_amounts, split_percentages)
+                elif participants:
+                    self.split_expense(self.amount, participants)
+
     @staticmethod
     def get_expense(expense_id: str, connector: Connector):
         """
-        Retrieves an expense from the database and returns an Expense object by handing the expense id to the constructor
+        Retrieves an expense from the database with a single query for its row.
+        The payer, group and participants are loaded when they are first accessed.
         :param expense_id: The ID of the expense.
         :param connector: The database connector.
         :return: Expense object
         """
         query = "SELECT * FROM Expenses WHERE expense_id = %s"
-        expense_exists = connector.execute(query, (expense_id,), fetchall=False)
-        if not expense_exists:
+        expense_data = connector.execute(query, (expense_id,), fetchall=False)
+        if not expense_data:
             raise ValueError(f"Error[Expense.get_expense] : Expense with ID {expense_id} not found.")
-        return Expense(expense_id=expense_id, connector=connector)
+        return Expense.from_row(expense_data, connector)
 
     
     @staticmethod
-    def get_expenses(expense_ids: List[str], connector: Connector) -> List['Expense']:
-        expenses = []
-        for expense_id in expense_ids:
-            try:
-                expense_data = connector.execute("SELECT * FROM Expenses WHERE expense_id = %s", params=(expense_id,))
-                if not expense_data:
-                    print(f"No expense found with id {expense_id}")
-                    continue
-                
-                expense_data = expense_data[0]  # Get the first (and only) row
-                expense = Expense(
-                    expense_id=expense_id,
-                    amount=expense_data['amount'],
-                    payer=User.get_user(expense_data['paid_by'], connector),
-                    group=Group.get_group(expense_data['group_id'], connector),
-                    description=expense_data.get('description'),
-                    tag=expense_data.get('tag'),
-                    connector=connector
-                )
-                
-                # Fetch participants for this expense
-                get_participant_ids_query = "SELECT user_id, amount FROM ExpenseParticipants WHERE expense_id = %s"
-                participant_data = connector.execute(get_participant_ids_query, params=(expense_id,))
-                
-                print(f"Participant data for expense {expense_id}: {participant_data}")  # Debug print
-                
-                expense._participants = {}
-                for data in participant_data:
-                    user_id = data['user_id']
-                    user = User.get_user(user_id, connector)
-                    expense._participants[user] = data['amount']
-                
-                print(f"Participants for expense {expense_id}: {expense._participants}")  # Debug print
-                
-                expenses.append(expense)
-            except Exception as e:
-                print(f"Error processing expense {expense_id}: {e}")
-
-        return expenses
-            
+    def get_expenses(expense_ids: Iterable[str], connector: Connector, chunk_size: int = 1000,
+                     missing: List[str] = None) -> List['Expense']:
+        """
+        Retrieves many expenses with bulk IN (...) queries, chunk_size ids at a time.
+        :param expense_ids: The IDs of the expenses.
+        :param connector: The database connector.
+        :param chunk_size: How many ids are looked up per query. Defaults to 1000.
+        :param missing: Optional list. IDs that are not in the database are appended to it in input order.
+        :return: List of Expense objects in the order of expense_ids, without the missing ones
+        """
+        return list(Expense.iter_expenses(expense_ids, connector, chunk_size = chunk_size, missing = missing))
+
     @staticmethod
-    def get_group_expenses(group_id: str, connector: Connector):
+    def iter_expenses(expense_ids: Iterable[str], connector: Connector, chunk_size: int = 1000,
+                      missing: List[str] = None) -> Iterator['Expense']:
+        """
+        Generator version of get_expenses(). Only one chunk of rows is held at a time, so very long id lists (or id generators) can be processed with bounded memory.
+        Each chunk costs one query for the expenses. The expenses of a chunk load their payers, groups and participants together on first access,
+        with one query per attribute for the whole chunk, and users and groups seen in earlier chunks are not loaded again.
+        :param expense_ids: The IDs of the expenses.
+        :param connector: The database connector.
+        :param chunk_size: How many ids are looked up per query. Defaults to 1000.
+        :param missing: Optional list. IDs that are not in the database are appended to it in input order.
+        :return: Iterator of Expense objects in the order of expense_ids, without the missing ones
+        """
+        if chunk_size < 1:
+            raise ValueError("Error[Expense.iter_expenses] : Chunk size must be at least 1.")
+        users = {}   # shared between chunks so a user or group is built only once per call
+        groups = {}
+        ids = iter(expense_ids)
+        while True:
+            chunk = list(islice(ids, chunk_size))
+            if not chunk:
+                return
+            unique_ids = tuple(dict.fromkeys(chunk))
+            placeholders = ', '.join(['%s'] * len(unique_ids))
+            expense_rows = connector.execute(f"SELECT * FROM Expenses WHERE expense_id IN ({placeholders})",
+                                             unique_ids) or []
+            expenses = {expense.expense_id: expense for expense in
+                        Expense._build_from_expense_rows(expense_rows, connector, users, groups, chunk_size)}
+            for expense_id in chunk:
+                expense = expenses.get(expense_id)
+                if expense is not None:
+                    yield expense
+                elif missing is not None:
+                    missing.append(expense_id)
+
+    @staticmethod
+    def get_group_expenses(group_id: str, connector: Connector) -> List['Expense']:
+        """
+        Retrieves all expenses of a group with one query for their rows.
+        Payers, the group and participants are loaded for all of the expenses together on first access, one query each,
+        so every expense shares the same Group object and each user is built once per call.
+        :param group_id: The ID of the group.
+        :param connector: The database connector.
+        :return: List of Expense objects
+        """
         query = "SELECT * FROM Expenses WHERE group_id = %s"
-        expenses = connector.execute(query, (group_id,))
-        return [Expense(expense_id=expense['expense_id'], connector=connector) for expense in expenses]
+        expense_rows = connector.execute(query, (group_id,))
+        if not expense_rows:
+            return []
+        return Expense._build_from_expense_rows(expense_rows, connector, {}, {})
+
+    @staticmethod
+    def stream_group_expenses(group_id: str, connector: Connector, batch_size: int = 1000) -> Iterator['Expense']:
+        """
+        Streaming version of get_group_expenses() for groups with a long history. The rows are read with Connector.stream,
+        so only batch_size expenses are held at a time however many the group has.
+        The expenses of a batch load their payers and participants together on first access, one query each per batch,
+        and the group and each user are built only once per call.
+        :param group_id: The ID of the group.
+        :param connector: The database connector.
+        :param batch_size: How many expenses are read and built at a time. Defaults to 1000.
+        :return: Iterator of Expense objects ordered by timestamp
+        """
+        if batch_size < 1:
+            raise ValueError("Error[Expense.stream_group_expenses] : Batch size must be at least 1.")
+        users = {}   # shared between batches, like in iter_expenses()
+        groups = {}
+        query = "SELECT * FROM Expenses WHERE group_id = %s ORDER BY timestamp, expense_id"
+        rows = connector.stream(query, (group_id,), batch_size = batch_size)
+        try:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    return
+                yield from Expense._build_from_expense_rows(batch, connector, users, groups, batch_size)
+        finally:
+            rows.close()
+
+    @staticmethod
+    def get_group_expense_summaries(group_id: str, connector: Connector) -> List[dict]:
+        """
+        Retrieves only what an expense list shows, for every expense of a group, in one query. No User, Group or Expense objects are built.
+        :param group_id: The ID of the group.
+        :param connector: The database connector.
+        :return: List of dictionaries with expense_id, amount, description, tag, payer_name, group_name and open_shares
+                 (the number of participant rows not settled yet), ordered by timestamp
+        """
+        query = """
+        SELECT e.expense_id, e.amount, e.description, e.tag, u.name AS payer_name, g.name AS group_name,
+               COALESCE(SUM(CASE WHEN ep.settled != 'SETTLED' THEN 1 ELSE 0 END), 0) AS open_shares
+        FROM Expenses e
+        JOIN Users u ON u.user_id = e.paid_by
+        JOIN GroupDetails g ON g.group_id = e.group_id
+        LEFT JOIN ExpenseParticipants ep ON ep.expense_id = e.expense_id
+        WHERE e.group_id = %s
+        GROUP BY e.expense_id, e.amount, e.description, e.tag, e.timestamp, u.name, g.name
+        ORDER BY e.timestamp, e.expense_id
+        """
+        return connector.execute(query, (group_id,)) or []
+
+    @staticmethod
+    def _build_from_expense_rows(expense_rows: List[dict], connector: Connector, users: Dict[str, User],
+                                 groups: Dict[str, Group], chunk_size: int = 1000) -> List['Expense']:
+        """
+        Builds lazy Expenses from already fetched rows of the Expenses table without running any queries. The expenses form one batch:
+        their payers, groups and participants are loaded together on first access, participants with one IN (...) query per chunk_size expenses.
+        Users and groups already in users/groups are reused, and both maps are updated in place as the batch loads.
+        """
+        batch = _ExpenseBatch(connector, users, groups, chunk_size)
+        return [Expense.from_row(row, connector, batch = batch) for row in expense_rows]
     
     
-    def calculate_and_split_expense(self, method: str, participants: List[User], amounts: List[float] = None, percentages: List[float] = None):
+    def calculate_and_split_expense(self, method: str, participants: List[User], amounts: List[float] = None,
+                                    percentages: List[float] = None, **options):
         """
-        Calculates how to split the expense based on the specified method and calls split_expense.
+        Calculates how to split the expense with one of the split methods registered in splits.py and calls split_expense.
+        Every method allocates the amount in one pass over whole cents, so the shares always add up to the expense amount exactly.
 
-        :param method: The method to use for splitting the expense. Can be 'equal', 'unequal', or 'percentages'.
+        :param method: The method to use for splitting the expense: 'equal', 'unequal', 'percentages', 'shares', 'itemised', 'adjustment'
+                       or any other method registered with splits.split_strategy.
         :param participants: The list of participants.
         :param amounts: The list of amounts each participant owes (required for 'unequal' method).
         :param percentages: The list of percentages each participant owes (required for 'percentages' method).
+        :param options: Options of the other methods: shares=[...] for 'shares', items=[(price, [users]), ...] with optional tax and tip
+                        for 'itemised', adjustments=[...] for 'adjustment'.
         """
-        if method == 'equal':
-            split_amount = self._amount
-            individual_amount = split_amount / len(participants)
-            split_dict = {participant: individual_amount for participant in participants}
-        elif method == 'unequal':
-            if not amounts or len(amounts) != len(participants):
-                raise ValueError("Error[Expense.calculate & split_expense] : Amounts must be provided and match the number of participants for 'unequal' method.")
-            split_amount = sum(amounts)
-            if split_amount != self._amount:
-                raise ValueError("Error[Expense.calculate & split_expense] :The sum of amounts provided must be equal to the total split amount.")
-            split_dict = {participant: amount for participant, amount in zip(participants, amounts)}
-        elif method == 'percentages':
-            if not percentages or len(percentages) != len(participants):
-                raise ValueError("Error[Expense.calculate & split_expense] :Percentages must be provided and match the number of participants for 'percentages' method.")
-            split_amount = self._amount
-            split_dict = {participant: split_amount * (percentage / 100) for participant, percentage in zip(participants, percentages)}
-        else:
-            raise ValueError("Error[Expense.calculate & split_expense] : Invalid method specified. Use 'equal', 'unequal', or 'percentages'.")
+        if amounts is not None:
+            options['amounts'] = amounts
+        if percentages is not None:
+            options['percentages'] = percentages
+        try:
+            split_dict = compute_split(method, self._amount, participants, **options)
+        except TypeError as e:
+            raise ValueError(f"ERROR[Expense.calculate_and_split_expense]: Invalid options for the {method!r} method: {e}")
 
-        self.split_expense(split_amount, split_dict)
-        
+        self.split_expense(self._amount, split_dict)
 
     def split_expense(self, split_amount: float, participants: Dict[User, float]):
         """
         Splits the expense amount among the given participants.
+        The participant rows currently in the database are read and locked, and only the difference is written, in one unit of work:
+        one DELETE for removed participants and one batch each for inserted participants and changed amounts.
+        Participants whose amount does not change keep their settled state; changed and new ones are marked 'NO'.
 
         :param split_amount: The total amount to be split among the participants.
         :param participants: A dictionary mapping each participant (User) to their respective amount.
         """
-        total_split_amount = sum(participants.values())
-        if total_split_amount != split_amount:
+        split_amount = Money(split_amount)
+        participants = Expense._to_money(participants)
+        if sum(amount.cents for amount in participants.values()) != split_amount.cents:
             raise ValueError("Error[Expense.split_expense]: Total split amount does not match the provided split amount.")
 
-        self._amount = split_amount
-        self._participants = participants
+        new = {user.user_id: amount for user, amount in participants.items()}
+        current_participants_query = "SELECT user_id, amount, settled FROM ExpenseParticipants WHERE expense_id = %s FOR UPDATE"
 
-        update_expense_query = "UPDATE Expenses SET amount = %s WHERE expense_id = %s"
-        self._connector.execute(update_expense_query, (self._amount, self._expense_id))
+        with Ledger.track(self._connector, [self._expense_id]):
+            current = {row['user_id']: Money(row['amount'])
+                       for row in self._connector.execute(current_participants_query, (self._expense_id,)) or []}
+            removed = [user_id for user_id in current if user_id not in new]
+            inserted = [(self._expense_id, user_id, amount.to_decimal(), 'NO') for user_id, amount in new.items() if user_id not in current]
+            # A changed share is owed afresh; rows whose amount is unchanged keep their settled state
+            changed = [(amount.to_decimal(), 'NO', self._expense_id, user_id) for user_id, amount in new.items()
+                       if user_id in current and amount != current[user_id]]
 
-        delete_old_participants_query = "DELETE FROM ExpenseParticipants WHERE expense_id = %s"
-        self._connector.execute(delete_old_participants_query, (self._expense_id,))
+            if split_amount != self._amount:
+                self._connector.execute("UPDATE Expenses SET amount = %s WHERE expense_id = %s",
+                                        (split_amount.to_decimal(), self._expense_id))
+            if removed:
+                placeholders = ', '.join(['%s'] * len(removed))
+                self._connector.execute(f"DELETE FROM ExpenseParticipants WHERE expense_id = %s AND user_id IN ({placeholders})",
+                                        (self._expense_id,) + tuple(removed))
+            if inserted:
+                self._connector.execute_many("INSERT INTO ExpenseParticipants (expense_id, user_id, amount, settled) VALUES (%s, %s, %s, %s)",
+                                             inserted)
+            if changed:
+                self._connector.execute_many("UPDATE ExpenseParticipants SET amount = %s, settled = %s WHERE expense_id = %s AND user_id = %s",
+                                             changed)
 
-        insert_new_participants_query = "INSERT INTO ExpenseParticipants (expense_id, user_id, amount, settled) VALUES (%s, %s, %s, %s)"
-        for user, amount in participants.items():
-            self._connector.execute(insert_new_participants_query, (self._expense_id, user.user_id, amount, 'NO'))
\ No newline at end of file
+        self._amount = split_amount
+        self._participants = participants
@@ -1,12 +1,19 @@
-from typing import Optional
+from typing import Optional, Tuple
+from decimal import Decimal
 from user import *
-from uuid import uuid4
+from ledger import Ledger
+from settlement import plan_settlements, EXACT_LIMIT
+from money import Money
+from ids import new_id, GROUP
+from log import get_logger
+
+log = get_logger("group")
 
 
 class Group:
     def __init__(self,  admin: User, name: str, group_id: str = None, connector: Connector = None, description: str = None,
                  members= Optional[List[User]], password: str = "", filepath: str = "", user: str = "root", host: str = "localhost",
-                 port: str = "3306", database: str = "bill_sharing_app"):
+                 port: str = "3306", database: str = "bill_sharing_app", pool_size: int = 0):
         """
         Creates a group object and automatically updates the database with the new group if the group_id is not present in the database.
         If the group is present in database, the group details are fetched from the database and the object is created.
@@ -25,9 +32,10 @@ class Group:
         :param host: host for the database
         :param port: port for the database
         :param database: name of the database
+        :param pool_size: if greater than 0, the created connector draws its connections from a shared pool of this size
         """
         self._connector = Connector(password = password, filepath = filepath, user = user, host = host, port = port,
-                                    database = database) if not connector else connector
+                                    database = database, pool_size = pool_size) if not connector else connector
         check_group_id_query = "SELECT group_id FROM GroupDetails WHERE group_id = %s"
         group_exists = self.connector.execute(check_group_id_query, (group_id,))
         if group_exists:
@@ -52,8 +60,7 @@ class Group:
         else:
             if group_id:
                 raise ValueError(f"ERROR[Group.__init__]: You are trying to assign a group_id to a group that does not exist in the database. group_id: {group_id}")
-            self._group_id = f"G{str(uuid4())}"
-            self._connector = connector
+            self._group_id = new_id(GROUP)
             self._name = name
             self._admin = admin
             self._description = description
@@ -68,12 +75,11 @@ class Group:
             else:
                 insert_group_query = "INSERT INTO GroupDetails (group_id, name, admin_id, created) VALUES (%s, %s, %s, %s)"
                 insert_group_params = (self._group_id, self._name, self._admin.user_id, self._created)
-            self.connector.execute(insert_group_query, params = insert_group_params)
-
             insert_member_query = "INSERT INTO GroupMembers (group_id, user_id) VALUES (%s, %s)"
-            for member in members:
-                params = (self._group_id, member.user_id)
-                self.connector.execute(insert_member_query, params)
+            with self.connector.transaction():
+                self.connector.execute(insert_group_query, params = insert_group_params)
+                self.connector.execute_many(insert_member_query,
+                                            [(self._group_id, member.user_id) for member in self._members])
 
     def __repr__(self):
         # TODO: change admin printing to print name/id of admin or add repr method in User class @Sravani and @Pranav
@@ -107,6 +113,7 @@ class Group:
         rename_query = "UPDATE GroupDetails SET name = %s WHERE group_id = %s"
         params = (new_name, self._group_id)
         self.connector.execute(rename_query, params)
+        self._refresh_mapped()
 
     @property
     def admin(self):
@@ -119,20 +126,22 @@ class Group:
         if not any(member == new_admin.user_id for member in self.members):
             raise ValueError("New admin should be a member of the group")
         if self.admin == new_admin:
-            print(f"{new_admin} is already the admin of the group")
+            log.info("%s is already the admin of group %s", new_admin.user_id, self.group_id)
             return
 
-        # replace new_admin in GroupMembers with old admin
-        replace_in_group_members_query = "UPDATE GroupMembers SET user_id = %s WHERE group_id = %s AND user_id = %s"
-        self.connector.execute(replace_in_group_members_query, (self.admin.user_id, self.group_id, new_admin.user_id))
+        with self.connector.transaction():
+            # replace new_admin in GroupMembers with old admin
+            replace_in_group_members_query = "UPDATE GroupMembers SET user_id = %s WHERE group_id = %s AND user_id = %s"
+            self.connector.execute(replace_in_group_members_query, (self.admin.user_id, self.group_id, new_admin.user_id))
 
-        # replace old admin in Group with new_admin
-        replace_in_group_query = "UPDATE GroupDetails SET admin_id = %s WHERE group_id = %s"
-        self.connector.execute(replace_in_group_query, (new_admin.user_id, self.group_id))
+            # replace old admin in Group with new_admin
+            replace_in_group_query = "UPDATE GroupDetails SET admin_id = %s WHERE group_id = %s"
+            self.connector.execute(replace_in_group_query, (new_admin.user_id, self.group_id))
 
         self.members.append(self.admin)
         self.members.remove(new_admin.user_id)
         self._admin = new_admin
+        self._refresh_mapped()
 
     # description of the group
     @property
@@ -148,6 +157,7 @@ class Group:
         update_query = "UPDATE GroupDetails SET description = %s WHERE group_id = %s"
         self.connector.execute(update_query, (desc, self.group_id))
         self._description = desc
+        self._refresh_mapped()
 
     @property
     def members(self):
@@ -167,31 +177,45 @@ class Group:
         members_to_remove = set(current_user_ids) - set(new_user_ids)
         members_to_add = set(new_user_ids) - set(current_user_ids)
 
-        # Bulk remove members not in new_members
-        if members_to_remove:
-            remove_query = 'DELETE FROM GroupMembers WHERE group_id = %s AND user_id IN (%s)' % (self.group_id, ','.join(['%s'] * len(members_to_remove)))
-            self.connector.execute(remove_query, tuple(members_to_remove))
-
-        # Check all user IDs exist, in a single database query
-        missing_members = self.check_members_in_db(new_user_ids)
-        if missing_members:
-            missing_ids_str = ", ".join(missing_members)
-            raise ValueError(f"Some members are not present in the database: {missing_ids_str}")
-
-        # Bulk add new members
-        if members_to_add:
-            add_query = 'INSERT INTO GroupMembers (group_id, user_id) VALUES ' + ','.join(['(%s, %s)'] * len(members_to_add))
-            add_params = []
-            for user_id in members_to_add:
-                add_params.extend((self.group_id, user_id))
-            self.connector.execute(add_query, tuple(add_params))
+        with self.connector.transaction():
+            # Removal and addition are one unit of work, so a failed check below leaves the membership untouched
+            # Bulk remove members not in new_members
+            if members_to_remove:
+                placeholders = ', '.join(['%s'] * len(members_to_remove))
+                remove_query = f'DELETE FROM GroupMembers WHERE group_id = %s AND user_id IN ({placeholders})'
+                self.connector.execute(remove_query, (self.group_id,) + tuple(members_to_remove))
+
+            # Check all user IDs exist, in a single database query
+            missing_members = self.check_members_in_db(new_user_ids)
+            if missing_members:
+                missing_ids_str = ", ".join(missing_members)
+                raise ValueError(f"Some members are not present in the database: {missing_ids_str}")
+
+            # Bulk add new members
+            if members_to_add:
+                add_query = 'INSERT INTO GroupMembers (group_id, user_id) VALUES (%s, %s)'
+                self.connector.execute_many(add_query, [(self.group_id, user_id) for user_id in members_to_add])
 
         self._members = new_members
+        self._refresh_mapped()
 
     @property
     def created(self):
         return self._created
 
+    def _refresh_mapped(self):
+        """
+        Copies this group's state onto the object the connector's identity map holds for the same id after a write,
+        so that object stays the one instance for the id and its holders see the change.
+        """
+        if self.connector.identity_map is not None:
+            mapped = self.connector.identity_map.peek('Group', self._group_id)
+            if mapped is not None and mapped is not self:
+                mapped._name = self._name
+                mapped._description = self._description
+                mapped._admin = self._admin
+                mapped._members = list(self._members)
+
     def check_members_in_db(self, user_ids: List[str]):
         """
         Check if all user IDs are present in the database
@@ -213,6 +237,22 @@ class Group:
         missing_members = [user_id for user_id in user_ids if user_id not in existing_user_ids_set]
         return missing_members
 
+    def simplify_debts(self, exact_limit: int = EXACT_LIMIT) -> List[Tuple[User, User, Decimal]]:
+        """
+        Plans the transfers that settle every open balance in the group, replacing the pairwise debts per expense with as few payments as possible.
+        Balances are read from the ledger (GroupBalances), so the plan covers every unsettled expense share and every payment made so far.
+        :param exact_limit: groups with at most this many members holding a balance get a plan with the minimum number of transfers; larger groups get the greedy plan
+        :return: list of (debtor, creditor, amount) meaning debtor pays creditor amount
+        """
+        balances = Ledger.get_balances(self.group_id, self.connector)
+        transfers = plan_settlements({user_id: Money(balance).cents for user_id, balance in balances.items()}, exact_limit)
+
+        users = {user.user_id: user for user in [self.admin] + self.members}
+        # balances can outlive membership, so former members are loaded on demand
+        missing_ids = list({user_id for transfer in transfers for user_id in transfer[:2] if user_id not in users})
+        users.update((user.user_id, user) for user in User.get_users(missing_ids, self.connector))
+        return [(users[debtor_id], users[creditor_id], Decimal(cents).scaleb(-2)) for debtor_id, creditor_id, cents in transfers]
+
     def get_group_details(self):
         """
         :return: Dictionary containing group details
@@ -226,6 +266,59 @@ class Group:
             "created": self.created
         }
 
+    @staticmethod
+    def from_row(row: dict, connector: Connector, admin: User = None, members: List[User] = None) -> 'Group':
+        """
+        Builds a Group straight from a row of the GroupDetails table. No queries are run, so the row must come from the database.
+        :param row: dictionary with at least group_id, name, description and created
+        :param connector: connector object the group will use for later updates
+        :param admin: User object of the admin (admin_id in the row)
+        :param members: User objects of the members, not including the admin
+        :return: Group object. If the connector has an identity map that already holds this group, that object is refreshed from the arguments and returned
+        """
+        identity_map = connector.identity_map
+        # loads count their own lookups with get() or get_many(), so building the object only peeks
+        group = identity_map.peek('Group', row['group_id']) if identity_map is not None else None
+        if group is None:
+            group = Group.__new__(Group)
+            if identity_map is not None:
+                identity_map.add('Group', row['group_id'], group)
+        group._connector = connector
+        group._group_id = row['group_id']
+        group._name = row['name']
+        group._description = row['description']
+        group._admin = admin
+        group._members = members if members is not None else []
+        group._created = row['created']
+        return group
+
+    @staticmethod
+    def from_rows(rows: List[dict], connector: Connector) -> List['Group']:
+        """
+        Builds groups from rows that each pair a group with one of its users, as selected by get_groups(). No queries are run.
+        The group columns are group_id, group_name, description, admin_id and group_created; the user columns are those of the Users table.
+        A row whose user_id is the admin_id sets the admin, every other row adds a member.
+        :param rows: list of joined group/user dictionaries
+        :param connector: connector object the groups and users will use for later updates
+        :return: list of Group objects in the order their group_id first appears in rows
+        """
+        users = {}  # user_id -> User, so a user in several groups is built once
+        groups = {}
+        for row in rows:
+            user = users.get(row['user_id'])
+            if user is None:
+                user = users[row['user_id']] = User.from_row(row, connector)
+            group = groups.get(row['group_id'])
+            if group is None:
+                group = groups[row['group_id']] = Group.from_row(
+                    {'group_id': row['group_id'], 'name': row['group_name'], 'description': row['description'],
+                     'created': row['group_created']}, connector)
+            if row['user_id'] == row['admin_id']:
+                group._admin = user
+            else:
+                group._members.append(user)
+        return list(groups.values())
+
     @staticmethod
     def get_group(group_id: str, connector: Connector):
         """
@@ -234,32 +327,47 @@ class Group:
         :param connector: connector object to be used to fetch the group details
         :return: Group object
         """
-        select_group_query = 'SELECT * FROM GroupDetails WHERE group_id = %s'
-        group_data = connector.execute(select_group_query, (group_id,))
-        if not group_data:
+        groups = Group.get_groups([group_id], connector)
+        if not groups:
             raise ValueError(f"Group with ID {group_id} not found")
+        return groups[0]
 
-        group_data = group_data[0] #Extracting the single dictionary from the list
-
-        # Fetch member user IDs
-        select_members_query = 'SELECT user_id FROM GroupMembers WHERE group_id = %s'
-        members_data = connector.execute(select_members_query, (group_id,), fetchall = True)
-        member_ids = [member['user_id'] for member in members_data]
-
-        # Fetch admin user details using User.get_user method
-        admin_user = User.get_user(group_data['admin_id'], connector)
-        if not admin_user:
-            raise ValueError(f"No admin user found with user_id: {group_data['admin_id']}")
-
-        # Fetch member details
-        member_users = User.get_users(member_ids, connector)
-
-        return Group(group_id = group_id,
-                     admin = admin_user,
-                     name = group_data['name'],
-                     description = group_data['description'],
-                     members = member_users,
-                     connector = connector)
+    @staticmethod
+    def get_groups(group_ids: List[str], connector: Connector) -> List['Group']:
+        """
+        Loads groups together with their admins and members in a single query.
+        The admin and the members of every group come back as one row each, so no User or Group is re-queried while the objects are built.
+        :param group_ids: group_ids of the groups to be fetched
+        :param connector: connector object to be used to fetch the group details
+        :return: list of Group objects in the order of group_ids. IDs that are not in the database are skipped
+        """
+        group_ids = list(dict.fromkeys(group_ids))
+        if not group_ids:
+            return []
+        groups = {}
+        if connector.identity_map is not None:
+            groups = connector.identity_map.get_many('Group', group_ids)
+        missing_ids = [group_id for group_id in group_ids if group_id not in groups]
+        if not missing_ids:
+            return [groups[group_id] for group_id in group_ids]
+        placeholders = ', '.join(['%s'] * len(missing_ids))
+        select_groups_query = f"""
+        SELECT g.group_id, g.name AS group_name, g.description, g.admin_id, g.created AS group_created,
+               u.user_id, u.name, u.email, u.created
+        FROM GroupDetails g
+        JOIN Users u ON u.user_id = g.admin_id
+        WHERE g.group_id IN ({placeholders})
+        UNION ALL
+        SELECT g.group_id, g.name, g.description, g.admin_id, g.created,
+               u.user_id, u.name, u.email, u.created
+        FROM GroupDetails g
+        JOIN GroupMembers m ON m.group_id = g.group_id
+        JOIN Users u ON u.user_id = m.user_id
+        WHERE g.group_id IN ({placeholders}) AND m.user_id != g.admin_id
+        """
+        rows = connector.execute(select_groups_query, tuple(missing_ids) * 2) or []
+        groups.update((group.group_id, group) for group in Group.from_rows(rows, connector))
+        return [groups[group_id] for group_id in group_ids if group_id in groups]
 
     def add_member(self, user_id: str):
         # verify whether user_id exists in the database
@@ -280,6 +388,7 @@ class Group:
         self.connector.execute(insert_member_query, params)
         user=User.get_user(user_id,self.connector)
         self._members.append(user)
+        self._refresh_mapped()
 
     def add_members(self, user_ids: List[str]):
         # verify whether user_ids exist in the database
@@ -301,14 +410,11 @@ class Group:
             raise ValueError("All provided users are already members of this group")
 
         # Proceed to add only new members
-        insert_member_query = 'INSERT INTO GroupMembers (group_id, user_id) VALUES ' + ','.join(['(%s, %s)'] * len(user_ids))
-        params = []
-        user = []
-        for user_id in user_ids:
-            user.append(User.get_user(user_id,self.connector))
-            params.extend((self.group_id, user_id))
-        self.connector.execute(insert_member_query, tuple(params))
+        insert_member_query = 'INSERT INTO GroupMembers (group_id, user_id) VALUES (%s, %s)'
+        user = [User.get_user(user_id, self.connector) for user_id in new_member_ids]
+        self.connector.execute_many(insert_member_query, [(self.group_id, user_id) for user_id in new_member_ids])
         self._members.extend(user)
+        self._refresh_mapped()
 
     def remove_member(self, user_id: str):
         delete_member_query = 'DELETE FROM GroupMembers WHERE group_id = %s AND user_id = %s'
@@ -317,6 +423,7 @@ class Group:
         
         # Remove the user from self.members based on user_id
         self._members = [member for member in self._members if member.user_id != user_id]
+        self._refresh_mapped()
 
     def remove_members(self, user_ids: List[str]):
         # verify whether user_ids exist in the database
@@ -332,7 +439,7 @@ class Group:
         users_to_remove = []
         for user_id in user_ids:
             if user_id not in current_user_ids:
-                print("User with ID %s is not part of the group" % user_id)
+                log.warning("User with ID %s is not part of group %s", user_id, self.group_id)
             else:
                 users_to_remove.append(user_id)
 
@@ -349,7 +456,7 @@ class Group:
             # Update the local _members list to reflect the changes
             self.members = [member for member in self.members if member.user_id not in users_to_remove]
 
-        print(f"Removed {len(users_to_remove)} members from the group.")
+        log.info("Removed %d members from group %s", len(users_to_remove), self.group_id)
 
     @staticmethod
     def get_group_by_admin_id(admin_id: str, connector: Connector) -> List['Group']:
@@ -363,11 +470,4 @@ class Group:
         group_data = connector.execute(select_groups_query, (admin_id,), fetchall=True)
         if not group_data:
             return []
-        groups = []
-        for group in group_data:
-            try:
-                group_obj = Group.get_group(group['group_id'], connector)
-                groups.append(group_obj)
-            except ValueError as e:
-                print(f"Error retrieving group {group['group_id']}: {str(e)}")
-        return groups
+        return Group.get_groups([group['group_id'] for group in group_data], connector)
@@ -0,0 +1,147 @@
+import os
+import re
+import threading
+import time
+from typing import List
+from uuid import UUID
+
+# Every id is a one-letter type prefix followed by a UUID, e.g. "E0190b1d6-4f2a-7c31-9a55-3e0f6b2d8c41".
+# The prefix only exists in Python: the database stores the 16 bytes of the UUID in a BINARY(16) column,
+# and the prefix is put back from the name of the column a value is read from.
+# Ids are Id strings. Only those are sent as bytes, so a name or description that happens to look like an id stays text.
+USER, GROUP, EXPENSE, TRANSACTION = "U", "G", "E", "T"
+
+# Result columns holding an id, including the aliases used in queries, mapped to the prefix of their ids
+ID_COLUMNS = {
+    "user_id": USER, "paid_by": USER, "payer_id": USER, "payee_id": USER, "admin_id": USER,
+    "creditor_id": USER, "debtor_id": USER,
+    "group_id": GROUP,
+    "expense_id": EXPENSE,
+    "trans_id": TRANSACTION,
+}
+
+_ID_PATTERN = re.compile(r"^[UGET][0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+
+class Id(str):
+    """
+    A prefixed id. new_id() and the decoding functions return Ids, and encode_params() converts only Ids, so whether a parameter
+    is an id follows from where the value came from, not from what it looks like. Ids typed in by a user go through as_id().
+    Otherwise an Id behaves like the str it is: it compares and hashes equal to the same text.
+    """
+    __slots__ = ()
+
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> UUID:
+    """
+    A time-ordered UUID (version 7 layout): 48 bits of Unix time in milliseconds, then a 12-bit counter and 62 random bits.
+    The counter starts at a random value every millisecond and is incremented for every id created within that millisecond,
+    so ids created by this process are strictly increasing and new rows are appended at the end of the primary key index.
+    """
+    global _last_ms, _counter
+    with _lock:
+        now = time.time_ns() // 1_000_000
+        if now > _last_ms:
+            _last_ms = now
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x7ff  # leaves room to count up within the millisecond
+        else:
+            _counter += 1
+            if _counter > 0xfff:
+                # more ids in this millisecond than the counter holds: borrow the next millisecond
+                _last_ms += 1
+                _counter = 0
+        ms, counter = _last_ms, _counter
+    random_bits = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | random_bits
+    return UUID(int = value)
+
+
+def new_id(prefix: str) -> str:
+    """
+    :param prefix: type of the object, one of USER, GROUP, EXPENSE and TRANSACTION
+    :return: a new id, e.g. new_id(EXPENSE) -> "E0190b1d6-..."
+    """
+    return Id(f"{prefix}{uuid7()}")
+
+
+def is_id(value) -> bool:
+    """
+    :return: True if value is a string in the prefixed id format
+    """
+    return isinstance(value, str) and _ID_PATTERN.match(value) is not None
+
+
+def as_id(value: str):
+    """
+    Marks text that names an id, e.g. one typed in by a user, as an Id.
+    :return: value as an Id if it is in the prefixed id format, otherwise value unchanged (and so never matching an id column)
+    """
+    stripped = value.strip() if isinstance(value, str) else value
+    return Id(stripped) if is_id(stripped) else value
+
+
+def to_binary(value: str) -> bytes:
+    """
+    :param value: a prefixed id
+    :return: the 16 bytes stored in the database
+    """
+    if not is_id(value):
+        raise ValueError(f"ERROR[ids.to_binary]: {value!r} is not an id.")
+    return UUID(value[1:]).bytes
+
+
+def from_binary(prefix: str, value: bytes) -> str:
+    """
+    :param prefix: type of the object the id belongs to
+    :param value: 16 bytes read from the database
+    :return: the prefixed id
+    """
+    return Id(f"{prefix}{UUID(bytes = bytes(value))}")
+
+
+def encode_params(params, binary: bool = True):
+    """
+    Replaces every Id in a parameter sequence with its binary form. Other values, including plain strings in the id format,
+    are passed through unchanged.
+    :param params: tuple or list of query parameters
+    :param binary: False for a database that still stores ids as text; Ids are then sent as plain strings, which every driver accepts
+    :return: tuple of parameters
+    """
+    if not binary:
+        return tuple(str(value) if isinstance(value, Id) else value for value in params)
+    return tuple(UUID(value[1:]).bytes if isinstance(value, Id) else value for value in params)
+
+
+def decode_row(row: dict) -> dict:
+    """
+    Turns the binary ids of a result row back into prefixed ids, in place. Columns are recognised by name (see ID_COLUMNS),
+    so rows that are not dictionaries are returned unchanged.
+    :param row: a result row as returned by a dictionary cursor
+    :return: row
+    """
+    if not isinstance(row, dict):
+        return row
+    for column, value in row.items():
+        if isinstance(value, (bytes, bytearray)) and len(value) == 16:
+            prefix = ID_COLUMNS.get(column)
+            if prefix:
+                row[column] = Id(f"{prefix}{UUID(bytes = bytes(value))}")
+    return row
+
+
+def decode_values(row: tuple, prefixes: List[str]) -> tuple:
+    """
+    decode_row() for rows returned as tuples.
+    :param row: a result row as returned by a plain cursor
+    :param prefixes: the ID_COLUMNS prefix of every column of the row, None for columns that are not ids
+    :return: a tuple with the binary ids turned into prefixed ids
+    """
+    return tuple(Id(f"{prefix}{UUID(bytes = bytes(value))}")
+                 if prefix and isinstance(value, (bytes, bytearray)) and len(value) == 16 else value
+                 for prefix, value in zip(prefixes, row))
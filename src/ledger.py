@@ -0,0 +1,409 @@
+from connector import *
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import List, Dict, Iterable, Tuple
+import argparse
+
+
+class Ledger:
+    """
+    Incrementally maintained balances per group, so dues are read from a handful of rows instead of aggregating the group's whole history.
+
+    An open debt is an ExpenseParticipants row that is not SETTLED and whose user is not the payer of the expense: the user owes its amount to the payer.
+    GroupDebts holds the open debts summed per (group, creditor, debtor) and GroupBalances the resulting net balance per (group, user),
+    positive when the user is owed money and negative when the user owes money.
+
+    OpenDues holds the same open debts per (debtor, expense), clustered by user so a user's outstanding items are one primary key range scan,
+    and UserDueTotals the total and number of a user's open debts across all groups, so the total is a single row.
+
+    Every write to Expenses or ExpenseParticipants runs inside track(), which reads the open debts of the touched expenses before and after
+    the write and applies the difference to all four tables in the same unit of work.
+    """
+
+    @staticmethod
+    @contextmanager
+    def track(connector: Connector, expense_ids: Iterable[str]):
+        """
+        Runs the block as one unit of work and keeps GroupDebts and GroupBalances in step with the changes it makes to the given expenses.
+        Nested calls for expenses that are already tracked only join the enclosing unit of work, so no change is counted twice.
+
+        Usage:
+            with Ledger.track(connector, [expense_id]):
+                connector.execute("UPDATE ExpenseParticipants SET ...", params)
+
+        :param connector: connector the writes are made through
+        :param expense_ids: ids of every expense whose participants, amount or payer the block may change
+        """
+        with connector.transaction():
+            # the expenses enclosing track() blocks follow, kept with this thread's unit of work
+            active = connector.unit_of_work.setdefault("ledger.tracked", set())
+            expense_ids = [expense_id for expense_id in dict.fromkeys(expense_ids) if expense_id not in active]
+            active.update(expense_ids)
+            try:
+                before = Ledger.open_shares(connector, expense_ids)
+                yield
+                after = Ledger.open_shares(connector, expense_ids)
+                Ledger.apply(connector, Ledger.difference(Ledger._by_key(after), Ledger._by_key(before)))
+                Ledger.apply_dues(connector, Ledger._by_item(before), Ledger._by_item(after))
+            finally:
+                active.difference_update(expense_ids)
+
+    @staticmethod
+    def open_debts(connector: Connector, expense_ids: List[str]) -> Dict[Tuple[str, str, str], Decimal]:
+        """
+        :param expense_ids: ids of the expenses to read
+        :return: dictionary mapping (group_id, creditor_id, debtor_id) to the amount still owed on those expenses
+        """
+        return Ledger._by_key(Ledger.open_shares(connector, expense_ids))
+
+    @staticmethod
+    def open_shares(connector: Connector, expense_ids: List[str]) -> List[dict]:
+        """
+        :param expense_ids: ids of the expenses to read
+        :return: one dictionary per open debt on those expenses, with expense_id, group_id, creditor_id, debtor_id and amount
+        """
+        if not expense_ids:
+            return []
+        placeholders = ', '.join(['%s'] * len(expense_ids))
+        query = f"""
+        SELECT e.expense_id, e.group_id, e.paid_by AS creditor_id, ep.user_id AS debtor_id, ep.amount
+        FROM Expenses e
+        JOIN ExpenseParticipants ep ON ep.expense_id = e.expense_id
+        WHERE e.expense_id IN ({placeholders}) AND ep.settled != 'SETTLED' AND ep.user_id != e.paid_by
+        """
+        return connector.execute(query, tuple(expense_ids)) or []
+
+    @staticmethod
+    def difference(after: Dict[tuple, Decimal], before: Dict[tuple, Decimal]) -> Dict[tuple, Decimal]:
+        """
+        :return: after - before per key, leaving out keys that did not change
+        """
+        delta = {}
+        for key in after.keys() | before.keys():
+            change = after.get(key, Decimal(0)) - before.get(key, Decimal(0))
+            if change:
+                delta[key] = change
+        return delta
+
+    @staticmethod
+    def apply(connector: Connector, delta: Dict[Tuple[str, str, str], Decimal]):
+        """
+        Adds a change in open debts to GroupDebts and the net balances it implies to GroupBalances.
+        :param delta: dictionary mapping (group_id, creditor_id, debtor_id) to the change in the amount owed
+        """
+        if not delta:
+            return
+        balances = {}
+        for (group_id, creditor_id, debtor_id), change in delta.items():
+            balances[(group_id, creditor_id)] = balances.get((group_id, creditor_id), Decimal(0)) + change
+            balances[(group_id, debtor_id)] = balances.get((group_id, debtor_id), Decimal(0)) - change
+
+        upsert_debts_query = ("INSERT INTO GroupDebts (group_id, creditor_id, debtor_id, amount) VALUES (%s, %s, %s, %s) "
+                              "ON DUPLICATE KEY UPDATE amount = amount + VALUES(amount)")
+        upsert_balances_query = ("INSERT INTO GroupBalances (group_id, user_id, net_balance) VALUES (%s, %s, %s) "
+                                 "ON DUPLICATE KEY UPDATE net_balance = net_balance + VALUES(net_balance)")
+        with connector.transaction():
+            connector.execute_many(upsert_debts_query, [key + (change,) for key, change in sorted(delta.items())])
+            connector.execute_many(upsert_balances_query,
+                                   [key + (change,) for key, change in sorted(balances.items()) if change])
+
+    @staticmethod
+    def apply_dues(connector: Connector, before: Dict[Tuple[str, str], tuple], after: Dict[Tuple[str, str], tuple]):
+        """
+        Brings OpenDues and UserDueTotals from the before state of some expenses to their after state.
+        :param before: dictionary mapping (debtor_id, expense_id) to (group_id, amount) before the change, as returned by _by_item
+        :param after: the same after the change
+        """
+        removed = [key for key in before if key not in after]
+        changed = {key: item for key, item in after.items() if before.get(key) != item}
+        if not removed and not changed:
+            return
+        # Replaced and removed items leave their user's total, new and changed items join it
+        totals = {}
+        for key in removed + [key for key in changed if key in before]:
+            total, items = totals.get(key[0], (Decimal(0), 0))
+            totals[key[0]] = (total - before[key][1], items - 1)
+        for key, (group_id, amount) in changed.items():
+            total, items = totals.get(key[0], (Decimal(0), 0))
+            totals[key[0]] = (total + amount, items + 1)
+
+        upsert_dues_query = ("INSERT INTO OpenDues (user_id, expense_id, group_id, amount) VALUES (%s, %s, %s, %s) "
+                             "ON DUPLICATE KEY UPDATE group_id = VALUES(group_id), amount = VALUES(amount)")
+        upsert_totals_query = ("INSERT INTO UserDueTotals (user_id, total_owed, open_items) VALUES (%s, %s, %s) "
+                               "ON DUPLICATE KEY UPDATE total_owed = total_owed + VALUES(total_owed), open_items = open_items + VALUES(open_items)")
+        with connector.transaction():
+            if removed:
+                connector.execute_many("DELETE FROM OpenDues WHERE user_id = %s AND expense_id = %s", sorted(removed))
+            if changed:
+                connector.execute_many(upsert_dues_query, [key + item for key, item in sorted(changed.items())])
+            connector.execute_many(upsert_totals_query, [(user_id,) + change for user_id, change in sorted(totals.items())
+                                                         if change != (Decimal(0), 0)])
+
+    @staticmethod
+    def get_open_dues(user_id: str, connector: Connector, materialized: bool = True) -> List[dict]:
+        """
+        Reads a user's outstanding items: every expense on which the user still owes its payer money.
+        :param materialized: read OpenDues, a range scan of its primary key. With False the items are aggregated from
+                             ExpenseParticipants instead, which the (user_id, settled) index serves
+        :return: one dictionary per item with expense_id, description, amount, owed_amount and group_name
+        """
+        if materialized:
+            query = """
+            SELECT e.expense_id, e.description, e.amount, d.amount AS owed_amount, g.name AS group_name
+            FROM OpenDues d
+            JOIN Expenses e ON e.expense_id = d.expense_id
+            JOIN GroupDetails g ON g.group_id = d.group_id
+            WHERE d.user_id = %s
+            """
+        else:
+            query = """
+            SELECT e.expense_id, e.description, e.amount, ep.amount AS owed_amount, g.name AS group_name
+            FROM ExpenseParticipants ep
+            JOIN Expenses e ON e.expense_id = ep.expense_id
+            JOIN GroupDetails g ON g.group_id = e.group_id
+            WHERE ep.user_id = %s AND ep.settled != 'SETTLED' AND ep.user_id != e.paid_by AND ep.amount != 0
+            """
+        return connector.execute(query, (user_id,)) or []
+
+    @staticmethod
+    def get_due_total(user_id: str, connector: Connector) -> Tuple[Decimal, int]:
+        """
+        :return: (total the user owes across all groups, number of outstanding items), read from a single UserDueTotals row
+        """
+        row = connector.execute("SELECT total_owed, open_items FROM UserDueTotals WHERE user_id = %s", (user_id,), fetchall = False)
+        return (row['total_owed'], row['open_items']) if row else (Decimal(0), 0)
+
+    @staticmethod
+    def get_balances(group_id: str, connector: Connector) -> Dict[str, Decimal]:
+        """
+        :return: dictionary mapping the user_id of every member with a non-zero balance in the group to their net balance
+        """
+        query = "SELECT user_id, net_balance FROM GroupBalances WHERE group_id = %s AND net_balance != 0"
+        rows = connector.execute(query, (group_id,)) or []
+        return {row['user_id']: row['net_balance'] for row in rows}
+
+    @staticmethod
+    def get_user_balances(user_id: str, connector: Connector) -> List[dict]:
+        """
+        :return: one dictionary per group the user has a non-zero balance in, with group_id, group_name and net_balance
+        """
+        query = """
+        SELECT b.group_id, g.name AS group_name, b.net_balance
+        FROM GroupBalances b
+        JOIN GroupDetails g ON g.group_id = b.group_id
+        WHERE b.user_id = %s AND b.net_balance != 0
+        """
+        return connector.execute(query, (user_id,)) or []
+
+    @staticmethod
+    def get_dues_owed_to(group_id: str, creditor_id: str, connector: Connector) -> List[dict]:
+        """
+        Reads what every member of the group still owes creditor_id, the same figures as summing their open ExpenseParticipants rows.
+        :return: one dictionary per debtor with name, user_id and total_owed
+        """
+        query = """
+        SELECT u.name, u.user_id, d.amount AS total_owed
+        FROM GroupDebts d
+        JOIN Users u ON u.user_id = d.debtor_id
+        WHERE d.group_id = %s AND d.creditor_id = %s AND d.amount != 0
+        """
+        return connector.execute(query, (group_id, creditor_id)) or []
+
+    @staticmethod
+    def compute(connector: Connector, group_id: str = None) -> Dict[Tuple[str, str, str], Decimal]:
+        """
+        Recomputes the open debts from the raw Expenses and ExpenseParticipants rows.
+        :param group_id: only this group if given, otherwise every group
+        :return: dictionary mapping (group_id, creditor_id, debtor_id) to the amount owed
+        """
+        query = """
+        SELECT e.group_id, e.paid_by AS creditor_id, ep.user_id AS debtor_id, ROUND(SUM(ep.amount), 2) AS amount
+        FROM Expenses e
+        JOIN ExpenseParticipants ep ON ep.expense_id = e.expense_id
+        WHERE ep.settled != 'SETTLED' AND ep.user_id != e.paid_by
+        """
+        params = None
+        if group_id:
+            query += " AND e.group_id = %s"
+            params = (group_id,)
+        query += " GROUP BY e.group_id, e.paid_by, ep.user_id"
+        return Ledger._by_key(connector.execute(query, params) or [])
+
+    @staticmethod
+    def verify(connector: Connector, group_id: str = None) -> List[dict]:
+        """
+        Compares GroupDebts and GroupBalances with the debts recomputed from the raw rows.
+        :param group_id: only this group if given, otherwise every group
+        :return: one dictionary per drifting entry with table, key, expected and actual. An empty list means the ledger is consistent
+        """
+        expected_debts = Ledger.compute(connector, group_id)
+        expected_balances = Ledger._net_balances(expected_debts)
+
+        debts_query = "SELECT group_id, creditor_id, debtor_id, amount FROM GroupDebts"
+        balances_query = "SELECT group_id, user_id, net_balance AS amount FROM GroupBalances"
+        params = None
+        if group_id:
+            debts_query += " WHERE group_id = %s"
+            balances_query += " WHERE group_id = %s"
+            params = (group_id,)
+        actual_debts = Ledger._by_key(connector.execute(debts_query, params) or [])
+        actual_balances = {(row['group_id'], row['user_id']): Decimal(str(row['amount']))
+                           for row in connector.execute(balances_query, params) or []}
+
+        drift = []
+        for table, expected, actual in (("GroupDebts", expected_debts, actual_debts),
+                                        ("GroupBalances", expected_balances, actual_balances)):
+            for key in sorted(expected.keys() | actual.keys()):
+                if expected.get(key, Decimal(0)) != actual.get(key, Decimal(0)):
+                    drift.append({"table": table, "key": key, "expected": expected.get(key, Decimal(0)),
+                                  "actual": actual.get(key, Decimal(0))})
+        return drift
+
+    @staticmethod
+    def delete_expenses(connector: Connector, expense_ids: Iterable[str], chunk_size: int = 500):
+        """
+        Deletes expenses together with their participants and the payments made against them, like delete_expense() does for one expense.
+        Each chunk of chunk_size expenses is deleted inside track(), so the ledger and the dues summary follow the deleted rows.
+        The GroupDebts and GroupBalances entries of the expenses drop to zero but are kept, as after any other write.
+        :param expense_ids: ids of the expenses to delete
+        :param chunk_size: expenses deleted per unit of work
+        """
+        expense_ids = list(dict.fromkeys(expense_ids))
+        for start in range(0, len(expense_ids), chunk_size):
+            chunk = tuple(expense_ids[start:start + chunk_size])
+            placeholders = ', '.join(['%s'] * len(chunk))
+            with Ledger.track(connector, chunk):
+                for table in ("Transactions", "ExpenseParticipants", "Expenses"):
+                    connector.execute(f"DELETE FROM {table} WHERE expense_id IN ({placeholders})", chunk)
+
+    @staticmethod
+    def rebuild(connector: Connector, group_id: str = None):
+        """
+        Replaces the ledger rows with balances recomputed from the raw rows, in one unit of work.
+        :param group_id: only this group if given, otherwise every group
+        """
+        debts = Ledger.compute(connector, group_id)
+        balances = Ledger._net_balances(debts)
+        where, params = (" WHERE group_id = %s", (group_id,)) if group_id else ("", None)
+        with connector.transaction():
+            connector.execute("DELETE FROM GroupDebts" + where, params)
+            connector.execute("DELETE FROM GroupBalances" + where, params)
+            connector.execute_many("INSERT INTO GroupDebts (group_id, creditor_id, debtor_id, amount) VALUES (%s, %s, %s, %s)",
+                                   [key + (amount,) for key, amount in sorted(debts.items()) if amount])
+            connector.execute_many("INSERT INTO GroupBalances (group_id, user_id, net_balance) VALUES (%s, %s, %s)",
+                                   [key + (amount,) for key, amount in sorted(balances.items()) if amount])
+
+    @staticmethod
+    def compute_dues(connector: Connector, group_id: str = None) -> Dict[Tuple[str, str], tuple]:
+        """
+        Recomputes the open debts per (debtor, expense) from the raw Expenses and ExpenseParticipants rows.
+        :param group_id: only this group if given, otherwise every group
+        :return: dictionary mapping (debtor_id, expense_id) to (group_id, amount)
+        """
+        query = """
+        SELECT e.expense_id, e.group_id, e.paid_by AS creditor_id, ep.user_id AS debtor_id, ep.amount
+        FROM Expenses e
+        JOIN ExpenseParticipants ep ON ep.expense_id = e.expense_id
+        WHERE ep.settled != 'SETTLED' AND ep.user_id != e.paid_by
+        """
+        params = None
+        if group_id:
+            query += " AND e.group_id = %s"
+            params = (group_id,)
+        return Ledger._by_item(connector.execute(query, params) or [])
+
+    @staticmethod
+    def verify_dues(connector: Connector, group_id: str = None) -> List[dict]:
+        """
+        Compares OpenDues, and UserDueTotals when no group is given, with the open debts recomputed from the raw rows.
+        :param group_id: only this group if given, otherwise every group
+        :return: one dictionary per drifting entry with table, key, expected and actual. An empty list means the summary is consistent
+        """
+        expected_items = Ledger.compute_dues(connector, group_id)
+        dues_query = "SELECT user_id AS debtor_id, expense_id, group_id, amount FROM OpenDues"
+        params = None
+        if group_id:
+            dues_query += " WHERE group_id = %s"
+            params = (group_id,)
+        actual_items = Ledger._by_item(connector.execute(dues_query, params) or [])
+        comparisons = [("OpenDues", expected_items, actual_items)]
+
+        if not group_id:
+            expected_totals = {}
+            for (user_id, expense_id), (item_group_id, amount) in expected_items.items():
+                total, items = expected_totals.get(user_id, (Decimal(0), 0))
+                expected_totals[user_id] = (total + amount, items + 1)
+            actual_totals = {row['user_id']: (Decimal(str(row['total_owed'])), row['open_items'])
+                             for row in connector.execute("SELECT user_id, total_owed, open_items FROM UserDueTotals") or []
+                             if row['total_owed'] or row['open_items']}
+            comparisons.append(("UserDueTotals", expected_totals, actual_totals))
+
+        drift = []
+        for table, expected, actual in comparisons:
+            for key in sorted(expected.keys() | actual.keys()):
+                if expected.get(key) != actual.get(key):
+                    drift.append({"table": table, "key": key, "expected": expected.get(key), "actual": actual.get(key)})
+        return drift
+
+    @staticmethod
+    def rebuild_dues(connector: Connector, group_id: str = None):
+        """
+        Replaces the OpenDues rows with the open debts recomputed from the raw rows and recomputes UserDueTotals from them, in one unit of work.
+        :param group_id: only rebuild the OpenDues rows of this group if given, otherwise every group
+        """
+        items = Ledger.compute_dues(connector, group_id)
+        where, params = (" WHERE group_id = %s", (group_id,)) if group_id else ("", None)
+        with connector.transaction():
+            connector.execute("DELETE FROM OpenDues" + where, params)
+            connector.execute_many("INSERT INTO OpenDues (user_id, expense_id, group_id, amount) VALUES (%s, %s, %s, %s)",
+                                   [key + item for key, item in sorted(items.items())])
+            connector.execute("DELETE FROM UserDueTotals")
+            connector.execute("""
+            INSERT INTO UserDueTotals (user_id, total_owed, open_items)
+            SELECT user_id, SUM(amount), COUNT(*) FROM OpenDues GROUP BY user_id
+            """)
+
+    @staticmethod
+    def _by_key(rows: List[dict]) -> Dict[Tuple[str, str, str], Decimal]:
+        debts = {}
+        for row in rows:
+            key = (row['group_id'], row['creditor_id'], row['debtor_id'])
+            debts[key] = debts.get(key, Decimal(0)) + Decimal(str(row['amount']))
+        return debts
+
+    @staticmethod
+    def _by_item(rows: List[dict]) -> Dict[Tuple[str, str], tuple]:
+        """
+        :return: dictionary mapping (debtor_id, expense_id) to (group_id, amount) for every open debt with a non-zero amount
+        """
+        return {(row['debtor_id'], row['expense_id']): (row['group_id'], Decimal(str(row['amount'])))
+                for row in rows if row['amount']}
+
+    @staticmethod
+    def _net_balances(debts: Dict[Tuple[str, str, str], Decimal]) -> Dict[Tuple[str, str], Decimal]:
+        balances = {}
+        for (group_id, creditor_id, debtor_id), amount in debts.items():
+            balances[(group_id, creditor_id)] = balances.get((group_id, creditor_id), Decimal(0)) + amount
+            balances[(group_id, debtor_id)] = balances.get((group_id, debtor_id), Decimal(0)) - amount
+        return balances
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Verifies the GroupDebts/GroupBalances ledger and the OpenDues/UserDueTotals summary "
+                                                   "against the raw expense rows, "
+                                                   "and optionally rebuilds them.")
+    parser.add_argument("--config", required = True, help = "path to the JSON file with the database credentials")
+    parser.add_argument("--group", help = "only check this group_id")
+    parser.add_argument("--rebuild", action = "store_true", help = "recompute the ledger from the raw rows after reporting drift")
+    args = parser.parse_args()
+
+    connector = Connector(filepath = args.config)
+    drift = Ledger.verify(connector, args.group) + Ledger.verify_dues(connector, args.group)
+    for entry in drift:
+        print(f"{entry['table']} {entry['key']}: expected {entry['expected']}, found {entry['actual']}")
+    print(f"{len(drift)} drifting entries")
+    if args.rebuild:
+        Ledger.rebuild(connector, args.group)
+        Ledger.rebuild_dues(connector, args.group)
+        print("Ledger rebuilt")
+    connector.close()
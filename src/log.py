@@ -0,0 +1,87 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+# Every logger of the application is a child of this one, e.g. "bill_sharing_app.connector"
+ROOT_LOGGER = "bill_sharing_app"
+
+# Attributes every LogRecord has; anything else on a record was passed through extra= and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", logging.INFO, "", 0, "", (), None))) | {"message", "asctime"}
+
+# Nothing is written until configure_logging() is called, and disabled levels cost one isEnabledFor() check
+logging.getLogger(ROOT_LOGGER).addHandler(logging.NullHandler())
+
+_listener = None
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    """
+    :param subsystem: part of the application the messages come from, e.g. "connector" or "group"
+    :return: the logger of the subsystem. Pass values as arguments (log.debug("Loaded %s", user_id)) so
+             the message is only formatted when the level is enabled.
+    """
+    return logging.getLogger(f"{ROOT_LOGGER}.{subsystem}")
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object with time, level, logger and message, plus every field passed with extra=.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default = str)
+
+
+def configure_logging(level = "WARNING", stream = None, structured: bool = False, background: bool = False,
+                      levels: dict = None) -> logging.Handler:
+    """
+    Sends the application's log records to a stream, replacing the handlers of an earlier call.
+
+    :param level: lowest level written, as a name ("DEBUG", "INFO", ...) or a number. Defaults to WARNING.
+    :param stream: where records are written. Defaults to sys.stderr.
+    :param structured: write JSON lines (see StructuredFormatter) instead of plain text
+    :param background: hand records to a queue that a background thread writes out, so the code logging never waits on I/O.
+                       The queue is drained when the interpreter exits or configure_logging() is called again.
+    :param levels: optional levels of single subsystems, e.g. {"connector": "DEBUG"}
+    :return: the handler attached to the application's root logger
+    """
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    for handler in list(root.handlers):
+        if not isinstance(handler, logging.NullHandler):
+            root.removeHandler(handler)
+            handler.close()
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(StructuredFormatter() if structured else
+                         logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    if background:
+        _listener = logging.handlers.QueueListener(queue.SimpleQueue(), handler, respect_handler_level = True)
+        handler = logging.handlers.QueueHandler(_listener.queue)
+        _listener.start()
+    root.addHandler(handler)
+    root.setLevel(level if isinstance(level, int) else level.upper())
+    for subsystem, subsystem_level in (levels or {}).items():
+        get_logger(subsystem).setLevel(subsystem_level if isinstance(subsystem_level, int) else subsystem_level.upper())
+    return handler
+
+
+@atexit.register
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
@@ -4,8 +4,11 @@ from user import User
 from group import Group
 from expense import Expense
 from transaction import Transaction
+from ledger import Ledger
 from connector import Connector
+from log import configure_logging
 from datetime import datetime
+from ids import as_id
 
 class BillSharingApp:
     def __init__(self):
@@ -24,7 +27,9 @@ class BillSharingApp:
         #Write /src/db.json in the info/exclude section of .gitignore folder
         with open('src/db.json', 'r') as f:
             db_params = json.load(f)            
-    
+
+        # Optional "logging" section of db.json, e.g. {"level": "DEBUG", "background": true}; see log.configure_logging
+        configure_logging(**db_params.pop("logging", {}))
         self.connector = Connector(**db_params)
         self.current_user = None
 
@@ -80,7 +85,8 @@ class BillSharingApp:
         print("5. Manage transactions")
         print("6. View my dues")
         print("7. View group dues")  
-        print("8. Logout")
+        print("8. Simplify group debts")
+        print("9. Logout")
         choice = input("Enter your choice: ")
 
         if choice == '1':
@@ -98,6 +104,8 @@ class BillSharingApp:
         elif choice == '7':
             self.view_group_dues()  # Call to the new function
         elif choice == '8':
+            self.simplify_group_debts()
+        elif choice == '9':
             self.current_user = None
             print("Logged out successfully.")
         else:
@@ -123,12 +131,11 @@ class BillSharingApp:
             return
 
         print("Your groups:")
-        for group_id in group_ids:
-            group = Group.get_group(group_id, self.connector)
+        for group in Group.get_groups(group_ids, self.connector):
             print(f"ID: {group.group_id}, Group Name: {group.name}, Admin: {group.admin.name} Description: {group.description}")
 
     def manage_group(self):
-        group_id=input("entr the id of thr group you want to manage: ")
+        group_id=as_id(input("entr the id of thr group you want to manage: "))
 
         try:
             group = Group.get_group(group_id, self.connector)
@@ -261,7 +268,7 @@ class BillSharingApp:
 
 
     def add_expense(self):
-        group_id = input("Enter the group ID for this expense: ")
+        group_id = as_id(input("Enter the group ID for this expense: "))
         try:
             group = Group.get_group(group_id, self.connector)
             amount = float(input("Enter the total expense amount: "))
@@ -287,8 +294,9 @@ class BillSharingApp:
                     print("Choose split method:")
                     print("1. Equal")
                     print("2. Unequal")
-                    #print("3. Percentages")
-                    split_method = input("Enter your choice (1/2): ")
+                    print("3. Percentages")
+                    print("4. Shares")
+                    split_method = input("Enter your choice (1/2/3/4): ")
                     
                     participants = list(expense.participants.keys())
                     
@@ -317,29 +325,40 @@ class BillSharingApp:
                         percentages = []
                         for participant in participants:
                             if participant.user_id == self.current_user.user_id:
-                                amount = float(input(f"Enter your share percentage: "))
-                                amounts.append(amount)
+                                percentage = float(input(f"Enter your share percentage: "))
+                                percentages.append(percentage)
                             else:
-                                amount = float(input(f"Enter share percentage for {participant.name} (Enter 0 if you want to exclude): "))
-                                amounts.append(amount)
+                                percentage = float(input(f"Enter share percentage for {participant.name} (Enter 0 if you want to exclude): "))
+                                percentages.append(percentage)
                         expense.calculate_and_split_expense('percentages', participants, percentages=percentages)
+                    elif split_method == '4':
+                        shares = []
+                        for participant in participants:
+                            if participant.user_id == self.current_user.user_id:
+                                share = float(input(f"Enter your number of shares: "))
+                                shares.append(share)
+                            else:
+                                share = float(input(f"Enter number of shares for {participant.name} (Enter 0 if you want to exclude): "))
+                                shares.append(share)
+                        expense.calculate_and_split_expense('shares', participants, shares=shares)
                     else:
                         print("Invalid choice. Split cancelled.")
                         return
 
-                    # Mark the payer as settled in the ExpenseParticipants table
-                    new_amount = 0.00
-                    update_query = "UPDATE ExpenseParticipants SET settled = 'SETTLED' WHERE expense_id = %s AND user_id = %s"
-                    self.connector.execute(update_query, (expense.expense_id, expense.payer.user_id))
-                    update_query = "UPDATE ExpenseParticipants SET amount = %s WHERE expense_id = %s AND user_id = %s"
-                    self.connector.execute(update_query, (new_amount,expense.expense_id, expense.payer.user_id))
-                    
-
-                    #marking the person not included(0 share) in expense as settled
-                    for member in expense.participants:
-                        if expense.participants[member] == 0.0 :
-                            update_query = "UPDATE ExpenseParticipants SET settled = 'SETTLED' WHERE expense_id = %s AND user_id = %s"
-                            self.connector.execute(update_query, (expense.expense_id, member.user_id))
+                    with Ledger.track(self.connector, [expense.expense_id]):
+                        # Mark the payer as settled in the ExpenseParticipants table
+                        new_amount = 0.00
+                        update_query = "UPDATE ExpenseParticipants SET settled = 'SETTLED' WHERE expense_id = %s AND user_id = %s"
+                        self.connector.execute(update_query, (expense.expense_id, expense.payer.user_id))
+                        update_query = "UPDATE ExpenseParticipants SET amount = %s WHERE expense_id = %s AND user_id = %s"
+                        self.connector.execute(update_query, (new_amount,expense.expense_id, expense.payer.user_id))
+                        
+
+                        #marking the person not included(0 share) in expense as settled
+                        for member in expense.participants:
+                            if expense.participants[member] == 0 :
+                                update_query = "UPDATE ExpenseParticipants SET settled = 'SETTLED' WHERE expense_id = %s AND user_id = %s"
+                                self.connector.execute(update_query, (expense.expense_id, member.user_id))
                     print(expense.participants)
 
 
@@ -367,7 +386,7 @@ class BillSharingApp:
 
 
     def edit_expense(self):
-        expense_id = input("Enter the ID of the expense you want to edit: ")
+        expense_id = as_id(input("Enter the ID of the expense you want to edit: "))
         try:
             expense = Expense.get_expense(expense_id, self.connector)
             if self.current_user.user_id == expense.payer.user_id:
@@ -395,25 +414,26 @@ class BillSharingApp:
                 print("\nSplit:")
                 for participant, amount in expense.participants.items():
                     print(f"{participant.name}: {amount:.2f}")
-                # Mark the payer as settled in the ExpenseParticipants table
-                new_amount = 0.00
-                update_query = "UPDATE ExpenseParticipants SET settled = 'SETTLED' WHERE expense_id = %s AND user_id = %s"
-                self.connector.execute(update_query, (expense.expense_id, expense.payer.user_id))
-                update_query = "UPDATE ExpenseParticipants SET amount = %s WHERE expense_id = %s AND user_id = %s"
-                self.connector.execute(update_query, (new_amount,expense.expense_id, expense.payer.user_id))
-
-                #marking the person not included(0 share) in expense as settled
-                for member in expense.participants:
-                    if expense.participants[member] == 0.0 :
-                        update_query = "UPDATE ExpenseParticipants SET settled = 'SETTLED' WHERE expense_id = %s AND user_id = %s"
-                        self.connector.execute(update_query, (expense.expense_id, member.user_id))
+                with Ledger.track(self.connector, [expense.expense_id]):
+                    # Mark the payer as settled in the ExpenseParticipants table
+                    new_amount = 0.00
+                    update_query = "UPDATE ExpenseParticipants SET settled = 'SETTLED' WHERE expense_id = %s AND user_id = %s"
+                    self.connector.execute(update_query, (expense.expense_id, expense.payer.user_id))
+                    update_query = "UPDATE ExpenseParticipants SET amount = %s WHERE expense_id = %s AND user_id = %s"
+                    self.connector.execute(update_query, (new_amount,expense.expense_id, expense.payer.user_id))
+
+                    #marking the person not included(0 share) in expense as settled
+                    for member in expense.participants:
+                        if expense.participants[member] == 0 :
+                            update_query = "UPDATE ExpenseParticipants SET settled = 'SETTLED' WHERE expense_id = %s AND user_id = %s"
+                            self.connector.execute(update_query, (expense.expense_id, member.user_id))
             else:
                 print(" Can't edit expense You are not the payer")
         except ValueError as e:
             print(f"Failed to edit expense: {e}")
 
     def delete_expense(self):
-        expense_id = input("Enter the ID of the expense you want to delete: ")
+        expense_id = as_id(input("Enter the ID of the expense you want to delete: "))
         try:
             expense = Expense.get_expense(expense_id, self.connector)
             if self.current_user.user_id == expense.payer.user_id:
@@ -430,10 +450,10 @@ class BillSharingApp:
         
         try:
             
-            group_id = input("Enter the group ID to view expenses: ")
+            group_id = as_id(input("Enter the group ID to view expenses: "))
             
             if group_id:
-                expenses = Expense.get_group_expenses(group_id, self.connector)
+                expenses = Expense.get_group_expense_summaries(group_id, self.connector)
                 """ else:
                     user_groups = self.current_user.get_groups()
                     expenses = []
@@ -447,16 +467,10 @@ class BillSharingApp:
                 print("No expenses found.")
             else:
                 for expense in expenses:
-                    check_settled_query = "SELECT COUNT(*) as count FROM ExpenseParticipants WHERE expense_id = %s AND settled != 'SETTLED'"
-                    result = self.connector.execute(check_settled_query, (expense.expense_id,), fetchall=False)
-                    if result['count'] == 0:
-                            print(f"ID: {expense.expense_id}, Amount: {expense.amount:.2f}, "
-                                f"Payer: {expense.payer.name}, Description: {expense.description}, "
-                                f"Tag: {expense.tag}, Group: {expense.group.name}, Status: settled.")
-                    else:
-                        print(f"ID: {expense.expense_id}, Amount: {expense.amount:.2f}, "
-                                f"Payer: {expense.payer.name}, Description: {expense.description}, "
-                                f"Tag: {expense.tag}, Group: {expense.group.name}, Status: Not settled.")
+                    status = "settled" if expense['open_shares'] == 0 else "Not settled"
+                    print(f"ID: {expense['expense_id']}, Amount: {expense['amount']:.2f}, "
+                          f"Payer: {expense['payer_name']}, Description: {expense['description']}, "
+                          f"Tag: {expense['tag']}, Group: {expense['group_name']}, Status: {status}.")
 
 
                 
@@ -471,7 +485,8 @@ class BillSharingApp:
             print("2. View transactions for an expense")
             print("3. View your transactions")
             print("4. Delete a transaction")
-            print("5. Back to main menu")
+            print("5. Settle up with a group member")
+            print("6. Back to main menu")
             choice = input("Enter your choice: ")
 
             if choice == '1':
@@ -483,12 +498,14 @@ class BillSharingApp:
             elif choice == '4':
                 self.delete_transaction()
             elif choice == '5':
+                self.settle_up()
+            elif choice == '6':
                 break
             else:
                 print("Invalid choice. Please try again.")
 
     def create_transaction(self):
-        expense_id = input("Enter the expense ID for this transaction: ")
+        expense_id = as_id(input("Enter the expense ID for this transaction: "))
         try:
             expense = Expense.get_expense(expense_id, self.connector)
             
@@ -521,14 +538,14 @@ class BillSharingApp:
                     print("You cannot pay more than you owe.")
                     return
 
-                transaction = Transaction(expense=expense, payer=self.current_user, payee=expense.payer, amount=amount, connector=self.connector)
-                print(f"Transaction created successfully with ID: {transaction.trans_id}")
-
-                # Update the ExpenseParticipants table
+                # The payment and the reduced amount owed are recorded together or not at all
                 new_amount_owed = amount_owed - amount
                 new_status = 'SETTLED' if new_amount_owed == 0 else 'PARTIAL'
                 update_query = "UPDATE ExpenseParticipants SET amount = %s, settled = %s WHERE expense_id = %s AND user_id = %s"
-                self.connector.execute(update_query, (new_amount_owed, new_status, expense_id, self.current_user.user_id))
+                with Ledger.track(self.connector, [expense_id]):
+                    transaction = Transaction(expense=expense, payer=self.current_user, payee=expense.payer, amount=amount, connector=self.connector)
+                    self.connector.execute(update_query, (new_amount_owed, new_status, expense_id, self.current_user.user_id))
+                print(f"Transaction created successfully with ID: {transaction.trans_id}")
 
                 # Check if the expense is fully settled
                 check_settled_query = "SELECT COUNT(*) as count FROM ExpenseParticipants WHERE expense_id = %s AND settled != 'SETTLED'"
@@ -540,8 +557,28 @@ class BillSharingApp:
         except ValueError as e:
             print(f"Failed to create transaction: {e}")
     
+    def settle_up(self):
+        group_id = as_id(input("Enter the group ID to settle up in: "))
+        try:
+            group = Group.get_group(group_id, self.connector)
+            email = input("Enter the email of the member you are paying: ")
+            payee = User.get_user_by_email(email, self.connector)
+            member_ids = {member.user_id for member in [group.admin] + group.members}
+            if self.current_user.user_id not in member_ids or payee.user_id not in member_ids:
+                print("You and the member you are paying must both be in the group.")
+                return
+
+            amount = float(input(f"Enter the amount you are paying {payee.name}: "))
+            method = 'proportional' if input("Spread the payment over all expenses proportionally instead of oldest first? (y/n): ").lower() == 'y' else 'fifo'
+            allocation = Transaction.settle_up(self.current_user, payee, amount, group, method)
+            print(f"Paid {payee.name} {amount:.2f} across {len(allocation)} expense(s):")
+            for expense_id, paid in allocation.items():
+                print(f"{expense_id}: {paid:.2f}")
+        except ValueError as e:
+            print(f"Failed to settle up: {e}")
+
     def view_transactions_for_expense(self):
-        expense_id = input("Enter the expense ID to view its transactions: ")
+        expense_id = as_id(input("Enter the expense ID to view its transactions: "))
         try:
             expense = Expense.get_expense(expense_id, self.connector)
             if self.current_user.user_id == expense.payer.user_id:
@@ -574,26 +611,21 @@ class BillSharingApp:
             print(f"Failed to retrieve transactions: {e}")
 
     def delete_transaction(self):
-        trans_id = input("Enter the ID of the transaction you want to delete: ")
+        trans_id = as_id(input("Enter the ID of the transaction you want to delete: "))
         try:
             transaction = Transaction.get_transaction(trans_id, self.connector)
-            transaction.delete()
             update_query = "UPDATE ExpenseParticipants SET amount = %s, settled = %s WHERE expense_id = %s AND user_id = %s"
-            self.connector.execute(update_query, (transaction._amount, 'NO',transaction._expense.expense_id , self.current_user.user_id))
+            with Ledger.track(self.connector, [transaction.expense.expense_id]):
+                transaction.delete()
+                self.connector.execute(update_query, (transaction._amount, 'NO',transaction._expense.expense_id , self.current_user.user_id))
             print("Transaction deleted successfully.")
         except ValueError as e:
             print(f"Failed to delete transaction: {e}")
 
     def view_dues(self):
         print("\nYour current dues:")
-        query = """
-        SELECT e.expense_id, e.description, e.amount, ep.amount as owed_amount, g.name as group_name
-        FROM Expenses e
-        JOIN ExpenseParticipants ep ON e.expense_id = ep.expense_id
-        JOIN GroupDetails g ON e.group_id = g.group_id
-        WHERE ep.user_id = %s AND ep.settled != 'SETTLED'
-        """
-        dues = self.connector.execute(query, (self.current_user.user_id,))
+        # Read from the OpenDues/UserDueTotals summary instead of filtering ExpenseParticipants on settled
+        dues = Ledger.get_open_dues(self.current_user.user_id, self.connector)
         
         if not dues:
             print("You don't have any outstanding dues.")
@@ -605,9 +637,17 @@ class BillSharingApp:
                 print(f"You Owe: {due['owed_amount']:.2f}")
                 print(f"Group: {due['group_name']}")
                 print("---")
+            total_owed, open_items = Ledger.get_due_total(self.current_user.user_id, self.connector)
+            print(f"Total you owe: {total_owed:.2f} across {open_items} expense(s)")
+
+        balances = Ledger.get_user_balances(self.current_user.user_id, self.connector)
+        if balances:
+            print("\nNet balance per group (positive: you are owed, negative: you owe):")
+            for balance in balances:
+                print(f"{balance['group_name']}: {balance['net_balance']:.2f}")
 
     def view_group_dues(self):
-        group_id = input("Enter the group ID to view dues: ")
+        group_id = as_id(input("Enter the group ID to view dues: "))
         try:
             group = Group.get_group(group_id, self.connector)
             
@@ -621,15 +661,8 @@ class BillSharingApp:
                 return
             
 
-            query = """
-            SELECT u.name, u.user_id, SUM(ep.amount) as total_owed
-            FROM Expenses e
-            JOIN ExpenseParticipants ep ON e.expense_id = ep.expense_id
-            JOIN Users u ON ep.user_id = u.user_id
-            WHERE e.group_id = %s AND e.paid_by = %s AND ep.settled != 'SETTLED' AND ep.user_id != %s
-            GROUP BY u.user_id
-            """
-            dues = self.connector.execute(query, (group_id, self.current_user.user_id, self.current_user.user_id))
+            # Read from the GroupDebts ledger instead of aggregating the group's expense history
+            dues = Ledger.get_dues_owed_to(group_id, self.current_user.user_id, self.connector)
 
             if not dues:
                 print(f"No one owes you money in the group '{group.name}'.")
@@ -644,7 +677,27 @@ class BillSharingApp:
 
         except ValueError as e:
             print(f"Failed to retrieve group dues: {e}")
-        
+
+    def simplify_group_debts(self):
+        group_id = as_id(input("Enter the group ID to simplify debts for: "))
+        try:
+            group = Group.get_group(group_id, self.connector)
+            if all(member.user_id != self.current_user.user_id for member in [group.admin] + group.members):
+                print("You are not a member of this group.")
+                return
+
+            transfers = group.simplify_debts()
+            if not transfers:
+                print(f"Everyone in the group '{group.name}' is settled up.")
+                return
+            print(f"\nThe group '{group.name}' can settle up with {len(transfers)} payment(s):")
+            for debtor, creditor, amount in transfers:
+                payer = "You" if debtor.user_id == self.current_user.user_id else debtor.name
+                payee = "you" if creditor.user_id == self.current_user.user_id else creditor.name
+                print(f"{payer} pay{'s' if payer != 'You' else ''} {payee} {amount:.2f}")
+        except ValueError as e:
+            print(f"Failed to simplify group debts: {e}")
+
 
 if __name__ == "__main__":
     app = BillSharingApp()
@@ -0,0 +1,144 @@
+import argparse
+import re
+from typing import Dict, List, Tuple
+from connector import Connector
+from backends import SCHEMA_PATH
+
+# The id columns of db.sql, read from the schema so the tool follows it when tables are added
+_TABLE = re.compile(r"CREATE\s+TABLE\s+IF\s+NOT\s+EXISTS\s+(\w+)\s*\((.*?)\n\);", re.IGNORECASE | re.DOTALL)
+_BINARY_ID = re.compile(r"^\s*(\w+)\s+BINARY\(16\)", re.IGNORECASE | re.MULTILINE)
+# Expression turning "E0190b1d6-4f2a-..." into the 16 bytes of the UUID
+_TO_BINARY = "UNHEX(REPLACE(SUBSTRING({column}, 2), '-', ''))"
+_ID_REGEXP = "^[UGET][0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$"
+
+
+def schema_id_columns(path: str = SCHEMA_PATH) -> Dict[str, List[str]]:
+    """
+    :param path: path of the MySQL schema
+    :return: dictionary mapping every table of the schema to its BINARY(16) id columns
+    """
+    with open(path, "r") as file:
+        text = file.read()
+    return {table: _BINARY_ID.findall(body) for table, body in _TABLE.findall(text) if _BINARY_ID.search(body)}
+
+
+def find_varchar_ids(connector: Connector) -> Dict[str, List[str]]:
+    """
+    :return: dictionary mapping tables to their id columns that are still VARCHAR in the connected database
+    """
+    rows = connector.execute("""
+        SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND DATA_TYPE = 'varchar'
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """) or []
+    expected = schema_id_columns()
+    columns = {}
+    for row in rows:
+        if row['column_name'] in expected.get(row['table_name'], []):
+            columns.setdefault(row['table_name'], []).append(row['column_name'])
+    return columns
+
+
+def find_foreign_keys(connector: Connector, tables: List[str]) -> List[dict]:
+    """
+    :return: the foreign keys of the given tables, one row per constraint with its columns in order
+    """
+    if not tables:
+        return []
+    placeholders = ', '.join(['%s'] * len(tables))
+    rows = connector.execute(f"""
+        SELECT k.CONSTRAINT_NAME AS name, k.TABLE_NAME AS table_name, k.COLUMN_NAME AS column_name,
+               k.REFERENCED_TABLE_NAME AS referenced_table, k.REFERENCED_COLUMN_NAME AS referenced_column,
+               r.UPDATE_RULE AS update_rule, r.DELETE_RULE AS delete_rule
+        FROM information_schema.KEY_COLUMN_USAGE k
+        JOIN information_schema.REFERENTIAL_CONSTRAINTS r
+          ON r.CONSTRAINT_SCHEMA = k.CONSTRAINT_SCHEMA AND r.CONSTRAINT_NAME = k.CONSTRAINT_NAME
+        WHERE k.TABLE_SCHEMA = DATABASE() AND k.REFERENCED_TABLE_NAME IS NOT NULL AND k.TABLE_NAME IN ({placeholders})
+        ORDER BY k.TABLE_NAME, k.CONSTRAINT_NAME, k.ORDINAL_POSITION
+        """, tuple(tables)) or []
+    keys = {}
+    for row in rows:
+        key = keys.setdefault((row['table_name'], row['name']), {
+            'name': row['name'], 'table': row['table_name'], 'columns': [], 'referenced_table': row['referenced_table'],
+            'referenced_columns': [], 'update_rule': row['update_rule'], 'delete_rule': row['delete_rule']})
+        key['columns'].append(row['column_name'])
+        key['referenced_columns'].append(row['referenced_column'])
+    return list(keys.values())
+
+
+def plan(columns: Dict[str, List[str]], foreign_keys: List[dict]) -> List[str]:
+    """
+    Builds the statements converting the given VARCHAR id columns to BINARY(16).
+    Foreign keys are dropped first because MySQL refuses to change the type of only one side of a key, and are added back at the end.
+    Each table is converted in three steps: VARBINARY keeps the bytes of the text ids, the UPDATE packs them into 16 bytes
+    and the last ALTER fixes the column type, rebuilding the primary key and the secondary indexes at their new size.
+    :param columns: dictionary mapping tables to the id columns to convert
+    :param foreign_keys: foreign keys as returned by find_foreign_keys()
+    :return: list of SQL statements, in the order they must be run
+    """
+    statements = [f"ALTER TABLE {key['table']} DROP FOREIGN KEY {key['name']}" for key in foreign_keys]
+    for table, table_columns in columns.items():
+        statements.append(f"ALTER TABLE {table} " + ", ".join(f"MODIFY {column} VARBINARY(128) NOT NULL" for column in table_columns))
+        statements.append(f"UPDATE {table} SET " + ", ".join(f"{column} = {_TO_BINARY.format(column = column)}"
+                                                           for column in table_columns))
+        statements.append(f"ALTER TABLE {table} " + ", ".join(f"MODIFY {column} BINARY(16) NOT NULL" for column in table_columns))
+    for key in foreign_keys:
+        statements.append(f"ALTER TABLE {key['table']} ADD CONSTRAINT {key['name']} FOREIGN KEY ({', '.join(key['columns'])}) "
+                          f"REFERENCES {key['referenced_table']}({', '.join(key['referenced_columns'])}) "
+                          f"ON UPDATE {key['update_rule']} ON DELETE {key['delete_rule']}")
+    return statements
+
+
+def find_invalid_ids(connector: Connector, columns: Dict[str, List[str]]) -> List[Tuple[str, str, int]]:
+    """
+    :return: (table, column, count) for every column holding values that are not prefixed UUIDs and could not be converted
+    """
+    invalid = []
+    for table, table_columns in columns.items():
+        for column in table_columns:
+            row = connector.execute(f"SELECT COUNT(*) AS count FROM {table} WHERE {column} NOT REGEXP %s",
+                                    (_ID_REGEXP,), fetchall = False)
+            if row and row['count']:
+                invalid.append((table, column, row['count']))
+    return invalid
+
+
+def migrate(connector: Connector, dry_run: bool = False) -> List[str]:
+    """
+    Converts the VARCHAR(128) id columns of an existing MySQL database to BINARY(16).
+    Ids keep their value, so existing rows keep their random (version 4) order and only new rows are time-ordered.
+    MySQL commits every ALTER TABLE on its own, so take a backup and stop the application while the conversion runs.
+    :param connector: connector of the database to convert
+    :param dry_run: only return the statements without running them
+    :return: the statements that were (or would be) run
+    """
+    if connector.backend.name != "mysql":
+        raise ValueError("ERROR[migrate_ids.migrate]: Only MySQL databases can have VARCHAR ids. SQLite databases are created with BLOB ids.")
+    columns = find_varchar_ids(connector)
+    if not columns:
+        return []
+    invalid = find_invalid_ids(connector, columns)
+    if invalid:
+        details = ", ".join(f"{table}.{column} ({count} rows)" for table, column, count in invalid)
+        raise ValueError(f"ERROR[migrate_ids.migrate]: Values that are not prefixed UUIDs found in {details}.")
+    statements = plan(columns, find_foreign_keys(connector, list(schema_id_columns())))
+    if not dry_run:
+        # ALTER TABLE returns no result set, so the statements go straight to the cursor of the held connection
+        with connector.transaction():
+            for statement in statements:
+                connector.cursor.execute(statement)
+    return statements
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Converts the VARCHAR(128) id columns of an existing database to the BINARY(16) ids of db.sql.")
+    parser.add_argument("--config", required = True, help = "path to the JSON file with the database credentials")
+    parser.add_argument("--dry-run", action = "store_true", help = "print the statements without running them")
+    args = parser.parse_args()
+
+    connector = Connector(filepath = args.config)
+    statements = migrate(connector, dry_run = args.dry_run)
+    for statement in statements:
+        print(statement + ";")
+    print("Nothing to convert" if not statements else f"{len(statements)} statements {'planned' if args.dry_run else 'run'}")
+    connector.close()
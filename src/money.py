@@ -0,0 +1,184 @@
+from decimal import Decimal, ROUND_HALF_UP
+from functools import total_ordering
+from typing import List, Iterable
+
+
+@total_ordering
+class Money:
+    """
+    An immutable amount of money held as integer cents, so sums and comparisons are exact integer math.
+
+    Money(12.5), Money("12.50"), Money(Decimal("12.50")) and Money.from_cents(1250) are the same amount. Inputs with more than two
+    decimal places are rounded half up. Money compares with Money, int and Decimal values by amount, and hashing follows Decimal,
+    so a Money can replace an equal int or Decimal as a dictionary key. Floats are not compared: the hash of 33.33 differs from
+    the hash of Decimal("33.33"), so equality with floats would break dictionaries and sets. Convert them with Money(value) first.
+    Values are converted to Decimal with to_decimal() only where they leave the program, e.g. as query parameters.
+    """
+
+    __slots__ = ("_cents",)
+
+    def __init__(self, amount = 0):
+        """
+        :param amount: Money, int, float, Decimal or numeric string in currency units
+        """
+        if isinstance(amount, Money):
+            cents = amount._cents
+        elif isinstance(amount, int) and not isinstance(amount, bool):
+            cents = amount * 100
+        elif isinstance(amount, (float, str, Decimal)):
+            try:
+                value = amount if isinstance(amount, Decimal) else Decimal(str(amount).strip())
+                cents = int((value * 100).quantize(Decimal(1), rounding = ROUND_HALF_UP))
+            except ArithmeticError:
+                raise ValueError(f"ERROR[Money.__init__]: {amount!r} is not a valid amount")
+        else:
+            raise TypeError(f"ERROR[Money.__init__]: Cannot make Money from {type(amount).__name__}")
+        object.__setattr__(self, "_cents", cents)
+
+    @classmethod
+    def from_cents(cls, cents: int) -> 'Money':
+        money = cls.__new__(cls)
+        object.__setattr__(money, "_cents", int(cents))
+        return money
+
+    @property
+    def cents(self) -> int:
+        return self._cents
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Money is immutable")
+
+    def __reduce__(self):
+        return Money.from_cents, (self._cents,)
+
+    def to_decimal(self) -> Decimal:
+        """
+        :return: the amount as a Decimal with two decimal places, e.g. Decimal('12.50')
+        """
+        return Decimal(self._cents).scaleb(-2)
+
+    def __float__(self):
+        return self._cents / 100
+
+    def __bool__(self):
+        return self._cents != 0
+
+    def __str__(self):
+        sign = "-" if self._cents < 0 else ""
+        units, cents = divmod(abs(self._cents), 100)
+        return f"{sign}{units}.{cents:02d}"
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+    def __format__(self, format_spec):
+        return format(self.to_decimal(), format_spec) if format_spec else str(self)
+
+    @staticmethod
+    def _cents_of(other):
+        """
+        :return: other in cents if it is an exact amount of cents, None for other ints and Decimals,
+                 NotImplemented for every other type, floats included
+        """
+        if isinstance(other, Money):
+            return other._cents
+        if isinstance(other, int) and not isinstance(other, bool):
+            return other * 100
+        if isinstance(other, Decimal):
+            if not other.is_finite():
+                return None
+            cents = other * 100
+            return int(cents) if cents == cents.to_integral_value() else None
+        return NotImplemented
+
+    def __eq__(self, other):
+        cents = Money._cents_of(other)
+        if cents is NotImplemented:
+            return NotImplemented
+        return cents is not None and cents == self._cents
+
+    def __lt__(self, other):
+        if isinstance(other, Money):
+            return self._cents < other._cents
+        if isinstance(other, (int, Decimal)) and not isinstance(other, bool):
+            return self.to_decimal() < other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.to_decimal())
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money.from_cents(self._cents + other._cents)
+        if isinstance(other, int) and not isinstance(other, bool):
+            return Money.from_cents(self._cents + other * 100)
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money.from_cents(self._cents - other._cents)
+        if isinstance(other, int) and not isinstance(other, bool):
+            return Money.from_cents(self._cents - other * 100)
+        return NotImplemented
+
+    def __rsub__(self, other):
+        if isinstance(other, int) and not isinstance(other, bool):
+            return Money.from_cents(other * 100 - self._cents)
+        return NotImplemented
+
+    def __mul__(self, other):
+        if isinstance(other, int) and not isinstance(other, bool):
+            return Money.from_cents(self._cents * other)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money.from_cents(-self._cents)
+
+    def __abs__(self):
+        return Money.from_cents(abs(self._cents))
+
+    def allocate(self, weights: Iterable) -> List['Money']:
+        """
+        Splits the amount in proportion to weights with the largest remainder method, so the parts always add up to exactly this amount.
+        Each part gets the whole cents of its exact share; the cents left over go one each to the parts with the largest fractional remainders,
+        earlier parts first on ties. Money(100).allocate([1, 1, 1]) gives 33.34, 33.33, 33.33.
+
+        :param weights: non-negative ints, floats, Decimals or numeric strings, e.g. [1, 1, 1], percentages or shares
+        :return: list of Money, one per weight, in the same order
+        """
+        weights = Money._integer_weights(weights)
+        total_weight = sum(weights)
+        if total_weight <= 0:
+            raise ValueError("ERROR[Money.allocate]: Weights must add up to more than zero.")
+        sign = -1 if self._cents < 0 else 1
+        cents = abs(self._cents)
+
+        parts, remainders = [], []
+        for weight in weights:
+            part, remainder = divmod(cents * weight, total_weight)
+            parts.append(part)
+            remainders.append(remainder)
+        left_over = cents - sum(parts)
+        for position in sorted(range(len(weights)), key = lambda i: -remainders[i])[:left_over]:
+            parts[position] += 1
+        return [Money.from_cents(sign * part) for part in parts]
+
+    @staticmethod
+    def _integer_weights(weights: Iterable) -> List[int]:
+        """
+        Scales weights to integers by the smallest power of ten that makes all of them whole, so allocate() needs only integer math.
+        """
+        weights = list(weights)
+        if all(isinstance(weight, int) and not isinstance(weight, bool) for weight in weights):
+            integers = weights
+        else:
+            decimals = [weight if isinstance(weight, Decimal) else Decimal(str(weight)) for weight in weights]
+            places = max((-decimal.as_tuple().exponent for decimal in decimals), default = 0)
+            integers = [int(decimal.scaleb(max(places, 0))) for decimal in decimals]
+        if any(weight < 0 for weight in integers):
+            raise ValueError("ERROR[Money.allocate]: Weights cannot be negative.")
+        return integers
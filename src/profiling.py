@@ -0,0 +1,179 @@
+import re
+import sys
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+# Upper bounds, in milliseconds, of the latency histogram buckets. The last bucket takes everything slower.
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf"))
+
+# Modules whose frames are skipped when looking for the code that issued a query
+_INTERNAL_MODULES = {"connector", "profiling", "contextlib"}
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize = 4096)
+def fingerprint(query: str) -> str:
+    """
+    Normalizes a statement so that calls differing only in their values are counted together:
+    literals and placeholders become ?, lists of them become (...), repeated VALUES rows are collapsed and whitespace is squeezed.
+    :param query: SQL statement as given to Connector.execute
+    :return: the normalized statement
+    """
+    query = _STRING.sub("?", query)
+    query = _NUMBER.sub("?", query)
+    query = _PLACEHOLDER.sub("?", query)
+    query = _LIST.sub("(...)", query)
+    query = _ROWS.sub(r"\1", query)
+    return _SPACE.sub(" ", query).strip()
+
+
+def call_site(depth: int = 1) -> str:
+    """
+    :param depth: frames to skip before looking
+    :return: "module.function" of the nearest frame outside the connector and this module
+    """
+    frame = sys._getframe(depth)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "?")
+        if module not in _INTERNAL_MODULES:
+            code = frame.f_code
+            return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+        frame = frame.f_back
+    return "?"
+
+
+class QueryStats:
+    """
+    Statistics of one statement fingerprint issued from one call site.
+    """
+    __slots__ = ("call_site", "fingerprint", "calls", "round_trips", "rows", "total", "slowest", "histogram")
+
+    def __init__(self, site: str, statement: str):
+        self.call_site = site
+        self.fingerprint = statement
+        self.calls = 0
+        self.round_trips = 0
+        self.rows = 0
+        self.total = 0.0    # seconds
+        self.slowest = 0.0  # seconds
+        self.histogram = [0] * len(LATENCY_BUCKETS_MS)
+
+    def add(self, rows: int, seconds: float, round_trips: int):
+        self.calls += 1
+        self.round_trips += round_trips
+        self.rows += rows
+        self.total += seconds
+        self.slowest = max(self.slowest, seconds)
+        self.histogram[bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+
+    def percentile_ms(self, fraction: float) -> float:
+        """
+        :return: upper bound of the histogram bucket holding the given fraction of the calls
+        """
+        target, seen = fraction * self.calls, 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.histogram):
+            seen += count
+            if seen >= target:
+                return bound
+        return LATENCY_BUCKETS_MS[-1]
+
+    def as_dict(self) -> dict:
+        return {
+            "call_site": self.call_site,
+            "fingerprint": self.fingerprint,
+            "calls": self.calls,
+            "round_trips": self.round_trips,
+            "rows": self.rows,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total * 1000 / self.calls if self.calls else 0.0,
+            "max_ms": self.slowest * 1000,
+            "histogram": {bound: count for bound, count in zip(LATENCY_BUCKETS_MS, self.histogram) if count},
+        }
+
+
+class QueryProfile:
+    """
+    Queries recorded by Connector.profile(), grouped by the "module.function" that issued them and the fingerprint of the statement.
+
+    Usage:
+        with connector.profile() as profile:
+            Expense.get_group_expenses(group_id, connector)
+        print(profile.report())
+    """
+
+    def __init__(self) -> None:
+        self._stats: Dict[Tuple[str, str], QueryStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, query: str, rows: int, seconds: float, round_trips: int = 1, site: str = None):
+        """
+        :param query: the statement as given to the connector
+        :param rows: rows returned by a query, or affected by a DML statement
+        :param seconds: time spent in the database driver
+        :param round_trips: statements actually sent, for batched calls
+        :param site: "module.function" of the caller; found from the stack if not given
+        """
+        site = site or call_site()
+        statement = fingerprint(query)
+        with self._lock:
+            stats = self._stats.get((site, statement))
+            if stats is None:
+                stats = self._stats[(site, statement)] = QueryStats(site, statement)
+            stats.add(rows, seconds, round_trips)
+
+    @property
+    def query_count(self) -> int:
+        return sum(stats.calls for stats in self._stats.values())
+
+    @property
+    def round_trips(self) -> int:
+        return sum(stats.round_trips for stats in self._stats.values())
+
+    @property
+    def total_ms(self) -> float:
+        return sum(stats.total for stats in self._stats.values()) * 1000
+
+    def stats(self) -> List[dict]:
+        """
+        :return: one dictionary per (call site, fingerprint), slowest total first
+        """
+        with self._lock:
+            entries = sorted(self._stats.values(), key = lambda stats: stats.total, reverse = True)
+            return [stats.as_dict() for stats in entries]
+
+    def by_call_site(self) -> Dict[str, int]:
+        """
+        :return: dictionary mapping every call site to the number of queries it issued
+        """
+        counts = {}
+        for stats in self._stats.values():
+            counts[stats.call_site] = counts.get(stats.call_site, 0) + stats.calls
+        return counts
+
+    def report(self, limit: int = 20, width: int = 80) -> str:
+        """
+        :param limit: number of entries shown
+        :param width: statements are cut to this many characters
+        :return: a table of the entries with the largest total time
+        """
+        lines = [f"{self.query_count} queries, {self.round_trips} round trips, {self.total_ms:.1f} ms",
+                 f"{'calls':>7}{'trips':>7}{'rows':>8}{'total ms':>10}{'mean ms':>9}{'p95 ms':>8}{'max ms':>9}  call site / statement"]
+        with self._lock:
+            entries = sorted(self._stats.values(), key = lambda stats: stats.total, reverse = True)[:limit]
+            for stats in entries:
+                statement = stats.fingerprint if len(stats.fingerprint) <= width else stats.fingerprint[:width - 3] + "..."
+                lines.append(f"{stats.calls:>7}{stats.round_trips:>7}{stats.rows:>8}{stats.total * 1000:>10.2f}"
+                             f"{stats.total * 1000 / stats.calls:>9.2f}{stats.percentile_ms(0.95):>8g}{stats.slowest * 1000:>9.2f}"
+                             f"  {stats.call_site}\n{'':>58}{statement}")
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.report()
@@ -0,0 +1,92 @@
+from typing import List, Dict, Tuple
+import heapq
+
+# Groups with at most this many non-zero balances are planned exactly; larger ones use the greedy matcher
+EXACT_LIMIT = 12
+
+
+def plan_settlements(balances: Dict[str, int], exact_limit: int = EXACT_LIMIT) -> List[Tuple[str, str, int]]:
+    """
+    Plans transfers that settle every balance of a group.
+    Balances are net positions in integer cents: positive for members who are owed money, negative for members who owe money.
+    Up to exact_limit non-zero members the plan has the minimum possible number of transfers. Above that the greedy matcher is used,
+    which needs at most one transfer fewer than the number of non-zero members.
+
+    :param balances: dictionary mapping a member id to their net balance in cents. The balances must sum to zero
+    :param exact_limit: largest number of non-zero members planned with the exact solver
+    :return: list of (debtor_id, creditor_id, cents) transfers
+    """
+    if sum(balances.values()) != 0:
+        raise ValueError(f"ERROR[plan_settlements]: Balances must sum to zero, got {sum(balances.values())} cents")
+    members = [(member, cents) for member, cents in balances.items() if cents]
+    if len(members) <= exact_limit:
+        return _plan_exact(members)
+    return _plan_greedy(members)
+
+
+def _plan_greedy(members: List[Tuple[str, int]]) -> List[Tuple[str, str, int]]:
+    """
+    Repeatedly matches the largest creditor with the largest debtor. Every transfer settles at least one of the two, so n members need at most n - 1 transfers.
+    Runs in O(n log n).
+    """
+    # heapq is a min-heap, so both heaps hold negated amounts to pop the largest first. The id breaks ties deterministically.
+    creditors = [(-cents, member) for member, cents in members if cents > 0]
+    debtors = [(cents, member) for member, cents in members if cents < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        cents = min(-credit, -debt)
+        transfers.append((debtor, creditor, cents))
+        if -credit > cents:
+            heapq.heappush(creditors, (credit + cents, creditor))
+        if -debt > cents:
+            heapq.heappush(debtors, (debt + cents, debtor))
+    return transfers
+
+
+def _plan_exact(members: List[Tuple[str, int]]) -> List[Tuple[str, str, int]]:
+    """
+    The fewest transfers that settle n members is n minus the largest number of disjoint zero-sum subsets they can be split into,
+    because each zero-sum subset of k members settles with k - 1 transfers and no fewer.
+    Finds that split with a dynamic programme over subsets in O(2^n * n), then settles each subset greedily.
+    """
+    count = len(members)
+    if count == 0:
+        return []
+    full = (1 << count) - 1
+    sums = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        lowest = (mask & -mask).bit_length() - 1
+        sums[mask] = sums[mask & (mask - 1)] + members[lowest][1]
+
+    # best[mask]: the most zero-sum subsets that the members in mask can be split into
+    best = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        bits = mask
+        most = 0
+        while bits:
+            bit = bits & -bits
+            most = max(most, best[mask ^ bit])
+            bits ^= bit
+        best[mask] = most + (1 if sums[mask] == 0 else 0)
+
+    # Walk back from the full set removing one member at a time; the members removed between two zero-sum masks form one subset
+    transfers = []
+    mask, subset_start = full, full
+    while mask:
+        bits = mask
+        while bits:
+            bit = bits & -bits
+            if best[mask ^ bit] + (1 if sums[mask] == 0 else 0) == best[mask]:
+                break
+            bits ^= bit
+        mask ^= bit
+        if sums[mask] == 0:
+            subset = subset_start ^ mask
+            transfers.extend(_plan_greedy([members[i] for i in range(count) if subset >> i & 1]))
+            subset_start = mask
+    return transfers
@@ -0,0 +1,125 @@
+from user import User
+from money import Money
+from decimal import Decimal
+from typing import List, Dict, Callable, Tuple, Iterable
+
+# method name -> strategy(amount, participants, **options) returning a dictionary mapping every participant to their share
+SPLIT_STRATEGIES: Dict[str, Callable[..., Dict[User, Money]]] = {}
+
+
+def split_strategy(name: str):
+    """
+    Registers the decorated function as the split method called name, which makes it available to Expense.calculate_and_split_expense.
+
+    A strategy is called as strategy(amount, participants, **options) with the expense amount as Money and the participants in order.
+    It returns a dictionary mapping each participant to their share as Money; the shares must add up to the amount.
+    Options are keyword arguments of the strategy, so an option it does not take raises a TypeError instead of being ignored.
+
+    Usage:
+        @split_strategy('even_except_payer')
+        def split_even_except_payer(amount, participants): ...
+    """
+    def register(strategy):
+        SPLIT_STRATEGIES[name] = strategy
+        return strategy
+    return register
+
+
+def compute_split(method: str, amount, participants: List[User], **options) -> Dict[User, Money]:
+    """
+    :param method: name of a registered split method, e.g. 'equal', 'unequal', 'percentages', 'shares', 'itemised' or 'adjustment'
+    :param amount: the amount to split
+    :param participants: participants in the order their options are given in
+    :param options: the options of the split method, e.g. amounts, percentages, shares, items, tax, tip or adjustments
+    :return: dictionary mapping each participant to their share, adding up to amount exactly
+    """
+    strategy = SPLIT_STRATEGIES.get(method)
+    if strategy is None:
+        raise ValueError(f"ERROR[compute_split]: Invalid method {method!r}. Use one of: {', '.join(SPLIT_STRATEGIES)}.")
+    if not participants:
+        raise ValueError("ERROR[compute_split]: Participants cannot be empty.")
+    amount = Money(amount)
+    split = strategy(amount, list(participants), **options)
+    if sum(share.cents for share in split.values()) != amount.cents:
+        raise ValueError(f"ERROR[compute_split]: The {method} split does not add up to the expense amount.")
+    return split
+
+
+def _aligned(values: Iterable, participants: List[User], name: str, method: str) -> list:
+    if values is None or len(values) != len(participants):
+        raise ValueError(f"ERROR[split_{method}]: {name.capitalize()} must be provided and match the number of participants for '{method}' method.")
+    return list(values)
+
+
+@split_strategy('equal')
+def split_equal(amount: Money, participants: List[User]) -> Dict[User, Money]:
+    return dict(zip(participants, amount.allocate([1] * len(participants))))
+
+
+@split_strategy('unequal')
+def split_unequal(amount: Money, participants: List[User], amounts: List[float] = None) -> Dict[User, Money]:
+    split = {participant: Money(share) for participant, share in zip(participants, _aligned(amounts, participants, 'amounts', 'unequal'))}
+    if sum(share.cents for share in split.values()) != amount.cents:
+        raise ValueError("ERROR[split_unequal]: The sum of amounts provided must be equal to the total split amount.")
+    return split
+
+
+@split_strategy('percentages')
+def split_percentages(amount: Money, participants: List[User], percentages: List[float] = None) -> Dict[User, Money]:
+    percentages = _aligned(percentages, participants, 'percentages', 'percentages')
+    if sum(Decimal(str(percentage)) for percentage in percentages) != 100:
+        raise ValueError("ERROR[split_percentages]: Percentages must add up to 100.")
+    return dict(zip(participants, amount.allocate(percentages)))
+
+
+@split_strategy('shares')
+def split_shares(amount: Money, participants: List[User], shares: List[float] = None) -> Dict[User, Money]:
+    """
+    Splits in proportion to a number of shares per participant, e.g. [2, 1, 1] or [1.5, 1].
+    """
+    return dict(zip(participants, amount.allocate(_aligned(shares, participants, 'shares', 'shares'))))
+
+
+@split_strategy('itemised')
+def split_itemised(amount: Money, participants: List[User], items: List[Tuple[float, List[User]]] = None,
+                   tax: float = 0, tip: float = 0) -> Dict[User, Money]:
+    """
+    Splits a receipt: each item is split equally among the participants it is assigned to, and tax and tip are spread over
+    the participants in proportion to their item subtotals. Participants with no items get a share of 0.
+
+    :param items: list of (price, participants sharing the item)
+    :param tax: tax on the receipt
+    :param tip: tip on the receipt
+    """
+    if not items:
+        raise ValueError("ERROR[split_itemised]: Items must be provided for 'itemised' method.")
+    positions = {id(participant): position for position, participant in enumerate(participants)}
+    subtotals = [0] * len(participants)
+    items_total = 0
+    for price, sharing in items:
+        price = Money(price)
+        if not sharing or price < 0:
+            raise ValueError("ERROR[split_itemised]: Every item needs a non-negative price and at least one participant.")
+        if any(id(participant) not in positions for participant in sharing):
+            raise ValueError("ERROR[split_itemised]: Items can only be assigned to participants of the expense.")
+        for participant, share in zip(sharing, price.allocate([1] * len(sharing))):
+            subtotals[positions[id(participant)]] += share.cents
+        items_total += price.cents
+    if items_total + Money(tax).cents + Money(tip).cents != amount.cents:
+        raise ValueError("ERROR[split_itemised]: Items, tax and tip must add up to the expense amount.")
+    # Allocating the whole amount by subtotal gives every participant their items plus their proportional part of tax and tip at once
+    return dict(zip(participants, amount.allocate(subtotals)))
+
+
+@split_strategy('adjustment')
+def split_adjustment(amount: Money, participants: List[User], adjustments: List[float] = None) -> Dict[User, Money]:
+    """
+    Splits equally after taking out a fixed adjustment per participant, e.g. [10, 0, -5] makes the first participant pay 10 more
+    and the last one 5 less than an equal share.
+    """
+    adjustments = [Money(adjustment) for adjustment in _aligned(adjustments, participants, 'adjustments', 'adjustment')]
+    remainder = amount - sum(adjustments, Money(0))
+    shares = [share + adjustment for share, adjustment in zip(remainder.allocate([1] * len(participants)), adjustments)]
+    if any(share < 0 for share in shares):
+        raise ValueError("ERROR[split_adjustment]: Adjustments cannot make a share negative.")
+    return dict(zip(participants, shares))
@@ -0,0 +1,91 @@
+import pytest
+import random
+from decimal import Decimal
+from unittest.mock import MagicMock
+from connector import Connector
+from ids import new_id, Id, USER
+
+np = pytest.importorskip("numpy")
+from analytics import BalanceArrays
+
+
+def _random_group(seed, members=8, expenses=200):
+    rng = random.Random(seed)
+    user_ids = [f"U{i}" for i in range(members)]
+    participant_rows = []  # (expense payer, participant, amount, settled) like Expenses JOIN ExpenseParticipants
+    for _ in range(expenses):
+        payer = rng.choice(user_ids)
+        for user_id in rng.sample(user_ids, rng.randint(1, members)):
+            amount = Decimal(rng.randint(0, 50000)).scaleb(-2)
+            participant_rows.append((payer, user_id, amount, rng.choice(['NO', 'PARTIAL', 'SETTLED'])))
+    return user_ids, participant_rows
+
+
+def _view_group_dues(participant_rows, creditor_id):
+    # the aggregate view_group_dues used to run in SQL, evaluated row by row
+    dues = {}
+    for payer, user_id, amount, settled in participant_rows:
+        if payer == creditor_id and settled != 'SETTLED' and user_id != creditor_id:
+            dues[user_id] = dues.get(user_id, Decimal(0)) + amount
+    return {user_id: total for user_id, total in dues.items() if total}
+
+
+def test_dues_match_view_group_dues_aggregate():
+    user_ids, participant_rows = _random_group(3)
+    shares = [(user_id, payer, amount) for payer, user_id, amount, settled in participant_rows
+              if settled != 'SETTLED' and user_id != payer]
+    arrays = BalanceArrays(user_ids, shares)
+
+    for user_id in user_ids:
+        assert arrays.dues_owed_to(user_id) == _view_group_dues(participant_rows, user_id)
+    assert int(arrays.net.sum()) == 0
+    assert sum(arrays.balances().values()) == 0
+
+
+def test_totals_and_matrix():
+    arrays = BalanceArrays(['A', 'B'],
+                           [('B', 'A', Decimal('10.50')), ('C', 'A', Decimal('4.25')), ('B', 'A', Decimal('1.00'))],
+                           [('A', Decimal('30.00'))],
+                           [('B', 'A', Decimal('5.00'))])
+
+    assert arrays.members == ['A', 'B', 'C']
+    assert arrays.owed.tolist() == [0, 1150, 425]
+    assert arrays.owed_to.tolist() == [1575, 0, 0]
+    assert arrays.net.tolist() == [1575, -1150, -425]
+    assert arrays.paid.tolist() == [3000, 0, 0]
+    assert arrays.sent.tolist() == [0, 500, 0]
+    assert arrays.received.tolist() == [500, 0, 0]
+    assert arrays.debt_matrix().tolist() == [[0, 0, 0], [1150, 0, 0], [425, 0, 0]]
+    assert arrays.pair_debtor.dtype == np.int32 and arrays.pair_cents.dtype == np.int64
+
+
+def test_ids_outside_the_members_are_numbered_in_order_of_appearance():
+    former, other = new_id(USER), new_id(USER)
+    arrays = BalanceArrays(['A'], [(other, 'A', Decimal('1.00')), (former, other, Decimal('2.00')), (other, 'A', Decimal('3.00'))])
+
+    assert arrays.members == ['A', other, former]
+    # the objects from the rows are kept, so the ids stay Ids that are sent to the database as ids
+    assert all(isinstance(user_id, Id) for user_id in arrays.members[1:])
+    assert arrays.owed.tolist() == [0, 400, 200] and arrays.owed_to.tolist() == [400, 200, 0]
+    assert arrays.pair_debtor.dtype == np.int32
+
+
+def test_empty_group():
+    arrays = BalanceArrays([], [])
+    assert arrays.balances() == {}
+    assert arrays.dues_owed_to('U1') == {}
+
+
+def test_load_runs_four_queries():
+    connector = MagicMock(spec=Connector)
+    connector.execute.side_effect = [
+        [{'user_id': 'A'}, {'user_id': 'B'}],
+        [{'user_id': 'B', 'paid_by': 'A', 'amount': Decimal('12.00')}],
+        [{'paid_by': 'A', 'amount': Decimal('24.00')}],
+        [],
+    ]
+
+    arrays = BalanceArrays.load('G1', connector)
+
+    assert connector.execute.call_count == 4
+    assert arrays.balances() == {'A': Decimal('12.00'), 'B': Decimal('-12.00')}
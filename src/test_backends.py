@@ -0,0 +1,181 @@
+import pytest
+from decimal import Decimal
+from backends import get_backend, translate_schema
+from connector import Connector
+from user import User
+from group import Group
+from expense import Expense
+from transaction import Transaction
+from ledger import Ledger
+from money import Money
+from ids import new_id, USER
+
+
+@pytest.fixture
+def connector(tmp_path):
+    connector = Connector(backend="sqlite", database=str(tmp_path / "bill_sharing_app.db"))
+    yield connector
+    connector.close()
+
+
+def test_query_translation():
+    sqlite = get_backend("sqlite")
+    assert sqlite.translate("START TRANSACTION") == "BEGIN"
+    assert sqlite.translate("SELECT * FROM Users WHERE user_id = %s FOR UPDATE") == "SELECT * FROM Users WHERE user_id = ?"
+    assert (sqlite.translate("INSERT INTO GroupBalances (group_id, user_id, net_balance) VALUES (%s, %s, %s) "
+                             "ON DUPLICATE KEY UPDATE net_balance = net_balance + VALUES(net_balance)")
+            == "INSERT INTO GroupBalances (group_id, user_id, net_balance) VALUES (?, ?, ?) "
+               "ON CONFLICT DO UPDATE SET net_balance = net_balance + excluded.net_balance")
+    assert get_backend("mysql").translate("SELECT %s") == "SELECT %s"
+    with pytest.raises(ValueError):
+        get_backend("postgres")
+
+
+def test_schema_translation():
+    schema = translate_schema()
+    assert "CREATE DATABASE" not in schema and "ENUM" not in schema
+    assert "settled TEXT NOT NULL CHECK (settled IN ('SETTLED', 'PARTIAL', 'NO'))" in schema
+    assert "CREATE UNIQUE INDEX IF NOT EXISTS Users_email ON Users (email);" in schema
+    assert "CREATE INDEX IF NOT EXISTS ExpenseParticipants_user_settled ON ExpenseParticipants (user_id, settled);" in schema
+    assert "user_id BLOB NOT NULL" in schema
+
+
+def test_json_config_selects_sqlite(tmp_path):
+    config = tmp_path / "db.json"
+    config.write_text('{"backend": "sqlite", "database": "%s"}' % (tmp_path / "app.db"))
+    connector = Connector(filepath=str(config))
+    assert connector.backend.name == "sqlite"
+    assert connector.execute("PRAGMA journal_mode", fetchall=False)['journal_mode'] == 'wal'
+    connector.close()
+
+
+def test_models_run_against_sqlite(connector):
+    alice = User("Alice", "alice@example.com", "secret", connector=connector)
+    bob = User("Bob", "bob@example.com", "secret", connector=connector)
+    carol = User("Carol", "carol@example.com", "secret", connector=connector)
+    group = Group(admin=alice, name="Trip", members=[bob, carol], connector=connector)
+    expense = Expense(amount=100, payer=alice, group=group, participants={alice: 100, bob: 0, carol: 0},
+                      description="Dinner", connector=connector)
+
+    expense.calculate_and_split_expense('equal', [alice, bob, carol])
+    transfers = Transaction.settle_up(bob, alice, '20.00', group)
+
+    assert transfers == {expense.expense_id: Decimal('20.00')}
+    assert Ledger.get_balances(group.group_id, connector) == {
+        alice.user_id: Decimal('46.66'), bob.user_id: Decimal('-13.33'), carol.user_id: Decimal('-33.33')}
+    assert Ledger.get_due_total(bob.user_id, connector) == (Decimal('13.33'), 1)
+    assert Ledger.verify(connector) == [] and Ledger.verify_dues(connector) == []
+    assert [transaction.amount for transaction in Transaction.get_transactions_for_user(bob)] == [Decimal('20.00')]
+    loaded = Expense.get_expense(expense.expense_id, connector)
+    assert loaded.amount == 100 and loaded.description == "Dinner"
+    assert connector.execute("SELECT length(expense_id) AS size FROM Expenses", fetchall=False)['size'] == 16
+    assert loaded.payer.name == "Alice" and loaded.group.name == "Trip"
+    assert {user.name: amount for user, amount in loaded.participants.items()} == {
+        "Alice": Money("33.34"), "Bob": Money("13.33"), "Carol": Money("33.33")}
+    [summary] = Expense.get_group_expense_summaries(group.group_id, connector)
+    assert (summary['payer_name'], summary['group_name'], summary['amount']) == ("Alice", "Trip", Decimal('100.00'))
+
+
+def test_transaction_rolls_back(connector):
+    alice = User("Alice", "alice@example.com", "secret", connector=connector)
+    with pytest.raises(RuntimeError):
+        with connector.transaction():
+            connector.execute("UPDATE Users SET name = %s WHERE user_id = %s", ("Alicia", alice.user_id))
+            raise RuntimeError("undo")
+    assert connector.execute("SELECT name FROM Users WHERE user_id = %s", (alice.user_id,), fetchall=False)['name'] == "Alice"
+
+
+def test_stream_reads_rows_in_batches(connector):
+    users = [User(f"User {number}", f"user{number}@example.com", "secret", connector=connector) for number in range(5)]
+    query = "SELECT user_id, name FROM Users ORDER BY name"
+    with connector.profile() as profile:
+        streamed = list(connector.stream(query, batch_size=2))
+    assert streamed == connector.execute(query)
+    assert {row['user_id'] for row in streamed} == {user.user_id for user in users}
+    [stats] = profile.stats()
+    assert (stats['calls'], stats['rows'], stats['call_site']) == (1, 5, "test_backends.test_stream_reads_rows_in_batches")
+
+    tuples = connector.stream("SELECT user_id, name FROM Users WHERE name = %s", ("User 3",), as_dict=False)
+    assert list(tuples) == [(users[3].user_id, "User 3")]
+
+    rows = connector.stream(query, batch_size=2)
+    assert next(rows)['name'] == "User 0"
+    # other queries run while the stream is open, and closing it early is fine
+    assert connector.execute("SELECT COUNT(*) AS count FROM Users", fetchall=False)['count'] == 5
+    rows.close()
+    with pytest.raises(ValueError):
+        next(connector.stream(query, batch_size=0))
+
+
+def test_streaming_loaders(connector):
+    alice = User("Alice", "alice@example.com", "secret", connector=connector)
+    bob = User("Bob", "bob@example.com", "secret", connector=connector)
+    group = Group(admin=alice, name="Flat", members=[bob], connector=connector)
+    expenses = [Expense(amount=10 + number, payer=alice, group=group, participants={alice: 5, bob: 5 + number},
+                        description=f"Bill {number}", connector=connector) for number in range(5)]
+    for _ in range(3):
+        Transaction.settle_up(bob, alice, '1.00', group)
+
+    streamed = list(Expense.stream_group_expenses(group.group_id, connector, batch_size=2))
+    assert [expense.description for expense in streamed] == [expense.description for expense in expenses]
+    assert streamed[4].payer.name == "Alice" and streamed[0].group is streamed[4].group
+    assert {user.name: amount for user, amount in streamed[4].participants.items()} == {"Alice": 5, "Bob": 9}
+
+    history = list(Transaction.stream_transactions_for_user(bob, batch_size=2))
+    assert [transaction.trans_id for transaction in history] == \
+           [transaction.trans_id for transaction in Transaction.get_transactions_for_user(bob)]
+    assert len(history) == 3 and history[0].payee.name == "Alice"
+
+
+def test_bench_teardown_leaves_ledger_consistent(connector):
+    alice = User("Alice", "alice@example.com", "secret", connector=connector)
+    bob = User("Bob", "bob@example.com", "secret", connector=connector)
+    carol = User("Carol", "carol@example.com", "secret", connector=connector)
+    group = Group(admin=alice, name="Bench", members=[bob, carol], connector=connector)
+    expenses = [Expense(amount=30, payer=payer, group=group, participants={alice: 10, bob: 10, carol: 10},
+                        description=f"Bill {number}", connector=connector) for number, payer in enumerate([alice, bob, alice])]
+    Transaction.settle_up(carol, alice, '5.00', group)
+
+    # the teardown of the bench scripts: expenses through the ledger, then the group and its users
+    Ledger.delete_expenses(connector, [expense.expense_id for expense in expenses], chunk_size=2)
+    user_ids = (alice.user_id, bob.user_id, carol.user_id)
+    assert Ledger.get_due_total(bob.user_id, connector) == (Decimal('0.00'), 0)
+    with connector.transaction():
+        for table in ("GroupDebts", "GroupBalances", "GroupMembers", "GroupDetails"):
+            connector.execute(f"DELETE FROM {table} WHERE group_id = %s", (group.group_id,))
+        connector.execute("DELETE FROM UserDueTotals WHERE user_id IN (%s, %s, %s)", user_ids)
+        connector.execute("DELETE FROM Users WHERE user_id IN (%s, %s, %s)", user_ids)
+
+    assert Ledger.verify_dues(connector) == [] and Ledger.verify(connector) == []
+    for table in ("Users", "GroupDetails", "Expenses", "ExpenseParticipants", "Transactions", "OpenDues", "UserDueTotals"):
+        assert connector.execute(f"SELECT COUNT(*) AS count FROM {table}", fetchall=False)['count'] == 0
+
+
+def test_identity_map_counts_one_lookup_per_load(tmp_path):
+    connector = Connector(backend="sqlite", database=str(tmp_path / "mapped.db"), identity_map_size=10)
+    alice = User("Alice", "alice@example.com", "secret", connector=connector)
+    connector.identity_map.clear()
+    try:
+        first = User.get_user(alice.user_id, connector)
+        assert (connector.identity_map.misses, connector.identity_map.hits) == (1, 0)
+        assert User.get_user(alice.user_id, connector) is first
+        assert (connector.identity_map.misses, connector.identity_map.hits) == (1, 1)
+
+        alice.name = "Alicia"
+        assert User.get_user(alice.user_id, connector) is first and first.name == "Alicia"
+    finally:
+        connector.close()
+
+
+def test_id_shaped_text_is_stored_as_text(connector):
+    looks_like_an_id = str(new_id(USER))
+    alice = User(looks_like_an_id, "alice@example.com", "secret", connector=connector)
+    group = Group(admin=alice, name=looks_like_an_id, members=[], connector=connector)
+    group.description = looks_like_an_id
+
+    assert User.get_user(alice.user_id, connector).name == looks_like_an_id
+    loaded = Group.get_group(group.group_id, connector)
+    assert (loaded.name, loaded.description) == (looks_like_an_id, looks_like_an_id)
+    assert connector.execute("SELECT typeof(name) AS type FROM Users", fetchall=False)['type'] == "text"
+    [row] = connector.execute("SELECT user_id FROM Users WHERE name = %s", (looks_like_an_id,))
+    assert row['user_id'] == alice.user_id
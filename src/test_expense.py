@@ -1,14 +1,16 @@
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, MagicMock, patch
 from datetime import datetime
 from expense import Expense
 from user import User
 from group import Group
 from connector import Connector
+from money import Money
 
 class TestExpense(unittest.TestCase):
     def setUp(self):
-        self.mock_connector = Mock(spec=Connector)
+        self.mock_connector = MagicMock(spec=Connector)
+        self.mock_connector.identity_map = None
         self.mock_user1 = Mock(spec=User, user_id='U1', name='User1', email='user1@example.com')
         self.mock_user2 = Mock(spec=User, user_id='U2', name='User2', email='user2@example.com')
         self.mock_group = Mock(spec=Group, group_id='G1')
@@ -16,9 +18,12 @@ class TestExpense(unittest.TestCase):
         # Mock the database response for new expense insertion
         self.mock_connector.execute.return_value = None
 
-        # Mock User.get_user and Group.get_group
-        User.get_user = Mock(return_value=self.mock_user1)
-        Group.get_group = Mock(return_value=self.mock_group)
+        # Mock User.get_user and Group.get_group for the duration of each test
+        for target, attribute, mock in ((User, 'get_user', Mock(return_value=self.mock_user1)),
+                                        (Group, 'get_group', Mock(return_value=self.mock_group))):
+            patcher = patch.object(target, attribute, mock)
+            patcher.start()
+            self.addCleanup(patcher.stop)
 
         # Mock expense data for get_expense test
         self.mock_expense_data = {
@@ -31,8 +36,8 @@ class TestExpense(unittest.TestCase):
             'timestamp': datetime.now()
         }
 
-        # Mock uuid4 to return a predictable value
-        with patch('expense.uuid4', return_value='1234'):
+        # Mock new_id to return a predictable value
+        with patch('expense.new_id', return_value='E1234'):
             self.expense = Expense(
                 amount=100.0,
                 payer=self.mock_user1,
@@ -51,7 +56,7 @@ class TestExpense(unittest.TestCase):
             description="Test expense",
             connector=self.mock_connector
         )
-        self.assertEqual(expense.amount, 100.0)
+        self.assertEqual(expense.amount, Money('100.00'))
         self.assertEqual(expense.payer, self.mock_user1)
         self.assertEqual(expense.group, self.mock_group)
         self.assertEqual(expense.description, "Test expense")
@@ -95,16 +100,16 @@ class TestExpense(unittest.TestCase):
         )
 
         # Assert that the expense properties have been updated
-        self.assertEqual(expense.amount, 150.0)
+        self.assertEqual(expense.amount, Money('150.00'))
         self.assertEqual(expense.payer, self.mock_user2)
         self.assertEqual(expense.tag, "Food")
         self.assertEqual(expense.description, "Updated test expense")
 
         # Assert that the participants have been updated correctly
         self.assertEqual(len(expense.participants), 3)
-        self.assertEqual(expense.participants[self.mock_user1], 50.0)
-        self.assertEqual(expense.participants[self.mock_user2], 70.0)
-        self.assertEqual(expense.participants[mock_user3], 30.0)
+        self.assertEqual(expense.participants[self.mock_user1], Money('50.00'))
+        self.assertEqual(expense.participants[self.mock_user2], Money('70.00'))
+        self.assertEqual(expense.participants[mock_user3], Money('30.00'))
 
         # Assert that the database update methods were called
         self.mock_connector.execute.assert_called()
@@ -160,8 +165,74 @@ class TestExpense(unittest.TestCase):
         expense.calculate_and_split_expense('equal', participants)
 
         self.mock_connector.execute.assert_called()
-        self.assertEqual(expense.participants[self.mock_user1], 50.0)
-        self.assertEqual(expense.participants[self.mock_user2], 50.0)
+        self.assertEqual(expense.participants[self.mock_user1], Money('50.00'))
+        self.assertEqual(expense.participants[self.mock_user2], Money('50.00'))
+
+    def test_calculate_and_split_expense_equal_sums_exactly(self):
+        expense = Expense(
+            amount=100.0,
+            payer=self.mock_user1,
+            group=self.mock_group,
+            participants={self.mock_user1: -100.0, self.mock_user2: 100.0},
+            connector=self.mock_connector
+        )
+        mock_user3 = Mock(spec=User, user_id='U3', name='User3', email='user3@example.com')
+
+        expense.calculate_and_split_expense('equal', [self.mock_user1, self.mock_user2, mock_user3])
+
+        self.assertEqual(list(expense.participants.values()), [Money('33.34'), Money('33.33'), Money('33.33')])
+        self.assertEqual(sum(expense.participants.values()), expense.amount)
+
+    def test_calculate_and_split_expense_percentages(self):
+        expense = Expense(
+            amount=10.0,
+            payer=self.mock_user1,
+            group=self.mock_group,
+            participants={self.mock_user1: -10.0, self.mock_user2: 10.0},
+            connector=self.mock_connector
+        )
+
+        expense.calculate_and_split_expense('percentages', [self.mock_user1, self.mock_user2], percentages=[66.67, 33.33])
+        self.assertEqual(expense.participants[self.mock_user1], Money('6.67'))
+        self.assertEqual(expense.participants[self.mock_user2], Money('3.33'))
+
+        with self.assertRaises(ValueError):
+            expense.calculate_and_split_expense('percentages', [self.mock_user1, self.mock_user2], percentages=[50, 40])
+
+    def test_split_expense_writes_only_the_diff(self):
+        mock_user3 = Mock(spec=User, user_id='U3', name='User3', email='user3@example.com')
+        current_rows = [{'user_id': 'U1', 'amount': 0.0, 'settled': 'SETTLED'},
+                        {'user_id': 'U2', 'amount': 40.0, 'settled': 'PARTIAL'},
+                        {'user_id': 'U3', 'amount': 60.0, 'settled': 'NO'}]
+        self.mock_connector.execute.side_effect = \
+            lambda query, params=None: current_rows if query.startswith("SELECT user_id, amount, settled") else None
+        self.mock_connector.execute_many.reset_mock()
+
+        self.expense.split_expense(100.0, {self.mock_user1: 0.0, self.mock_user2: 25.0, mock_user3: 75.0})
+
+        queries = [call.args[0] for call in self.mock_connector.execute.call_args_list]
+        self.assertNotIn("UPDATE Expenses SET amount = %s WHERE expense_id = %s", queries)
+        self.assertFalse(any(query.startswith("DELETE") for query in queries))
+        self.assertEqual(self.mock_connector.execute_many.call_count, 1)
+        query, rows = self.mock_connector.execute_many.call_args.args
+        self.assertTrue(query.startswith("UPDATE ExpenseParticipants"))
+        # U1 is unchanged, so its SETTLED state is kept
+        self.assertEqual([row[3] for row in rows], ['U2', 'U3'])
+
+        self.mock_connector.execute.reset_mock()
+        self.mock_connector.execute_many.reset_mock()
+        self.expense.calculate_and_split_expense('shares', [self.mock_user1, self.mock_user2], shares=[1, 3])
+
+        queries = [call.args[0] for call in self.mock_connector.execute.call_args_list]
+        self.assertIn("DELETE FROM ExpenseParticipants WHERE expense_id = %s AND user_id IN (%s)", queries)
+        self.assertEqual([row[3] for row in self.mock_connector.execute_many.call_args.args[1]], ['U1', 'U2'])
+        self.assertEqual(self.expense.participants[self.mock_user2], Money('75.00'))
+
+    def test_calculate_and_split_expense_invalid_options(self):
+        with self.assertRaises(ValueError):
+            self.expense.calculate_and_split_expense('equal', [self.mock_user1], shares=[1])
+        with self.assertRaises(ValueError):
+            self.expense.calculate_and_split_expense('thirds', [self.mock_user1])
 
     def test_calculate_and_split_expense_unequal(self):
         expense = Expense(
@@ -180,79 +251,184 @@ class TestExpense(unittest.TestCase):
         expense.calculate_and_split_expense('unequal', participants, amounts=amounts)
 
         self.mock_connector.execute.assert_called()
-        self.assertEqual(expense.participants[self.mock_user1], 25.0)
-        self.assertEqual(expense.participants[self.mock_user2], 75.0)
+        self.assertEqual(expense.participants[self.mock_user1], Money('25.00'))
+        self.assertEqual(expense.participants[self.mock_user2], Money('75.00'))
 
     def test_get_expense(self):
-        self.mock_connector.execute.return_value = [self.mock_expense_data]
+        participant_rows = [
+            {'expense_id': 'E1', 'user_id': 'U1', 'amount': 0.0, 'name': 'User1', 'email': 'user1@example.com', 'created': datetime.now()},
+            {'expense_id': 'E1', 'user_id': 'U2', 'amount': 100.0, 'name': 'User2', 'email': 'user2@example.com', 'created': datetime.now()}
+        ]
+        self.mock_connector.execute.reset_mock()
+        self.mock_connector.execute.side_effect = [self.mock_expense_data, participant_rows]
         expense = Expense.get_expense('E1', self.mock_connector)
         self.assertIsInstance(expense, Expense)
+        self.assertEqual(expense.amount, Money('100.00'))
+        self.assertEqual(expense.description, 'Test expense')
+        # Only the expense row is read until the payer, group or participants are used
+        self.assertEqual(self.mock_connector.execute.call_count, 1)
+
+        self.assertEqual({user.user_id: amount for user, amount in expense.participants.items()}, {'U1': Money('0.00'), 'U2': Money('100.00')})
+        # The payer is one of the participants, so it is not queried again
+        self.assertEqual(expense.payer.user_id, 'U1')
+        self.assertEqual(self.mock_connector.execute.call_count, 2)
+        with patch.object(Group, 'get_groups', return_value=[self.mock_group]) as mock_get_groups:
+            self.assertEqual(expense.group, self.mock_group)
+            self.assertEqual(expense.group, self.mock_group)
+        mock_get_groups.assert_called_once_with(['G1'], self.mock_connector)
+
+    def test_expense_initialization_with_expense_id(self):
+        self.mock_connector.execute.reset_mock()
+        self.mock_connector.execute.side_effect = [self.mock_expense_data]
+        expense = Expense(expense_id='E1', amount=100.0, description='Test expense', connector=self.mock_connector)
+        self.assertEqual((expense.expense_id, expense.amount, expense.description), ('E1', Money('100.00'), 'Test expense'))
+        # One query for the row; payer, group and participants are loaded like those of Expense.from_row
+        self.assertEqual(self.mock_connector.execute.call_count, 1)
+        User.get_user.assert_not_called()
+        Group.get_group.assert_not_called()
+        with patch.object(User, 'get_users', return_value=[self.mock_user1]) as mock_get_users:
+            self.assertEqual(expense.payer, self.mock_user1)
+        mock_get_users.assert_called_once_with(['U1'], self.mock_connector)
+
+        self.mock_connector.execute.side_effect = [self.mock_expense_data]
+        with self.assertRaises(ValueError):
+            Expense(expense_id='E1', amount=50.0, connector=self.mock_connector)
+        self.mock_connector.execute.side_effect = [None]
+        with self.assertRaises(ValueError):
+            Expense(expense_id='E2', connector=self.mock_connector)
+
+    def test_get_group_expenses(self):
+        expense_rows = [
+            {'expense_id': 'E1', 'amount': 30.0, 'paid_by': 'U1', 'group_id': 'G1', 'tag': None, 'description': 'Lunch', 'timestamp': datetime.now()},
+            {'expense_id': 'E2', 'amount': 60.0, 'paid_by': 'U2', 'group_id': 'G1', 'tag': 'Food', 'description': 'Dinner', 'timestamp': datetime.now()}
+        ]
+        user_columns = {
+            'U1': {'name': 'User1', 'email': 'user1@example.com', 'created': datetime.now()},
+            'U2': {'name': 'User2', 'email': 'user2@example.com', 'created': datetime.now()},
+            'U3': {'name': 'User3', 'email': 'user3@example.com', 'created': datetime.now()},
+        }
+        participant_rows = [dict(user_columns[user_id], expense_id=expense_id, user_id=user_id, amount=amount)
+                            for expense_id, user_id, amount in [('E1', 'U1', 0.0), ('E1', 'U2', 30.0), ('E2', 'U2', 0.0),
+                                                                ('E2', 'U1', 30.0), ('E2', 'U3', 30.0)]]
+        self.mock_connector.execute.reset_mock()
+        self.mock_connector.execute.side_effect = [expense_rows, participant_rows]
+
+        with patch.object(Group, 'get_groups', return_value=[self.mock_group]) as mock_get_groups:
+            expenses = Expense.get_group_expenses('G1', self.mock_connector)
+            self.assertEqual([expense.expense_id for expense in expenses], ['E1', 'E2'])
+            self.assertEqual(self.mock_connector.execute.call_count, 1)
+
+            self.assertIs(expenses[0].group, expenses[1].group)
+            mock_get_groups.assert_called_once_with(['G1'], self.mock_connector)
+        # Participants of both expenses come from one query, and payers are taken from them
+        self.assertIn('U3', [user.user_id for user in expenses[1].participants])
+        self.assertEqual(self.mock_connector.execute.call_args[0][1], ('E1', 'E2'))
+        self.assertIs(expenses[0].payer, [user for user in expenses[1].participants if user.user_id == 'U1'][0])
+        self.assertEqual(expenses[1].payer.user_id, 'U2')
+        self.assertEqual(self.mock_connector.execute.call_count, 2)
+
+    def test_get_group_expenses_without_expenses(self):
+        self.mock_connector.execute.side_effect = [[]]
+        self.assertEqual(Expense.get_group_expenses('G1', self.mock_connector), [])
 
+    def test_get_group_expense_summaries(self):
+        rows = [{'expense_id': 'E1', 'amount': 30.0, 'description': 'Lunch', 'tag': None, 'payer_name': 'User1',
+                 'group_name': 'Trip', 'open_shares': 1}]
+        self.mock_connector.execute.reset_mock()
+        self.mock_connector.execute.return_value = rows
 
+        self.assertEqual(Expense.get_group_expense_summaries('G1', self.mock_connector), rows)
+        query, params = self.mock_connector.execute.call_args[0]
+        self.assertIn("LEFT JOIN ExpenseParticipants", query)
+        self.assertEqual(params, ('G1',))
+        self.mock_connector.execute.assert_called_once()
 
-    
     def test_get_expenses(self):
         mock_expense_data = [
             {'expense_id': 'E1', 'amount': 100.0, 'paid_by': 'U1', 'group_id': 'G1', 'tag': None, 'description': 'Test expense 1', 'timestamp': datetime.now()},
             {'expense_id': 'E2', 'amount': 200.0, 'paid_by': 'U2', 'group_id': 'G1', 'tag': None, 'description': 'Test expense 2', 'timestamp': datetime.now()}
         ]
+        mock_user_data = [
+            {'user_id': 'U1', 'name': 'User1', 'email': 'user1@example.com', 'created': datetime.now()},
+            {'user_id': 'U2', 'name': 'User2', 'email': 'user2@example.com', 'created': datetime.now()}
+        ]
         mock_participant_data = [
-            [{'user_id': 'U1', 'amount': -100.0}, {'user_id': 'U2', 'amount': 100.0}],
-            [{'user_id': 'U2', 'amount': -200.0}, {'user_id': 'U1', 'amount': 200.0}]
+            {'expense_id': 'E1', 'user_id': 'U1', 'amount': -100.0, 'name': 'User1', 'email': 'user1@example.com', 'created': datetime.now()},
+            {'expense_id': 'E1', 'user_id': 'U2', 'amount': 100.0, 'name': 'User2', 'email': 'user2@example.com', 'created': datetime.now()},
+            {'expense_id': 'E2', 'user_id': 'U2', 'amount': -200.0, 'name': 'User2', 'email': 'user2@example.com', 'created': datetime.now()},
+            {'expense_id': 'E2', 'user_id': 'U1', 'amount': 200.0, 'name': 'User1', 'email': 'user1@example.com', 'created': datetime.now()}
         ]
-        
+
         def mock_execute(query, params=None):
-            print(f"Mock execute called with query: {query}")  # Debug print
-            print(f"Params: {params}")  # Debug print
-            if "SELECT * FROM Expenses" in query or "SELECT expense_id FROM Expenses" in query:
-                return [mock_expense_data[0]] if params[0] == 'E1' else [mock_expense_data[1]]
-            elif "SELECT user_id, amount FROM ExpenseParticipants" in query:
-                result = mock_participant_data[0] if params[0] == 'E1' else mock_participant_data[1]
-                print(f"Returning participant data: {result}")  # Debug print
-                return result
+            if "FROM Expenses WHERE expense_id IN" in query:
+                return [row for row in mock_expense_data if row['expense_id'] in params]
+            elif "FROM Users WHERE user_id IN" in query:
+                return [row for row in mock_user_data if row['user_id'] in params]
+            elif "FROM ExpenseParticipants" in query:
+                return [row for row in mock_participant_data if row['expense_id'] in params]
             return []
 
+        self.mock_connector.execute.reset_mock()
         self.mock_connector.execute.side_effect = mock_execute
 
-        # Mock User.get_user and Group.get_group to return dummy objects
-        User.get_user = Mock(side_effect=lambda user_id, connector: Mock(spec=User, user_id=user_id))
-        Group.get_group = Mock(return_value=Mock(spec=Group, group_id='G1'))
-
-        expenses = Expense.get_expenses(['E1', 'E2'], self.mock_connector)
-        
-        print(f"Number of expenses returned: {len(expenses)}")  # Debug print
-        for expense in expenses:
-            print(f"Expense ID: {expense.expense_id}, Amount: {expense.amount}")
-            print(f"Participants: {expense.participants}")  # Debug print
+        expenses = Expense.get_expenses(['E2', 'E1'], self.mock_connector)
 
         self.assertEqual(len(expenses), 2)
         self.assertIsInstance(expenses[0], Expense)
         self.assertIsInstance(expenses[1], Expense)
-        
-        # Check first expense
-        self.assertEqual(expenses[0].expense_id, 'E1')
-        self.assertEqual(expenses[0].amount, 100.0)
-        self.assertEqual(expenses[0].payer.user_id, 'U1')
-        self.assertEqual(expenses[0].group.group_id, 'G1')
-        self.assertEqual(expenses[0].description, 'Test expense 1')
-        self.assertIsNone(expenses[0].tag)
-        self.assertEqual(len(expenses[0].participants), 2)
-        
-        # Check second expense
-        self.assertEqual(expenses[1].expense_id, 'E2')
-        self.assertEqual(expenses[1].amount, 200.0)
-        self.assertEqual(expenses[1].payer.user_id, 'U2')
-        self.assertEqual(expenses[1].group.group_id, 'G1')
-        self.assertEqual(expenses[1].description, 'Test expense 2')
-        self.assertIsNone(expenses[1].tag)
-        self.assertEqual(len(expenses[1].participants), 2)
 
-        # Check participants for both expenses
+        # Input order is kept
+        self.assertEqual(expenses[0].expense_id, 'E2')
+        self.assertEqual(expenses[0].amount, Money('200.00'))
+        self.assertEqual(expenses[0].description, 'Test expense 2')
+        self.assertIsNone(expenses[0].tag)
+        self.assertEqual(expenses[1].expense_id, 'E1')
+        self.assertEqual(expenses[1].amount, Money('100.00'))
+        self.assertEqual(expenses[1].description, 'Test expense 1')
+        self.assertEqual(self.mock_connector.execute.call_count, 1)
+
+        # The first payer accessed loads the payers of the whole chunk
+        self.assertEqual(expenses[0].payer.user_id, 'U2')
+        self.assertEqual(expenses[1].payer.user_id, 'U1')
+        self.assertEqual(self.mock_connector.execute.call_count, 2)
+
+        with patch.object(Group, 'get_groups', return_value=[Mock(spec=Group, group_id='G1')]) as mock_get_groups:
+            self.assertEqual(expenses[0].group.group_id, 'G1')
+            self.assertIs(expenses[0].group, expenses[1].group)
+            mock_get_groups.assert_called_once()
+
+        # Participants for both expenses, sharing one User object per user with the payers
         for expense in expenses:
             self.assertEqual(len(expense.participants), 2)
             self.assertIn('U1', [user.user_id for user in expense.participants.keys()])
             self.assertIn('U2', [user.user_id for user in expense.participants.keys()])
+        self.assertIs(expenses[0].payer, [user for user in expenses[1].participants if user.user_id == 'U2'][0])
+        self.assertEqual(self.mock_connector.execute.call_count, 3)
+
+    def test_get_expenses_reports_missing_ids_in_chunks(self):
+        rows = {f'E{i}': {'expense_id': f'E{i}', 'amount': 10.0, 'paid_by': 'U1', 'group_id': 'G1', 'tag': None,
+                          'description': None, 'timestamp': datetime.now()} for i in range(5)}
+
+        def mock_execute(query, params=None):
+            if "FROM Expenses WHERE expense_id IN" in query:
+                return [rows[expense_id] for expense_id in params if expense_id in rows]
+            return []
 
+        self.mock_connector.execute.reset_mock()
+        self.mock_connector.execute.side_effect = mock_execute
+        missing = []
+        with patch.object(User, 'get_users', return_value=[self.mock_user1]) as mock_get_users:
+            expenses = Expense.get_expenses(['E0', 'X1', 'E1', 'E2', 'X2', 'E3', 'E4'], self.mock_connector,
+                                            chunk_size=3, missing=missing)
+            payers = [expense.payer for expense in expenses]
+
+        self.assertEqual([expense.expense_id for expense in expenses], ['E0', 'E1', 'E2', 'E3', 'E4'])
+        self.assertEqual(missing, ['X1', 'X2'])
+        self.assertEqual(payers, [self.mock_user1] * 5)
+        # the payer is loaded once and reused by later chunks
+        mock_get_users.assert_called_once()
+        # one expenses query for each of the three chunks
+        self.assertEqual(self.mock_connector.execute.call_count, 3)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
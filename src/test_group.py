@@ -1,14 +1,16 @@
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, MagicMock, patch
 from datetime import datetime
+from decimal import Decimal
 from uuid import uuid4
 from group import Group
 from user import User
-from connector import Connector
+from connector import Connector, IdentityMap
 
 @pytest.fixture
 def mock_connector():
-    connector = Mock(spec=Connector)
+    connector = MagicMock(spec=Connector)
+    connector.identity_map = None
     connector.execute.return_value = []
     return connector
 
@@ -163,37 +165,92 @@ def test_add_members(test_group, mock_user, mock_connector):
     # Mock the database checks and operations
     mock_connector.execute.side_effect = [
         [],  # No existing members
-        None  # Insertion successful
     ]
     
     test_group.add_members([user.user_id for user in new_members])
     
     assert all(new_member.user_id in [member.user_id for member in test_group.members] for new_member in new_members)
-    assert mock_connector.execute.call_count == 2
+    assert mock_connector.execute.call_count == 1
+    # all new members are inserted in one batch
+    mock_connector.execute_many.assert_called_once_with(
+        'INSERT INTO GroupMembers (group_id, user_id) VALUES (%s, %s)',
+        [(test_group.group_id, 'new1_id'), (test_group.group_id, 'new2_id')])
 
 
-@patch('user.User.get_user')
-@patch('user.User.get_users')
-def test_get_group(mock_get_users, mock_get_user, mock_connector, admin_user, member_users):
-    mock_connector.execute.side_effect = [
-        [{'group_id': 'test_group', 'name': 'Test Group', 'description': 'Test Description', 'admin_id': admin_user.user_id}],
-        [{'user_id': member.user_id} for member in member_users]
-    ]
-    mock_get_user.return_value = admin_user
-    mock_get_users.return_value = member_users
-    
-    with patch.object(Group, '__init__', return_value=None):
-        group = Group.get_group('test_group', mock_connector)
-        group._connector = mock_connector
-        group._group_id = 'test_group'
-        group._name = 'Test Group'
-        group._admin = admin_user
-        group._description = 'Test Description'
-        group._members = member_users
-        group._created = datetime.now()
-    
+def _joined_row(group_id, group_name, admin_id, user_id, name):
+    return {'group_id': group_id, 'group_name': group_name, 'description': 'Test Description',
+            'admin_id': admin_id, 'group_created': datetime.now(),
+            'user_id': user_id, 'name': name, 'email': f'{user_id}@example.com', 'created': datetime.now()}
+
+
+def test_get_group(mock_connector):
+    mock_connector.execute.side_effect = [[
+        _joined_row('test_group', 'Test Group', 'admin_id', 'admin_id', 'Admin User'),
+        _joined_row('test_group', 'Test Group', 'admin_id', 'member1_id', 'Member 1'),
+        _joined_row('test_group', 'Test Group', 'admin_id', 'member2_id', 'Member 2'),
+    ]]
+
+    group = Group.get_group('test_group', mock_connector)
+
     assert isinstance(group, Group)
     assert group.name == 'Test Group'
-    assert group.admin == admin_user
-    assert set(group.members) == set(member_users)
+    assert group.admin.user_id == 'admin_id'
+    assert [member.user_id for member in group.members] == ['member1_id', 'member2_id']
+    assert group.connector is mock_connector
+    # group, admin and members all come back from a single query
+    assert mock_connector.execute.call_count == 1
+
+
+def test_get_groups_reuses_identity_map(mock_connector):
+    mock_connector.identity_map = IdentityMap(capacity=10)
+    mock_connector.execute.side_effect = [[
+        _joined_row('g1', 'Group 1', 'admin_id', 'admin_id', 'Admin User'),
+        _joined_row('g1', 'Group 1', 'admin_id', 'member1_id', 'Member 1'),
+    ], [
+        _joined_row('g2', 'Group 2', 'member1_id', 'member1_id', 'Member 1'),
+    ]]
+
+    group = Group.get_group('g1', mock_connector)
+    groups = Group.get_groups(['g1', 'g2'], mock_connector)
+
+    assert groups[0] is group
+    # only g2 is queried the second time, and its admin is the same User object as g1's member
+    assert mock_connector.execute.call_args[0][1] == ('g2', 'g2')
+    assert groups[1].admin is group.members[0]
+
+    mock_connector.execute.side_effect = None
+    group.description = 'Changed'
+    # the group stays mapped, so loading it again returns the same, updated object
+    assert Group.get_group('g1', mock_connector) is group
+    assert group.description == 'Changed'
+    stats = mock_connector.identity_map.stats()
+    assert (stats['hits'], stats['misses']) == (2, 2)
+
+
+def test_get_group_not_found(mock_connector):
+    with pytest.raises(ValueError, match="Group with ID missing not found"):
+        Group.get_group('missing', mock_connector)
+
+
+def test_get_groups_shares_users_between_groups(mock_connector):
+    mock_connector.execute.return_value = [
+        _joined_row('G1', 'Group 1', 'admin_id', 'admin_id', 'Admin User'),
+        _joined_row('G2', 'Group 2', 'member1_id', 'member1_id', 'Member 1'),
+        _joined_row('G1', 'Group 1', 'admin_id', 'member1_id', 'Member 1'),
+        _joined_row('G2', 'Group 2', 'member1_id', 'admin_id', 'Admin User'),
+    ]
+
+    groups = Group.get_groups(['G2', 'G1', 'unknown'], mock_connector)
+
+    assert [group.group_id for group in groups] == ['G2', 'G1']
+    assert groups[0].admin is groups[1].members[0]
+    assert groups[1].admin is groups[0].members[0]
+    assert mock_connector.execute.call_count == 1
+
+
+def test_simplify_debts(test_group, admin_user, member_users):
+    balances = {'admin_id': Decimal('30.00'), 'member1_id': Decimal('-20.00'), 'member2_id': Decimal('-10.00')}
+    with patch('group.Ledger.get_balances', return_value=balances):
+        transfers = test_group.simplify_debts()
 
+    assert transfers == [(member_users[0], admin_user, Decimal('20.00')), (member_users[1], admin_user, Decimal('10.00'))]
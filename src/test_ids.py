@@ -0,0 +1,39 @@
+import pytest
+from uuid import UUID
+from ids import new_id, uuid7, to_binary, from_binary, encode_params, decode_row, is_id, as_id, Id, EXPENSE, USER
+
+
+def test_uuid7_is_time_ordered():
+    ids = [uuid7() for _ in range(5000)]
+    assert all(value.version == 7 for value in ids)
+    assert [value.bytes for value in ids] == sorted(value.bytes for value in ids)
+    assert len(set(ids)) == len(ids)
+
+
+def test_binary_round_trip():
+    expense_id = new_id(EXPENSE)
+    assert is_id(expense_id) and expense_id.startswith("E")
+    binary = to_binary(expense_id)
+    assert len(binary) == 16 and binary == UUID(expense_id[1:]).bytes
+    assert from_binary(EXPENSE, binary) == expense_id
+    with pytest.raises(ValueError):
+        to_binary("Dinner")
+
+
+def test_encode_params_only_converts_ids():
+    user_id = new_id(USER)
+    assert encode_params([user_id, "Dinner", 12, None]) == (to_binary(user_id), "Dinner", 12, None)
+    # text in the id format, e.g. a name, is only sent as bytes once it is marked as an Id
+    name = str(new_id(USER))
+    assert encode_params([name]) == (name,) and type(encode_params([name])[0]) is str
+    assert encode_params([as_id(name)]) == (to_binary(name),)
+    assert as_id(" Dinner ") == " Dinner " and isinstance(as_id(f" {name} "), Id)
+    plain = encode_params([user_id, "Dinner"], binary=False)
+    assert plain == (user_id, "Dinner") and type(plain[0]) is str
+
+
+def test_decode_row_uses_column_names():
+    user_id, expense_id = new_id(USER), new_id(EXPENSE)
+    row = {'debtor_id': to_binary(user_id), 'expense_id': bytearray(to_binary(expense_id)), 'name': b'0123456789abcdef'}
+    assert decode_row(row) == {'debtor_id': user_id, 'expense_id': expense_id, 'name': b'0123456789abcdef'}
+    assert decode_row(('data',)) == ('data',)
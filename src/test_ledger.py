@@ -0,0 +1,118 @@
+import unittest
+from unittest.mock import MagicMock
+from decimal import Decimal
+from ledger import Ledger
+from connector import Connector
+
+
+def _debt(group_id, creditor_id, debtor_id, amount, expense_id='E1'):
+    return {'expense_id': expense_id, 'group_id': group_id, 'creditor_id': creditor_id, 'debtor_id': debtor_id,
+            'amount': Decimal(amount)}
+
+
+class TestLedger(unittest.TestCase):
+    def setUp(self):
+        self.mock_connector = MagicMock(spec=Connector)
+        self.mock_connector.identity_map = None
+        self.mock_connector.unit_of_work = {}
+
+    def test_track_applies_difference_in_same_unit_of_work(self):
+        self.mock_connector.execute.side_effect = [
+            [_debt('G1', 'U1', 'U2', '30.00'), _debt('G1', 'U1', 'U3', '30.00')],
+            None,
+            [_debt('G1', 'U1', 'U2', '10.00'), _debt('G1', 'U1', 'U3', '30.00')],
+        ]
+
+        with Ledger.track(self.mock_connector, ['E1', 'E1']):
+            self.mock_connector.execute("UPDATE ExpenseParticipants SET amount = %s WHERE expense_id = %s AND user_id = %s",
+                                        (10, 'E1', 'U2'))
+
+        self.assertEqual(self.mock_connector.execute.call_args_list[0][0][1], ('E1',))
+        debts_call, balances_call, dues_call, totals_call = self.mock_connector.execute_many.call_args_list
+        self.assertIn("GroupDebts", debts_call[0][0])
+        self.assertEqual(debts_call[0][1], [('G1', 'U1', 'U2', Decimal('-20.00'))])
+        self.assertEqual(balances_call[0][1], [('G1', 'U1', Decimal('-20.00')), ('G1', 'U2', Decimal('20.00'))])
+        self.assertIn("OpenDues", dues_call[0][0])
+        self.assertEqual(dues_call[0][1], [('U2', 'E1', 'G1', Decimal('10.00'))])
+        self.assertEqual(totals_call[0][1], [('U2', Decimal('-20.00'), 0)])
+        self.mock_connector.transaction.assert_called()
+        self.assertEqual(self.mock_connector.unit_of_work, {'ledger.tracked': set()})
+
+    def test_nested_track_does_not_count_twice(self):
+        self.mock_connector.execute.side_effect = [[], [_debt('G1', 'U1', 'U2', '5.00')]]
+
+        with Ledger.track(self.mock_connector, ['E1']):
+            with Ledger.track(self.mock_connector, ['E1']):
+                pass
+
+        # one snapshot before and one after, both taken by the outer block
+        self.assertEqual(self.mock_connector.execute.call_count, 2)
+        debts_call = self.mock_connector.execute_many.call_args_list[0]
+        self.assertEqual(debts_call[0][1], [('G1', 'U1', 'U2', Decimal('5.00'))])
+
+    def test_track_without_changes_writes_nothing(self):
+        self.mock_connector.execute.side_effect = [[_debt('G1', 'U1', 'U2', '5.00')], [_debt('G1', 'U1', 'U2', '5.00')]]
+
+        with Ledger.track(self.mock_connector, ['E1']):
+            pass
+
+        self.mock_connector.execute_many.assert_not_called()
+
+    def test_track_maintains_open_dues(self):
+        self.mock_connector.execute.side_effect = [
+            [_debt('G1', 'U1', 'U2', '30.00', 'E1'), _debt('G1', 'U3', 'U2', '5.00', 'E2')],
+            [_debt('G1', 'U3', 'U2', '5.00', 'E2'), _debt('G1', 'U1', 'U4', '12.50', 'E1')],
+        ]
+
+        with Ledger.track(self.mock_connector, ['E1', 'E2']):
+            pass
+
+        calls = {call[0][0].split()[0] + " " + call[0][0].split()[2]: call[0][1]
+                 for call in self.mock_connector.execute_many.call_args_list}
+        self.assertEqual(calls["DELETE OpenDues"], [('U2', 'E1')])
+        self.assertEqual(calls["INSERT OpenDues"], [('U4', 'E1', 'G1', Decimal('12.50'))])
+        self.assertEqual(calls["INSERT UserDueTotals"], [('U2', Decimal('-30.00'), -1), ('U4', Decimal('12.50'), 1)])
+
+    def test_get_due_total_without_dues(self):
+        self.mock_connector.execute.return_value = None
+        self.assertEqual(Ledger.get_due_total('U1', self.mock_connector), (Decimal(0), 0))
+
+    def test_verify_dues_reports_drift(self):
+        self.mock_connector.execute.side_effect = [
+            [_debt('G1', 'U1', 'U2', '25.00', 'E1'), _debt('G1', 'U1', 'U2', '5.00', 'E2')],
+            [{'debtor_id': 'U2', 'expense_id': 'E1', 'group_id': 'G1', 'amount': Decimal('25.00')}],
+            [{'user_id': 'U2', 'total_owed': Decimal('30.00'), 'open_items': 2}],
+        ]
+
+        drift = Ledger.verify_dues(self.mock_connector)
+
+        self.assertEqual(drift, [{'table': 'OpenDues', 'key': ('U2', 'E2'), 'expected': ('G1', Decimal('5.00')), 'actual': None}])
+
+    def test_verify_reports_drift(self):
+        self.mock_connector.execute.side_effect = [
+            [_debt('G1', 'U1', 'U2', '25.00')],
+            [_debt('G1', 'U1', 'U2', '20.00')],
+            [{'group_id': 'G1', 'user_id': 'U1', 'amount': Decimal('25.00')},
+             {'group_id': 'G1', 'user_id': 'U2', 'amount': Decimal('-25.00')}],
+        ]
+
+        drift = Ledger.verify(self.mock_connector, 'G1')
+
+        self.assertEqual(drift, [{'table': 'GroupDebts', 'key': ('G1', 'U1', 'U2'),
+                                  'expected': Decimal('25.00'), 'actual': Decimal('20.00')}])
+
+    def test_rebuild_replaces_ledger_rows(self):
+        self.mock_connector.execute.side_effect = [[_debt('G1', 'U1', 'U2', '25.00')], None, None]
+
+        Ledger.rebuild(self.mock_connector, 'G1')
+
+        deletes = [call[0] for call in self.mock_connector.execute.call_args_list[1:]]
+        self.assertEqual(deletes, [("DELETE FROM GroupDebts WHERE group_id = %s", ('G1',)),
+                                   ("DELETE FROM GroupBalances WHERE group_id = %s", ('G1',))])
+        debts_call, balances_call = self.mock_connector.execute_many.call_args_list
+        self.assertEqual(debts_call[0][1], [('G1', 'U1', 'U2', Decimal('25.00'))])
+        self.assertEqual(balances_call[0][1], [('G1', 'U1', Decimal('25.00')), ('G1', 'U2', Decimal('-25.00'))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import io
+import json
+import logging
+import pytest
+import log
+from log import get_logger, configure_logging, ROOT_LOGGER
+
+
+@pytest.fixture(autouse=True)
+def restore_logging():
+    yield
+    configure_logging(stream=io.StringIO())
+    root = logging.getLogger(ROOT_LOGGER)
+    for handler in list(root.handlers):
+        if not isinstance(handler, logging.NullHandler):
+            root.removeHandler(handler)
+    root.setLevel(logging.NOTSET)
+    get_logger("connector").setLevel(logging.NOTSET)
+
+
+class CountingValue:
+    formatted = 0
+
+    def __str__(self):
+        CountingValue.formatted += 1
+        return "value"
+
+
+def test_disabled_messages_are_not_formatted():
+    stream = io.StringIO()
+    configure_logging(level="WARNING", stream=stream)
+    get_logger("group").debug("Loaded %s", CountingValue())
+    assert CountingValue.formatted == 0 and stream.getvalue() == ""
+    get_logger("group").warning("Missing %s", CountingValue())
+    assert CountingValue.formatted > 0
+    assert "WARNING bill_sharing_app.group: Missing value" in stream.getvalue()
+
+
+def test_subsystem_levels_and_structured_output():
+    stream = io.StringIO()
+    configure_logging(level="WARNING", stream=stream, structured=True, levels={"connector": "DEBUG"})
+    get_logger("connector").debug("Connected to %s", "db", extra={"pool_size": 5})
+    get_logger("expense").debug("not written")
+    [entry] = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert (entry["level"], entry["logger"], entry["message"], entry["pool_size"]) == (
+        "DEBUG", "bill_sharing_app.connector", "Connected to db", 5)
+
+
+def test_background_handler_writes_after_the_queue_is_drained():
+    stream = io.StringIO()
+    configure_logging(level="INFO", stream=stream, background=True)
+    assert isinstance(logging.getLogger(ROOT_LOGGER).handlers[-1], logging.handlers.QueueHandler)
+    for i in range(100):
+        get_logger("group").info("Removed %d members", i)
+    log._listener.stop()
+    log._listener = None
+    assert len(stream.getvalue().splitlines()) == 100
@@ -0,0 +1,41 @@
+import pytest
+from unittest.mock import MagicMock
+from connector import Connector
+from migrate_ids import schema_id_columns, plan, migrate
+
+
+def test_schema_id_columns():
+    columns = schema_id_columns()
+    assert columns['ExpenseParticipants'] == ['expense_id', 'user_id']
+    assert columns['Transactions'] == ['trans_id', 'expense_id', 'payer_id', 'payee_id']
+
+
+def test_plan_drops_and_restores_foreign_keys():
+    key = {'name': 'expenses_ibfk_1', 'table': 'Expenses', 'columns': ['paid_by'], 'referenced_table': 'Users',
+           'referenced_columns': ['user_id'], 'update_rule': 'RESTRICT', 'delete_rule': 'RESTRICT'}
+    statements = plan({'Expenses': ['expense_id', 'paid_by']}, [key])
+    assert statements == [
+        "ALTER TABLE Expenses DROP FOREIGN KEY expenses_ibfk_1",
+        "ALTER TABLE Expenses MODIFY expense_id VARBINARY(128) NOT NULL, MODIFY paid_by VARBINARY(128) NOT NULL",
+        "UPDATE Expenses SET expense_id = UNHEX(REPLACE(SUBSTRING(expense_id, 2), '-', '')), "
+        "paid_by = UNHEX(REPLACE(SUBSTRING(paid_by, 2), '-', ''))",
+        "ALTER TABLE Expenses MODIFY expense_id BINARY(16) NOT NULL, MODIFY paid_by BINARY(16) NOT NULL",
+        "ALTER TABLE Expenses ADD CONSTRAINT expenses_ibfk_1 FOREIGN KEY (paid_by) REFERENCES Users(user_id) "
+        "ON UPDATE RESTRICT ON DELETE RESTRICT",
+    ]
+
+
+def test_migrate_refuses_ids_it_cannot_convert():
+    connector = MagicMock(spec=Connector)
+    connector.backend.name = "mysql"
+    connector.execute.side_effect = [[{'table_name': 'Users', 'column_name': 'user_id'}], {'count': 2}]
+    with pytest.raises(ValueError, match="Users.user_id"):
+        migrate(connector)
+    connector.cursor.execute.assert_not_called()
+
+
+def test_migrate_without_varchar_ids_does_nothing():
+    connector = MagicMock(spec=Connector)
+    connector.backend.name = "mysql"
+    connector.execute.return_value = []
+    assert migrate(connector) == []
@@ -0,0 +1,76 @@
+import pytest
+import pickle
+from decimal import Decimal
+from money import Money
+
+
+def test_construction_and_rounding():
+    assert Money(12.5).cents == 1250
+    assert Money("12.50") == Money(Decimal("12.50")) == Money.from_cents(1250)
+    assert Money(7).cents == 700
+    assert Money("1.005").cents == 101
+    assert Money("-0.005").cents == -1
+    assert Money(Decimal("12.345")).cents == 1235
+    assert Money("-0.5").cents == -50
+    with pytest.raises(ValueError):
+        Money("twelve")
+    with pytest.raises(TypeError):
+        Money(None)
+
+
+def test_equality_and_hash_with_numbers():
+    assert Money(0.1) + Money(0.2) == Money(0.3)
+    assert Money("33.33") == Decimal("33.33")
+    assert Money("50.00") == 50 == Decimal("50.0")
+    assert Money("33.33") != Decimal("33.333")
+    assert Money(1) != "1.00"
+    assert hash(Money("50.00")) == hash(50) == hash(Decimal("50.00"))
+    assert {Money(50): "x"}[Decimal("50")] == "x"
+    # floats are never equal, since their hash differs from the Decimal hash Money uses
+    assert Money("33.33") != 33.33 and Money(50) != 50.0
+    assert len({Money("33.33"), 33.33}) == 2
+    with pytest.raises(TypeError):
+        Money(5) < 5.01
+
+
+def test_ordering_and_arithmetic():
+    assert Money(5) < Decimal("5.01") < Money("5.02") and Money(5) <= 5
+    assert Money(2) - Money("0.50") == Money("1.50")
+    assert sum([Money(1), Money("2.25")]) == Money("3.25")
+    assert Money("1.50") * 3 == Money("4.50")
+    assert -Money(2) == -2 and abs(Money(-2)) == 2
+    assert not Money(0)
+
+
+def test_is_immutable_and_compact():
+    money = Money(1)
+    with pytest.raises(AttributeError):
+        money.cents = 5
+    assert not hasattr(money, "__dict__")
+    assert pickle.loads(pickle.dumps(money)) == money
+
+
+def test_formatting():
+    assert str(Money("-0.05")) == "-0.05"
+    assert f"{Money(12.5):.2f}" == "12.50"
+    assert f"{Money(12.5)}" == "12.50"
+    assert float(Money("12.34")) == 12.34
+    assert Money("12.5").to_decimal() == Decimal("12.50")
+
+
+def test_allocate_sums_exactly():
+    assert Money(100).allocate([1, 1, 1]) == [Money("33.34"), Money("33.33"), Money("33.33")]
+    assert Money("0.05").allocate([1, 1]) == [Money("0.03"), Money("0.02")]
+    assert Money(-10).allocate([1, 2]) == [Money("-3.33"), Money("-6.67")]
+    assert Money(10).allocate([33.33, 33.33, 33.34]) == [Money("3.33"), Money("3.33"), Money("3.34")]
+    assert Money(10).allocate([0, 1]) == [Money(0), Money(10)]
+    for total in range(0, 1000, 7):
+        parts = Money.from_cents(total).allocate([3, 5, 7, 11])
+        assert sum(part.cents for part in parts) == total
+
+
+def test_allocate_rejects_bad_weights():
+    with pytest.raises(ValueError):
+        Money(1).allocate([0, 0])
+    with pytest.raises(ValueError):
+        Money(1).allocate([1, -1])
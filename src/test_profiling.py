@@ -0,0 +1,53 @@
+import pytest
+from connector import Connector
+from user import User
+from group import Group
+from expense import Expense
+from profiling import fingerprint, QueryProfile
+
+
+@pytest.fixture
+def connector(tmp_path):
+    connector = Connector(backend="sqlite", database=str(tmp_path / "bill_sharing_app.db"))
+    yield connector
+    connector.close()
+
+
+def test_fingerprint_groups_calls_that_differ_in_values():
+    assert fingerprint("SELECT * FROM Users WHERE user_id IN (%s, %s, %s)") == "SELECT * FROM Users WHERE user_id IN (...)"
+    assert fingerprint("SELECT * FROM Users\n   WHERE email = 'a@b.c' LIMIT 10") == "SELECT * FROM Users WHERE email = ? LIMIT ?"
+    assert (fingerprint("INSERT INTO GroupMembers (user_id, group_id) VALUES (%s, %s), (%s, %s)")
+            == "INSERT INTO GroupMembers (user_id, group_id) VALUES (...)")
+
+
+def test_report_is_sorted_by_total_time():
+    profile = QueryProfile()
+    profile.record("SELECT 1", 1, 0.001, site="main.fast")
+    profile.record("SELECT 2", 1, 0.002, site="main.fast")
+    profile.record("SELECT * FROM Expenses", 40, 0.030, site="main.slow")
+
+    stats = profile.stats()
+    assert [(entry['call_site'], entry['calls']) for entry in stats] == [("main.slow", 1), ("main.fast", 2)]
+    assert stats[1]['histogram'] == {1: 1, 2.5: 1}
+    assert profile.query_count == 3 and profile.by_call_site() == {"main.fast": 2, "main.slow": 1}
+    assert profile.report().splitlines()[2].split()[:3] == ["1", "1", "40"]
+
+
+def test_profile_attributes_queries_to_their_callers(connector):
+    alice = User("Alice", "alice@example.com", "secret", connector=connector)
+    bob = User("Bob", "bob@example.com", "secret", connector=connector)
+    group = Group(admin=alice, name="Trip", members=[bob], connector=connector)
+    for amount in (10, 20, 30):
+        Expense(amount=amount, payer=alice, group=group, participants={alice: 0, bob: amount}, connector=connector)
+
+    with connector.profile() as outer:
+        expenses = Expense.get_group_expenses(group.group_id, connector)
+        with connector.profile() as inner:
+            for expense in expenses:
+                expense.participants
+
+    assert outer.by_call_site() == {"expense.Expense.get_group_expenses": 1, "expense._ExpenseBatch.load_participants": 1}
+    assert inner.query_count == 1 and inner.stats()[0]['rows'] == 6
+    assert connector._profiles == []
+    User.get_user(alice.user_id, connector)
+    assert outer.query_count == 2
@@ -0,0 +1,56 @@
+import pytest
+import random
+import time
+from settlement import plan_settlements
+
+
+def _settle(balances, transfers):
+    remaining = dict(balances)
+    for debtor, creditor, cents in transfers:
+        assert cents > 0
+        remaining[debtor] += cents
+        remaining[creditor] -= cents
+    return remaining
+
+
+def test_balances_must_sum_to_zero():
+    with pytest.raises(ValueError, match="Balances must sum to zero"):
+        plan_settlements({'A': 100, 'B': -99})
+
+
+def test_no_balances_needs_no_transfers():
+    assert plan_settlements({}) == []
+    assert plan_settlements({'A': 0, 'B': 0}) == []
+
+
+def test_exact_plan_uses_zero_sum_subsets():
+    # B/F cancel out and so do A/C/D/E, so 1 + 3 transfers are enough. Greedy matching needs five.
+    balances = {'A': -900, 'B': 700, 'C': -200, 'D': 500, 'E': 600, 'F': -700}
+    transfers = plan_settlements(balances)
+    assert all(cents == 0 for cents in _settle(balances, transfers).values())
+    assert len(transfers) == 4
+    assert len(plan_settlements(balances, exact_limit=0)) == 5
+
+
+def test_exact_plan_matches_greedy_bound_on_random_groups():
+    rng = random.Random(7)
+    for _ in range(50):
+        members = [f"U{i}" for i in range(rng.randint(2, 10))]
+        balances = {member: rng.randint(-5000, 5000) for member in members[:-1]}
+        balances[members[-1]] = -sum(balances.values())
+        exact = plan_settlements(balances)
+        greedy = plan_settlements(balances, exact_limit=0)
+        assert all(cents == 0 for cents in _settle(balances, exact).values())
+        assert all(cents == 0 for cents in _settle(balances, greedy).values())
+        assert len(exact) <= len(greedy) <= len([cents for cents in balances.values() if cents]) - 1
+
+
+def test_greedy_plan_scales_to_large_groups():
+    rng = random.Random(42)
+    balances = {f"U{i}": rng.randint(-100000, 100000) for i in range(9999)}
+    balances["U9999"] = -sum(balances.values())
+    start = time.perf_counter()
+    transfers = plan_settlements(balances)
+    assert time.perf_counter() - start < 1
+    assert all(cents == 0 for cents in _settle(balances, transfers).values())
+    assert len(transfers) < len(balances)
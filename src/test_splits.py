@@ -0,0 +1,66 @@
+import pytest
+from unittest.mock import Mock
+from user import User
+from money import Money
+from splits import compute_split, split_strategy, SPLIT_STRATEGIES
+
+
+@pytest.fixture
+def users():
+    return [Mock(spec=User, user_id=f"U{i}") for i in range(3)]
+
+
+def test_registry_has_builtin_methods():
+    assert {'equal', 'unequal', 'percentages', 'shares', 'itemised', 'adjustment'} <= set(SPLIT_STRATEGIES)
+
+
+def test_invalid_method(users):
+    with pytest.raises(ValueError, match="Invalid method"):
+        compute_split('thirds', 90, users)
+
+
+def test_shares(users):
+    split = compute_split('shares', 100, users, shares=[2, 1, 1])
+    assert list(split.values()) == [Money(50), Money(25), Money(25)]
+    split = compute_split('shares', 10, users, shares=[1.5, 1, 0])
+    assert list(split.values()) == [Money(6), Money(4), Money(0)]
+    with pytest.raises(ValueError):
+        compute_split('shares', 10, users, shares=[1, 1])
+
+
+def test_itemised_spreads_tax_and_tip_by_subtotal(users):
+    a, b, c = users
+    items = [(30, [a]), (10, [b]), (20, [a, b])]
+    split = compute_split('itemised', 72, users, items=items, tax=6, tip=6)
+    # subtotals 40/20/0, so the 12 of tax and tip goes 8/4/0
+    assert split == {a: Money(48), b: Money(24), c: Money(0)}
+
+
+def test_itemised_rounds_to_the_total(users):
+    a, b, c = users
+    split = compute_split('itemised', '10.01', users, items=[(10, users)], tip='0.01')
+    assert sum(share.cents for share in split.values()) == 1001
+    with pytest.raises(ValueError, match="add up"):
+        compute_split('itemised', 20, users, items=[(10, [a])], tax=1)
+    with pytest.raises(ValueError, match="participants of the expense"):
+        compute_split('itemised', 10, [a, b], items=[(10, [c])])
+
+
+def test_adjustment(users):
+    split = compute_split('adjustment', 90, users, adjustments=[15, 0, -15])
+    assert list(split.values()) == [Money(45), Money(30), Money(15)]
+    with pytest.raises(ValueError, match="negative"):
+        compute_split('adjustment', 30, users, adjustments=[0, 0, -20])
+
+
+def test_registered_strategy(users):
+    @split_strategy('payer_pays_all')
+    def split_payer_pays_all(amount, participants):
+        return {participant: amount if position == 0 else Money(0) for position, participant in enumerate(participants)}
+
+    try:
+        assert compute_split('payer_pays_all', 12, users)[users[0]] == 12
+        with pytest.raises(TypeError):
+            compute_split('payer_pays_all', 12, users, shares=[1, 1, 1])
+    finally:
+        SPLIT_STRATEGIES.pop('payer_pays_all')
@@ -1,17 +1,20 @@
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, MagicMock, patch
 from datetime import datetime
 from transaction import Transaction
 from user import User
 from expense import Expense
 from connector import Connector
+from group import Group
+from money import Money
 
 class TestTransaction(unittest.TestCase):
 
     def setUp(self):
-        self.mock_connector = Mock(spec=Connector)
+        self.mock_connector = MagicMock(spec=Connector)
+        self.mock_connector.identity_map = None
         self.mock_expense = Mock(spec=Expense)
-        self.mock_expense.group.connector = self.mock_connector
+        self.mock_expense.connector = self.mock_connector
         self.mock_payer = Mock(spec=User)
         self.mock_payer.user_id = 'payer_id'
         self.mock_payee = Mock(spec=User)
@@ -82,46 +85,114 @@ class TestTransaction(unittest.TestCase):
             'amount': 100.0,
             'timestamp': datetime.now()
         }
-        self.mock_connector.execute.side_effect = [
-            mock_transaction_data,
-            mock_transaction_data  # Add another call to simulate the second call
-        ]
+        self.mock_connector.execute.side_effect = [mock_transaction_data]
         with patch('expense.Expense.get_expense', return_value=self.mock_expense):
-            with patch('user.User.get_user', side_effect=[self.mock_payer, self.mock_payee]):
+            with patch('user.User.get_users', return_value=[self.mock_payee, self.mock_payer]):
                 trans = Transaction.get_transaction('T123', self.mock_connector)
                 self.assertEqual(trans.trans_id, 'T123')
                 self.assertEqual(trans.amount, 100.0)
                 self.assertEqual(trans.payer, self.mock_payer)
                 self.assertEqual(trans.payee, self.mock_payee)
                 self.assertEqual(trans.expense, self.mock_expense)
-                self.assertEqual(self.mock_connector.execute.call_count, 2)  # Check if called twice
+                # The row is trusted, so the existence check in __init__ is not repeated
+                self.assertEqual(self.mock_connector.execute.call_count, 1)
+
+    def _joined_row(self, trans_id, timestamp, expense_id='expense_id'):
+        return {
+            'trans_id': trans_id, 'expense_id': expense_id, 'payer_id': 'payer_id', 'payee_id': 'payee_id',
+            'amount': 25.0, 'timestamp': timestamp,
+            'payer_name': 'Payer', 'payer_email': 'payer@example.com', 'payer_created': datetime(2024, 1, 1),
+            'payee_name': 'Payee', 'payee_email': 'payee@example.com', 'payee_created': datetime(2024, 1, 1),
+            'group_id': 'G1', 'description': 'Test Expense', 'tag': None, 'expense_timestamp': datetime(2024, 1, 1),
+            'paid_by': 'payee_id', 'expense_amount': 50.0
+        }
 
     def test_get_transactions_for_expense(self):
-        mock_transaction_ids = [{'trans_id': 'T123'}, {'trans_id': 'T124'}]
-        self.mock_connector.execute.return_value = mock_transaction_ids
-        with patch('transaction.Transaction.get_transaction', side_effect=[
-            Mock(spec=Transaction), Mock(spec=Transaction)
-        ]):
-            transactions = Transaction.get_transactions_for_expense(self.mock_expense)
-            self.assertEqual(len(transactions), 2)
-            self.mock_connector.execute.assert_called_once_with(
-                "SELECT trans_id FROM Transactions WHERE expense_id = %s",
-                (self.mock_expense.expense_id,)
-            )
+        self.mock_connector.execute.return_value = [
+            self._joined_row('T123', datetime(2024, 1, 2)),
+            self._joined_row('T124', datetime(2024, 1, 3))
+        ]
+        transactions = Transaction.get_transactions_for_expense(self.mock_expense)
+        self.assertEqual([t.trans_id for t in transactions], ['T123', 'T124'])
+        self.assertIs(transactions[0].expense, self.mock_expense)
+        # payer and payee are shared between the transactions
+        self.assertIs(transactions[0].payer, transactions[1].payer)
+        self.assertEqual(transactions[0].payee.name, 'Payee')
+        query, params = self.mock_connector.execute.call_args[0]
+        self.assertIn("WHERE t.expense_id = %s", query)
+        self.assertEqual(params, (self.mock_expense.expense_id,))
+        self.mock_connector.execute.assert_called_once()
 
     def test_get_transactions_for_user(self):
-        mock_transaction_ids = [{'trans_id': 'T123'}, {'trans_id': 'T124'}]
-        self.mock_connector.execute.return_value = mock_transaction_ids
-        
-        with patch('transaction.Transaction.get_transaction', side_effect=[
-            Mock(spec=Transaction), Mock(spec=Transaction)
-        ]):
+        rows = [self._joined_row('T123', datetime(2024, 1, 2)), self._joined_row('T124', datetime(2024, 1, 3))]
+        participant_rows = [
+            {'expense_id': 'expense_id', 'user_id': 'payer_id', 'amount': 25.0, 'name': 'Payer',
+             'email': 'payer@example.com', 'created': datetime(2024, 1, 1)}
+        ]
+        self.mock_connector.execute.side_effect = [rows, participant_rows]
+
+        with patch('group.Group.get_groups', return_value=[]):
             transactions = Transaction.get_transactions_for_user(self.mock_payer)
-            self.assertEqual(len(transactions), 2)
-            self.mock_connector.execute.assert_called_once_with(
-                "SELECT trans_id FROM Transactions WHERE payer_id = %s OR payee_id = %s",
-                (self.mock_payer.user_id, self.mock_payer.user_id)
-            )
+
+        self.assertEqual(len(transactions), 2)
+        # one expense object for both transactions, built from the joined columns
+        self.assertIs(transactions[0].expense, transactions[1].expense)
+        self.assertEqual(transactions[0].expense.amount, Money('50.00'))
+        self.assertIs(transactions[0].expense.payer, transactions[0].payee)
+        query, params = self.mock_connector.execute.call_args_list[0][0]
+        self.assertIn("FROM Transactions WHERE payer_id = %s", query)
+        self.assertIn("UNION ALL", query)
+        self.assertIn("FROM Transactions WHERE payee_id = %s AND payer_id != %s", query)
+        self.assertEqual(params, ('payer_id', 'payer_id', 'payer_id'))
+
+    def test_get_transactions_for_user_filters_and_paginates(self):
+        self.mock_connector.execute.return_value = []
+        start, end, last = datetime(2024, 1, 1), datetime(2024, 2, 1), datetime(2024, 1, 15)
+
+        transactions = Transaction.get_transactions_for_user(self.mock_payer, start, end, after=(last, 'T9'), limit=50)
+
+        self.assertEqual(transactions, [])
+        query, params = self.mock_connector.execute.call_args[0]
+        # the date range and the keyset apply to both the payer and the payee branch
+        conditions = (" AND timestamp >= %s AND timestamp <= %s"
+                      " AND (timestamp > %s OR (timestamp = %s AND trans_id > %s)) ORDER BY timestamp, trans_id LIMIT 50")
+        self.assertIn("WHERE payer_id = %s" + conditions, query)
+        self.assertIn("WHERE payee_id = %s AND payer_id != %s" + conditions, query)
+        self.assertTrue(query.rstrip().endswith("ORDER BY t.timestamp, t.trans_id LIMIT 50"))
+        self.assertEqual(params, ('payer_id', start, end, last, last, 'T9',
+                                  'payer_id', 'payer_id', start, end, last, last, 'T9'))
+
+    def _open_shares(self, rows):
+        self.mock_connector.execute.side_effect = \
+            lambda query, params=None, **kwargs: rows if "SELECT ep.expense_id, ep.amount" in query else None
+
+    def test_settle_up_fifo(self):
+        self._open_shares([{'expense_id': 'E1', 'amount': 30.0}, {'expense_id': 'E2', 'amount': 50.0},
+                           {'expense_id': 'E3', 'amount': 20.0}])
+        group = Mock(spec=Group, group_id='G1')
+
+        allocation = Transaction.settle_up(self.mock_payer, self.mock_payee, 60, group)
+
+        self.assertEqual(allocation, {'E1': Money(30), 'E2': Money(30)})
+        inserts, updates = [call.args[1] for call in self.mock_connector.execute_many.call_args_list]
+        self.assertEqual([(row[1], row[4]) for row in inserts], [('E1', Money(30)), ('E2', Money(30))])
+        self.assertEqual([row[:3] for row in updates], [(0, 'SETTLED', 'E1'), (20, 'PARTIAL', 'E2')])
+
+    def test_settle_up_proportional(self):
+        self._open_shares([{'expense_id': 'E1', 'amount': 10.0}, {'expense_id': 'E2', 'amount': 20.0}])
+
+        allocation = Transaction.settle_up(self.mock_payer, self.mock_payee, 10, Mock(spec=Group, group_id='G1'), 'proportional')
+
+        self.assertEqual(allocation, {'E1': Money('3.33'), 'E2': Money('6.67')})
+        self.assertEqual(self.mock_connector.execute_many.call_count, 2)
+
+    def test_settle_up_rejects_overpayment(self):
+        self._open_shares([{'expense_id': 'E1', 'amount': 10.0}])
+        with self.assertRaises(ValueError):
+            Transaction.settle_up(self.mock_payer, self.mock_payee, '10.01', Mock(spec=Group, group_id='G1'))
+        with self.assertRaises(ValueError):
+            Transaction.settle_up(self.mock_payer, self.mock_payee, 5, Mock(spec=Group, group_id='G1'), 'lifo')
+        self.mock_connector.execute_many.assert_not_called()
 
 if __name__ == '__main__':
     unittest.main()
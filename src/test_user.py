@@ -2,12 +2,13 @@ import pytest
 from datetime import datetime
 from uuid import UUID
 from user import User
-from connector import Connector
+from connector import Connector, IdentityMap
 
 # Mock Connector class for testing
 class MockConnector:
     def __init__(self):
         self.executed_queries = []
+        self.identity_map = None
         self.mock_data = {}
 
     def execute(self, query, params=None, fetchall=True):
@@ -27,7 +28,7 @@ def test_user_creation(mock_connector):
     
     assert isinstance(user.user_id, str)
     assert user.user_id.startswith("U")
-    assert UUID(user.user_id[1:], version=4)  # Verify it's a valid UUID
+    assert UUID(user.user_id[1:]).version == 7  # Verify it's a valid, time-ordered UUID
     assert user.name == "Test User"
     assert user.email == "test@example.com"
     assert isinstance(user.created, datetime)
@@ -70,6 +71,33 @@ def test_get_user(mock_connector):
     assert user.name == "Test User"
     assert user.email == "test@example.com"
 
+def test_get_user_uses_identity_map(mock_connector):
+    mock_connector.identity_map = IdentityMap(capacity=10)
+    mock_connector.mock_data["U12345"] = {
+        "user_id": "U12345",
+        "name": "Test User",
+        "email": "test@example.com",
+        "created": datetime.now()
+    }
+
+    first = User.get_user("U12345", mock_connector)
+    assert (mock_connector.identity_map.misses, mock_connector.identity_map.hits) == (1, 0)
+    second = User.get_user("U12345", mock_connector)
+    assert second is first
+    assert len(mock_connector.executed_queries) == 1
+    assert (mock_connector.identity_map.misses, mock_connector.identity_map.hits) == (1, 1)
+
+    first.name = "Renamed User"
+    # the write keeps the mapped object, so the next load hands out the same instance without a query
+    assert User.get_user("U12345", mock_connector) is first
+    assert len(mock_connector.executed_queries) == 2
+
+    # an object built outside the map, e.g. by another connector, pushes its write to the mapped one
+    copy = User.from_row(dict(mock_connector.mock_data["U12345"], name="Stale"), MockConnector())
+    copy.connector = mock_connector
+    copy.name = "Renamed Again"
+    assert first.name == "Renamed Again"
+
 def test_get_user_nonexistent(mock_connector):
     with pytest.raises(ValueError, match="ERROR\\[User.get_user\\]: User with user_id: U99999 does not exist in the database."):
         User.get_user("U99999", mock_connector)
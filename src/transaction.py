@@ -1,14 +1,18 @@
-from typing import List
+from typing import List, Dict, Tuple, Iterator
+from itertools import islice
 from datetime import datetime
-from uuid import uuid4
+from ids import new_id, TRANSACTION
 from user import User
 from expense import Expense
 from connector import Connector
+from group import Group
+from ledger import Ledger
+from money import Money
 
 class Transaction:
     def __init__(self, expense: Expense, payer: User, payee: User, amount: float,
                  trans_id: str = None, timestamp: datetime = None, connector: Connector = None):
-        self._connector = connector or expense.group.connector
+        self._connector = connector or expense.connector
         self._expense = expense
         self._payer = payer
         self._payee = payee
@@ -28,9 +32,45 @@ class Transaction:
             else:
                 raise ValueError(f"Transaction with ID {trans_id} does not exist in the database.")
         else:
-            self._trans_id = f"T{uuid4()}"
+            self._trans_id = new_id(TRANSACTION)
             self._insert_transaction()
 
+    @staticmethod
+    def from_row(row: dict, connector: Connector, expense: Expense, payer: User, payee: User) -> 'Transaction':
+        """
+        Builds a Transaction straight from a row of the Transactions table. No queries are run, so the row must come from the database.
+        :param row: dictionary with at least trans_id, amount and timestamp
+        :param connector: Connector object the transaction will use for later updates
+        :param expense: Expense matching expense_id in the row
+        :param payer: User matching payer_id in the row
+        :param payee: User matching payee_id in the row
+        :return: Transaction object
+        """
+        transaction = Transaction.__new__(Transaction)
+        transaction._connector = connector
+        transaction._trans_id = row['trans_id']
+        transaction._expense = expense
+        transaction._payer = payer
+        transaction._payee = payee
+        transaction._amount = row['amount']
+        transaction._timestamp = row['timestamp']
+        return transaction
+
+    @staticmethod
+    def from_rows(rows: List[dict], connector: Connector, expenses: Dict[str, Expense],
+                  users: Dict[str, User]) -> List['Transaction']:
+        """
+        Builds one Transaction per row of the Transactions table without running any queries.
+        :param rows: list of dictionaries accepted by from_row() that also carry expense_id, payer_id and payee_id
+        :param connector: Connector object the transactions will use for later updates
+        :param expenses: dictionary mapping expense_id to Expense for every expense in the rows
+        :param users: dictionary mapping user_id to User for every payer and payee in the rows
+        :return: list of Transaction objects in the order of rows
+        """
+        return [Transaction.from_row(row, connector, expenses[row['expense_id']], users[row['payer_id']],
+                                     users[row['payee_id']])
+                for row in rows]
+
     def _insert_transaction(self):
         insert_query = """
         INSERT INTO Transactions (trans_id, expense_id, payer_id, payee_id, amount, timestamp)
@@ -70,55 +110,226 @@ class Transaction:
 
     @staticmethod
     def get_transaction(trans_id: str, connector: Connector):
-        query = """
-        SELECT t.*, e.*, u1.*, u2.*
-        FROM Transactions t
-        JOIN Expenses e ON t.expense_id = e.expense_id
-        JOIN Users u1 ON t.payer_id = u1.user_id
-        JOIN Users u2 ON t.payee_id = u2.user_id
-        WHERE t.trans_id = %s
-        """
+        query = "SELECT * FROM Transactions WHERE trans_id = %s"
         transaction_data = connector.execute(query, (trans_id,), fetchall=False)
 
         if not transaction_data:
             raise ValueError(f"Transaction with ID {trans_id} not found.")
 
         expense = Expense.get_expense(transaction_data['expense_id'], connector)
-        payer = User.get_user(transaction_data['payer_id'], connector)
-        payee = User.get_user(transaction_data['payee_id'], connector)
-
-        return Transaction(
-            expense=expense,
-            payer=payer,
-            payee=payee,
-            amount=transaction_data['amount'],
-            trans_id=trans_id,
-            timestamp=transaction_data['timestamp'],
-            connector=connector
-        )
+        user_ids = [transaction_data['payer_id'], transaction_data['payee_id']]
+        users = {user.user_id: user for user in User.get_users(user_ids, connector)}
+        missing = [user_id for user_id in user_ids if user_id not in users]
+        if missing:
+            raise ValueError(f"Transaction with ID {trans_id} refers to unknown users: {', '.join(missing)}")
+
+        return Transaction.from_row(transaction_data, connector, expense, users[user_ids[0]], users[user_ids[1]])
+
+    # Transaction columns plus the payer, payee and expense columns needed to build the objects without further lookups.
+    # {transactions} is the Transactions table or a derived table with the same columns.
+    _JOINED_SELECT = """
+        SELECT t.trans_id, t.expense_id, t.payer_id, t.payee_id, t.amount, t.timestamp,
+               p.name AS payer_name, p.email AS payer_email, p.created AS payer_created,
+               q.name AS payee_name, q.email AS payee_email, q.created AS payee_created,
+               e.group_id, e.description, e.tag, e.timestamp AS expense_timestamp, e.paid_by,
+               e.amount AS expense_amount
+        FROM {transactions} t
+        JOIN Users p ON p.user_id = t.payer_id
+        JOIN Users q ON q.user_id = t.payee_id
+        JOIN Expenses e ON e.expense_id = t.expense_id
+        """
+
+    @staticmethod
+    def _build_transactions(rows: List[dict], connector: Connector,
+                            expenses: Dict[str, Expense] = None) -> List['Transaction']:
+        """
+        Builds Transactions from rows selected with _JOINED_SELECT. Users and expenses are deduplicated across the rows.
+        Expenses not given in expenses are built from the joined columns, with their participants and groups loaded in bulk.
+        """
+        users = {}
+        for row in rows:
+            for role in ('payer', 'payee'):
+                if row[f'{role}_id'] not in users:
+                    users[row[f'{role}_id']] = User.from_row(
+                        {'user_id': row[f'{role}_id'], 'name': row[f'{role}_name'], 'email': row[f'{role}_email'],
+                         'created': row[f'{role}_created']}, connector)
+
+        expenses = dict(expenses) if expenses else {}
+        expense_rows = {}
+        for row in rows:
+            if row['expense_id'] not in expenses and row['expense_id'] not in expense_rows:
+                expense_rows[row['expense_id']] = {
+                    'expense_id': row['expense_id'], 'group_id': row['group_id'], 'description': row['description'],
+                    'tag': row['tag'], 'timestamp': row['expense_timestamp'], 'paid_by': row['paid_by'],
+                    'amount': row['expense_amount']}
+        if expense_rows:
+            built = Expense._build_from_expense_rows(list(expense_rows.values()), connector, users, {})
+            expenses.update((expense.expense_id, expense) for expense in built)
+        return Transaction.from_rows(rows, connector, expenses, users)
 
     @staticmethod
     def get_transactions_for_expense(expense: Expense) -> List['Transaction']:
-        query = "SELECT trans_id FROM Transactions WHERE expense_id = %s"
-        transaction_ids = expense.group.connector.execute(query, (expense.expense_id,))
-        return [Transaction.get_transaction(t['trans_id'], expense.group.connector) for t in transaction_ids]
+        """
+        Retrieves every transaction made against an expense with one query that also returns the payers and payees.
+        :param expense: Expense whose transactions are wanted. It is reused as the expense of every transaction
+        :return: list of Transaction objects ordered by timestamp
+        """
+        connector = expense.connector
+        query = (Transaction._JOINED_SELECT.format(transactions = "Transactions")
+                 + "WHERE t.expense_id = %s ORDER BY t.timestamp, t.trans_id")
+        rows = connector.execute(query, (expense.expense_id,)) or []
+        return Transaction._build_transactions(rows, connector, {expense.expense_id: expense})
 
     @staticmethod
-    def get_transactions_for_user(user: User, start_date: datetime = None, end_date: datetime = None) -> List['Transaction']:
-        query = "SELECT trans_id FROM Transactions WHERE payer_id = %s OR payee_id = %s"
-        params = [user.user_id, user.user_id]
+    def get_transactions_for_user(user: User, start_date: datetime = None, end_date: datetime = None,
+                                  after: Tuple[datetime, str] = None, limit: int = None) -> List['Transaction']:
+        """
+        Retrieves the transactions a user paid or received, oldest first, with one joined query for the transactions, users and expenses.
+        Keyset pagination: pass the (timestamp, trans_id) of the last transaction of a page as after to get the next page. Each page costs the same however deep into the history it is.
+        :param user: User whose transactions are wanted
+        :param start_date: optional, only transactions at or after this time
+        :param end_date: optional, only transactions at or before this time
+        :param after: optional, (timestamp, trans_id) of the last transaction already seen
+        :param limit: optional, maximum number of transactions to return
+        :return: list of Transaction objects ordered by (timestamp, trans_id)
+        """
+        query, params = Transaction._user_transactions_query(user, start_date, end_date, after, limit)
+        rows = user.connector.execute(query, params) or []
+        return Transaction._build_transactions(rows, user.connector)
 
+    @staticmethod
+    def stream_transactions_for_user(user: User, start_date: datetime = None, end_date: datetime = None,
+                                     batch_size: int = 1000) -> Iterator['Transaction']:
+        """
+        Streaming version of get_transactions_for_user() for exporting or walking a whole history. The joined rows are read with
+        Connector.stream, so only batch_size transactions are held at a time however long the user's history is.
+        :param user: User whose transactions are wanted
+        :param start_date: optional, only transactions at or after this time
+        :param end_date: optional, only transactions at or before this time
+        :param batch_size: how many transactions are read and built at a time. Defaults to 1000
+        :return: iterator of Transaction objects ordered by (timestamp, trans_id)
+        """
+        if batch_size < 1:
+            raise ValueError("ERROR[Transaction.stream_transactions_for_user]: Batch size must be at least 1.")
+        query, params = Transaction._user_transactions_query(user, start_date, end_date)
+        rows = user.connector.stream(query, params, batch_size = batch_size)
+        try:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    return
+                yield from Transaction._build_transactions(batch, user.connector)
+        finally:
+            rows.close()
+
+    @staticmethod
+    def _user_transactions_query(user: User, start_date: datetime = None, end_date: datetime = None,
+                                 after: Tuple[datetime, str] = None, limit: int = None) -> Tuple[str, tuple]:
+        """
+        :return: the query and parameters selecting the transactions a user paid or received, see get_transactions_for_user()
+        """
+        # The user's side is picked by a UNION ALL of two branches, so each one can range scan the
+        # (payer_id, timestamp) or (payee_id, timestamp) index instead of OR-ing two columns
+        conditions = ""
+        range_params = []
         if start_date:
-            query += " AND timestamp >= %s"
-            params.append(start_date)
+            conditions += " AND timestamp >= %s"
+            range_params.append(start_date)
         if end_date:
-            query += " AND timestamp <= %s"
-            params.append(end_date)
+            conditions += " AND timestamp <= %s"
+            range_params.append(end_date)
+        if after:
+            conditions += " AND (timestamp > %s OR (timestamp = %s AND trans_id > %s))"
+            range_params.extend((after[0], after[0], after[1]))
+        order = " ORDER BY timestamp, trans_id"
+        if limit:
+            # each branch only needs to produce the first limit rows of its side
+            order += f" LIMIT {int(limit)}"
+
+        branches = (f"SELECT * FROM (SELECT * FROM Transactions WHERE payer_id = %s{conditions}{order}) AS paid"
+                    f" UNION ALL "
+                    f"SELECT * FROM (SELECT * FROM Transactions WHERE payee_id = %s AND payer_id != %s{conditions}{order})"
+                    f" AS received")
+        query = Transaction._JOINED_SELECT.format(transactions = f"({branches})") + "ORDER BY t.timestamp, t.trans_id"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        params = [user.user_id] + range_params + [user.user_id, user.user_id] + range_params
+        return query, tuple(params)
+
+    @staticmethod
+    def settle_up(payer: User, payee: User, amount: float, group: Group, method: str = 'fifo') -> Dict[str, Money]:
+        """
+        Applies one payment from payer to payee across every expense of the group on which payer still owes payee money.
+        One Transaction is recorded per expense the payment reaches and the participant rows are reduced to match, all in one
+        unit of work with two batched writes, so the payment is applied completely or not at all.
+
+        :param payer: User making the payment
+        :param payee: User receiving the payment, the payer of the expenses being settled
+        :param amount: amount paid, at most what payer owes payee in the group
+        :param group: Group whose expenses are settled
+        :param method: 'fifo' pays off the oldest expenses first, 'proportional' spreads the payment in proportion to what is owed on each expense
+        :return: dictionary mapping expense_id to the amount applied to it, in the order the expenses were settled
+        """
+        if method not in ('fifo', 'proportional'):
+            raise ValueError(f"ERROR[Transaction.settle_up]: Invalid method {method!r}. Use 'fifo' or 'proportional'.")
+        amount = Money(amount)
+        if amount <= 0:
+            raise ValueError("ERROR[Transaction.settle_up]: Amount must be greater than 0.")
+        if payer.user_id == payee.user_id:
+            raise ValueError("ERROR[Transaction.settle_up]: Payer and payee must be different users.")
+
+        connector = payer.connector
+        open_query = """
+        SELECT ep.expense_id, ep.amount
+        FROM ExpenseParticipants ep
+        JOIN Expenses e ON e.expense_id = ep.expense_id
+        WHERE e.group_id = %s AND e.paid_by = %s AND ep.user_id = %s AND ep.settled != 'SETTLED' AND ep.amount > 0
+        ORDER BY e.timestamp, e.expense_id
+        FOR UPDATE
+        """
+        with connector.transaction():
+            rows = connector.execute(open_query, (group.group_id, payee.user_id, payer.user_id)) or []
+            owed = {row['expense_id']: Money(row['amount']) for row in rows}
+            total_owed = Money.from_cents(sum(due.cents for due in owed.values()))
+            if amount > total_owed:
+                raise ValueError(f"ERROR[Transaction.settle_up]: Cannot pay {amount} when only {total_owed} is owed.")
+
+            allocation = Transaction._allocate_payment(amount, owed, method)
+            timestamp = datetime.now()
+            transactions = [(new_id(TRANSACTION), expense_id, payer.user_id, payee.user_id, paid.to_decimal(), timestamp)
+                            for expense_id, paid in allocation.items()]
+            participants = [((owed[expense_id] - paid).to_decimal(), 'SETTLED' if paid == owed[expense_id] else 'PARTIAL',
+                             expense_id, payer.user_id)
+                            for expense_id, paid in allocation.items()]
+            with Ledger.track(connector, list(allocation)):
+                connector.execute_many("""
+                INSERT INTO Transactions (trans_id, expense_id, payer_id, payee_id, amount, timestamp)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                """, transactions)
+                connector.execute_many("UPDATE ExpenseParticipants SET amount = %s, settled = %s WHERE expense_id = %s AND user_id = %s",
+                                       participants)
+        return allocation
+
+    @staticmethod
+    def _allocate_payment(amount: Money, owed: Dict[str, Money], method: str) -> Dict[str, Money]:
+        """
+        :param owed: dictionary mapping expense_id to the amount still owed on it, oldest first. Must add up to at least amount
+        :return: dictionary mapping expense_id to the part of amount applied to it, leaving out expenses that get nothing
+        """
+        if method == 'proportional':
+            # Largest remainder never gives an expense more than is owed on it, because amount is at most the total owed
+            parts = amount.allocate([due.cents for due in owed.values()])
+            return {expense_id: part for expense_id, part in zip(owed, parts) if part}
+        allocation = {}
+        remaining = amount
+        for expense_id, due in owed.items():
+            if not remaining:
+                break
+            paid = min(due, remaining)
+            allocation[expense_id] = paid
+            remaining -= paid
+        return allocation
 
-        transaction_ids = user.connector.execute(query, tuple(params))
-        return [Transaction.get_transaction(t['trans_id'], user.connector) for t in transaction_ids]
-        
-        
     def __str__(self):
         return (f"Transaction: {self.payer.name} paid {self.payee.name} "
                 f"{self.amount:.2f} for '{self.expense.description}' with Transaction ID {self.trans_id} "
@@ -1,6 +1,6 @@
 from connector import *
 from datetime import datetime
-from uuid import uuid4
+from ids import new_id, USER
 from typing import List
 import hashlib
 
@@ -8,7 +8,8 @@ import hashlib
 class User:
     def __init__(self, name: str, email: str, password: str = None, connector: Connector = None,
                  user_id: str = None, created: datetime = None, filepath: str = "", db_user: str = "root",
-                 host: str = "localhost", port: str = "3306", database: str = "bill_sharing_app"):
+                 host: str = "localhost", port: str = "3306", database: str = "bill_sharing_app",
+                 pool_size: int = 0):
         """
         :param name: name of the user
         :param email: email of the user
@@ -20,10 +21,11 @@ class User:
         :param host: host for the database
         :param port: port for the database
         :param database: name of the database
+        :param pool_size: if greater than 0, the created connector draws its connections from a shared pool of this size
         """
         self._connector = connector if connector else Connector(filepath = filepath,
                                                                 user = db_user, host = host, port = port,
-                                                                database = database)
+                                                                database = database, pool_size = pool_size)
         user_exists = None
         if user_id:
             check_user_id_query = "SELECT user_id FROM Users WHERE user_id = %s"
@@ -59,7 +61,7 @@ class User:
                 raise ValueError(f"ERROR[User.__init__]: You are trying to assign a user_id to a group that does not exist in the database. user_id: {user_id}")
             if not password:
                 raise ValueError("ERROR[User.__init__]: Password cannot be empty.")
-            self._user_id = f"U{uuid4()}"
+            self._user_id = new_id(USER)
             self._name = name
             self._email = email
             self._created = datetime.now()
@@ -69,6 +71,39 @@ class User:
             insert_user_params = (self._user_id, self._name, self._email, self._password, self._created)
             self.connector.execute(insert_user_query, params = insert_user_params)
 
+    @staticmethod
+    def from_row(row: dict, connector: Connector) -> 'User':
+        """
+        Builds a User straight from a row of the Users table. No queries are run, so the row must come from the database.
+        If the connector has an identity map that already holds this user, that object is refreshed from the row and returned instead of a copy.
+        :param row: dictionary with at least user_id, name, email and created
+        :param connector: Connector object the user will use for later updates
+        :return: User object
+        """
+        identity_map = connector.identity_map
+        # loads count their own lookups with get() or get_many(), so building the object only peeks
+        user = identity_map.peek('User', row['user_id']) if identity_map is not None else None
+        if user is None:
+            user = User.__new__(User)
+            if identity_map is not None:
+                identity_map.add('User', row['user_id'], user)
+        user._connector = connector
+        user._user_id = row['user_id']
+        user._name = row['name']
+        user._email = row['email']
+        user._created = row['created']
+        return user
+
+    @staticmethod
+    def from_rows(rows: List[dict], connector: Connector) -> List['User']:
+        """
+        Builds one User per row of the Users table without running any queries.
+        :param rows: list of dictionaries accepted by from_row()
+        :param connector: Connector object the users will use for later updates
+        :return: List of User objects in the order of rows
+        """
+        return [User.from_row(row, connector) for row in rows]
+
     def __repr__(self):
         return (f"User(user_id={self.user_id}, name={self.name}, email={self.email},"
                 f"created={self.created})")
@@ -97,6 +132,18 @@ class User:
         update_query = "UPDATE Users SET name = %s WHERE user_id = %s"
         params = (new_name, self._user_id)
         self.connector.execute(update_query, params)
+        self._refresh_mapped()
+
+    def _refresh_mapped(self):
+        """
+        Copies this user's state onto the object the connector's identity map holds for the same id after a write,
+        so that object stays the one instance for the id and its holders see the change.
+        """
+        if self.connector.identity_map is not None:
+            mapped = self.connector.identity_map.peek('User', self._user_id)
+            if mapped is not None and mapped is not self:
+                mapped._name = self._name
+                mapped._email = self._email
 
     @property
     def email(self):
@@ -125,7 +172,7 @@ class User:
         user_data = connector.execute(query, params = params, fetchall = False)
         if not user_data:
             raise ValueError("ERROR[User.login]:Invalid email or password")
-        return User(user_id = user_data['user_id'], name = user_data['name'], email = user_data['email'], created = user_data['created'], connector = connector)
+        return User.from_row(user_data, connector)
 
     @staticmethod
     def get_user(user_id: str, connector: Connector):
@@ -135,11 +182,15 @@ class User:
         :param connector: Connector object to interact with the database
         :return: User object created using the user_id
         """
+        if connector.identity_map is not None:
+            user = connector.identity_map.get('User', user_id)
+            if user is not None:
+                return user
         query = "SELECT * FROM Users WHERE user_id = %s"
         user_data = connector.execute(query, params = (user_id,), fetchall = False)
         if not user_data:
             raise ValueError(f"ERROR[User.get_user]: User with user_id: {user_id} does not exist in the database.")
-        return User(user_id = user_data['user_id'], name = user_data['name'], email = user_data['email'], created = user_data['created'], connector = connector)
+        return User.from_row(user_data, connector)
 
     @staticmethod
     def get_users(user_ids: List[str], connector: Connector):
@@ -147,14 +198,26 @@ class User:
         Retrieve multiple users from the database using their user_ids.
         :param user_ids: List of user IDs
         :param connector: Connector object to interact with the database
-        :return: List of User objects
+        :return: List of User objects. With an identity map, cached users are not queried again and the list follows the order of user_ids
         """
-        placeholders = ', '.join(['%s'] * len(user_ids))
+        if not user_ids:
+            return []
+        cached = {}
+        if connector.identity_map is not None:
+            cached = connector.identity_map.get_many('User', user_ids)
+            if len(cached) == len(set(user_ids)):
+                return [cached[user_id] for user_id in dict.fromkeys(user_ids)]
+            missing_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in cached]
+        else:
+            missing_ids = user_ids
+        placeholders = ', '.join(['%s'] * len(missing_ids))
         query = f"SELECT * FROM Users WHERE user_id IN ({placeholders})"
-        users_data = connector.execute(query, tuple(user_ids))
-        users = [User(user_id = user_data['user_id'], name = user_data['name'], email = user_data['email'], created = user_data['created'], connector = connector)
-                 for user_data in users_data]
-        return users
+        users_data = connector.execute(query, tuple(missing_ids))
+        users = User.from_rows(users_data, connector)
+        if not cached:
+            return users
+        cached.update((user.user_id, user) for user in users)
+        return [cached[user_id] for user_id in dict.fromkeys(user_ids) if user_id in cached]
 
     def get_groups(self) -> List[str]:
         """
@@ -172,5 +235,4 @@ class User:
         user_data = connector.execute(query, params=(email,), fetchall=False)
         if not user_data:
             raise ValueError(f"User with email: {email} does not exist in the database.")
-        return User(user_id=user_data['user_id'], name=user_data['name'], email=user_data['email'],
-                    created=user_data['created'], connector=connector)
+        return User.from_row(user_data, connector)